@@ -0,0 +1,83 @@
+"""
+Recall@1 and query latency of descriptor indexes on synthetic 128-d descriptors.
+
+    python -m benchmarks.ann_index --sizes 10000 100000 1000000
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from face_recognition.gallery import DescriptorGallery
+from face_recognition.ivf_index import IVFIndex
+
+
+# Synthetic descriptors imitate dlib ones: identities are ~1.0 apart, photos of one identity ~0.3 apart
+IDENTITY_SIGMA = 1 / np.sqrt(256)
+PHOTO_SIGMA = 0.3 / np.sqrt(2 * 128)
+PHOTOS_PER_IDENTITY = 4
+
+
+def make_parser():
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', dest='sizes', type=int, nargs='+',
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', dest='queries', type=int, default=500)
+    parser.add_argument('--lists', dest='n_lists', type=int, default=None,
+                        help='IVF lists quantity, 4·√N by default')
+    parser.add_argument('--probes', dest='n_probes', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--seed', dest='seed', type=int, default=0)
+    return parser
+
+
+def make_descriptors(size: int, queries: int, random: np.random.Generator):
+    identities = random.normal(0, IDENTITY_SIGMA, (size // PHOTOS_PER_IDENTITY + 1, 128))
+    owners = np.arange(size) // PHOTOS_PER_IDENTITY
+    descriptors = identities[owners] + random.normal(0, PHOTO_SIGMA, (size, 128))
+    query_owners = random.choice(len(identities) - 1, queries)
+    query_descriptors = identities[query_owners] + random.normal(0, PHOTO_SIGMA, (queries, 128))
+    return descriptors, query_descriptors
+
+
+def measure(index, queries: np.ndarray) -> tuple[list, np.ndarray]:
+    answers, latencies = [], np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = perf_counter()
+        answers.append(index.nearest(query))
+        latencies[i] = perf_counter() - start
+    return answers, latencies
+
+
+def report(name: str, latencies: np.ndarray, recall: float) -> None:
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f'\t{name:<24} recall@1 = {recall:.4f}   p50 = {p50:8.3f} ms   p99 = {p99:8.3f} ms')
+
+
+def main():
+    args = make_parser().parse_args()
+    random = np.random.default_rng(args.seed)
+
+    for size in args.sizes:
+        descriptors, queries = make_descriptors(size, args.queries, random)
+        ids = np.arange(1, size + 1)
+        print(f'N = {size}')
+
+        exact = DescriptorGallery(initial_capacity=size)
+        exact.update(zip(ids.tolist(), descriptors))
+        truth, latencies = measure(exact, queries)
+        report('exact', latencies, 1.0)
+
+        n_lists = args.n_lists or int(4 * np.sqrt(size))
+        start = perf_counter()
+        ivf = IVFIndex(n_lists=n_lists, min_train_size=n_lists)
+        ivf.update(zip(ids.tolist(), descriptors))
+        print(f'\tivf lists = {n_lists}, build time = {perf_counter() - start:.1f} s')
+        for n_probe in args.n_probes:
+            ivf.n_probe = n_probe
+            answers, latencies = measure(ivf, queries)
+            recall = np.mean([a[0] == t[0] for a, t in zip(answers, truth)])
+            report(f'ivf n_probe = {n_probe}', latencies, recall)
+
+
+if __name__ == '__main__':
+    main()
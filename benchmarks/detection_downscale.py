@@ -0,0 +1,107 @@
+"""
+Latency and hit rate of face detection on images downscaled to several detection sizes.
+Faces found on the full resolution image are the reference, a hit is a face found at the same place.
+
+    python -m benchmarks.detection_downscale --images photos/ --sizes 512 768 1024 1536
+
+Decoders:
+    reduce – full resolution decode (it is needed for alignment anyway) and integer downscale, as the node does,
+    draft – JPEG decode at reduced DCT scale only, as if full resolution pixels weren't needed.
+"""
+from argparse import ArgumentParser
+from io import BytesIO
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from face_recognition.backend_protocols import Rectangle
+from face_recognition.backends.dlib_ import DlibDetector
+from face_recognition.images import decode_image
+
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.JPG', '*.JPEG', '*.png')
+
+
+def make_parser():
+    parser = ArgumentParser()
+    parser.add_argument('--images', dest='images', type=Path, required=True,
+                        help='directory of photos with faces')
+    parser.add_argument('--sizes', dest='sizes', type=int, nargs='+', default=[512, 768, 1024, 1536])
+    parser.add_argument('--upsample', dest='upsample', type=int, default=0,
+                        help='detector upsampling, improves hit rate on small images')
+    return parser
+
+
+def decode_draft(data: bytes, detection_size: int) -> np.ndarray:
+    image = Image.open(BytesIO(data))
+    if max(image.size) > detection_size:
+        image.draft(image.mode, (detection_size, detection_size))
+        image.thumbnail((detection_size, detection_size))
+    return np.asarray(image)
+
+
+def biggest_face(detector: DlibDetector, image: np.ndarray, full_shape: tuple) -> Optional[Rectangle]:
+    """Biggest face found on image in coordinates of the full resolution image."""
+    if not (faces := detector.find_faces(image)):
+        return None
+    face = max(faces, key=lambda rect: rect.area)
+    return face.scaled(full_shape[1] / image.shape[1], full_shape[0] / image.shape[0])
+
+
+def report(name: str, latencies: list[float], found: int, hits: int, references: int) -> None:
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    hit_rate = hits / references if references else float('nan')
+    print(f'\t{name:<16} p50 = {p50:8.1f} ms   p95 = {p95:8.1f} ms   '
+          f'found = {found}/{len(latencies)}   hit rate = {hit_rate:.3f}')
+
+
+def main():
+    args = make_parser().parse_args()
+    files = sorted({file for pattern in IMAGE_PATTERNS for file in args.images.glob(pattern)})
+    if not files:
+        print('No images found.')
+        return
+    contents = [file.read_bytes() for file in files]
+    detector = DlibDetector(upsample_num_times=args.upsample)
+
+    # Reference: detection on the full resolution image
+    references, latencies = [], []
+    for data in contents:
+        start = perf_counter()
+        image, _ = decode_image(data)
+        references.append(biggest_face(detector, image, image.shape))
+        latencies.append(perf_counter() - start)
+    found = sum(face is not None for face in references)
+    print(f'{len(files)} images')
+    report('full', latencies, found, found, found)
+
+    for size in args.sizes:
+        print(f'detection size = {size}')
+        for decoder in ('reduce', 'draft'):
+            latencies, found, hits = [], 0, 0
+            for data, reference in zip(contents, references):
+                start = perf_counter()
+                if decoder == 'reduce':
+                    image, detection_image = decode_image(data, size)
+                    full_shape = image.shape
+                    if detection_image is None:
+                        detection_image = image
+                else:
+                    detection_image, full_shape = decode_draft(data, size), _full_shape(data)
+                face = biggest_face(detector, detection_image, full_shape)
+                latencies.append(perf_counter() - start)
+                found += face is not None
+                hits += face is not None and reference is not None and face.intersection_over_union(reference) >= .5
+            report(decoder, latencies, found, hits, sum(face is not None for face in references))
+
+
+def _full_shape(data: bytes) -> tuple[int, int]:
+    width, height = Image.open(BytesIO(data)).size  # header only, pixels aren't decoded
+    return height, width
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Load and latency benchmark of the node HTTP API.
+
+The application of main_node.app.init() is served in-process and driven by concurrent clients
+with a weighted mix of requests. Repositories are in-memory stand-ins (optionally delayed
+to model database round trips) or, with --database postgres, the config database.
+Recognition backend is a numpy stand-in or, with --backend dlib, the real one.
+
+    python -m benchmarks.load --concurrency 1 8 32 --requests 2000 --output results.json
+    python -m benchmarks.load --mix check_descriptor=3,get_undone_tasks=1 --query-latency-ms 0.5
+
+Reported per concurrency level: throughput, p50/p95/p99 latency per request kind and overall,
+CPU time per request. CPU is of the whole process, so it includes the load generating client.
+Results are written as JSON to compare them between commits. Request plans are drawn with a fixed seed,
+so runs with equal arguments send equal requests.
+"""
+import asyncio
+import json
+import platform
+import random
+import resource
+import subprocess
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from time import perf_counter
+from typing import Optional, Callable, Awaitable
+
+import numpy as np
+from aiohttp import FormData
+from aiohttp.test_utils import TestServer, TestClient
+from PIL import Image
+
+from face_recognition.gallery import DESCRIPTOR_SIZE
+from face_recognition.two_step import FaceRecognizer, FaceImageNormalizer, ThreadedFaceRecognition
+from face_recognition.ivf_index import make_descriptor_index
+from main_node.app import init, Repositories
+from main_node.controllers.descriptor_formats import FLOAT32
+
+from .stand_ins import (StandInAccessControlRepository, StandInAuthorizationRepository, StandInTasksRepository,
+                        StandInDetector, StandInNormalizer, StandInRecognizer, NORMALIZED_SIZE,
+                        ADMIN_TOKEN, room_token)
+import config
+
+
+DEFAULT_MIX = 'check_descriptor=4,check_descriptor_binary=2,check_descriptors=1,check_face=2,' \
+              'calculate_descriptor=1,get_undone_tasks=2,record_visit=1'
+RAW_IMAGE_SIZE = (1280, 720)
+DESCRIPTORS_BATCH_SIZE = 8
+
+
+def make_parser():
+    parser = ArgumentParser()
+    parser.add_argument('--concurrency', dest='concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', dest='requests', type=int, default=2000, help='requests per concurrency level')
+    parser.add_argument('--warmup', dest='warmup', type=int, default=100)
+    parser.add_argument('--mix', dest='mix', default=DEFAULT_MIX, help='request kinds with weights: kind=weight,...')
+    parser.add_argument('--backend', dest='backend', choices=('stand-in', 'dlib'), default='stand-in')
+    parser.add_argument('--database', dest='database', choices=('stand-in', 'postgres'), default='stand-in')
+    parser.add_argument('--query-latency-ms', dest='query_latency_ms', type=float, default=0.,
+                        help='delay of every stand-in repository query')
+    parser.add_argument('--users', dest='users', type=int, default=10000)
+    parser.add_argument('--rooms', dest='rooms', type=int, default=10)
+    parser.add_argument('--tasks', dest='tasks', type=int, default=20, help='undone tasks per room')
+    parser.add_argument('--images', dest='images', type=Path, default=None,
+                        help='directory of face photos for image requests (--backend dlib), default – synthetic')
+    parser.add_argument('--seed', dest='seed', type=int, default=0)
+    parser.add_argument('--output', dest='output', type=Path, default=None, help='JSON results file')
+    return parser
+
+
+@dataclass
+class Payloads:
+    """Request bodies prepared before the load, so the client does as little work as possible."""
+    known_descriptors: np.ndarray
+    normalized_images: list[bytes]
+    raw_images: list[bytes]
+
+
+def encode_jpeg(image: np.ndarray) -> bytes:
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def make_payloads(args, rng: np.random.Generator) -> Payloads:
+    if args.images is not None:
+        files = sorted(args.images.glob('*.jp*g'))
+        raw_images = [file.read_bytes() for file in files]
+        # Faces are cropped as the stand-in detector does, real normalization needs the backend
+        normalized_images = [encode_jpeg(np.asarray(Image.open(BytesIO(data)).convert('RGB')
+                                                    .resize((NORMALIZED_SIZE, NORMALIZED_SIZE))))
+                             for data in raw_images]
+    else:
+        raw_images = [encode_jpeg(rng.integers(0, 256, (RAW_IMAGE_SIZE[1], RAW_IMAGE_SIZE[0], 3), dtype=np.uint8))
+                      for _ in range(8)]
+        normalized_images = [encode_jpeg(rng.integers(0, 256, (NORMALIZED_SIZE, NORMALIZED_SIZE, 3), dtype=np.uint8))
+                             for _ in range(32)]
+    known_descriptors = rng.normal(size=(args.users, DESCRIPTOR_SIZE))
+    known_descriptors /= np.linalg.norm(known_descriptors, axis=1, keepdims=True)
+    return Payloads(known_descriptors=known_descriptors, normalized_images=normalized_images, raw_images=raw_images)
+
+
+def make_app(args, payloads: Payloads):
+    if args.database == 'postgres':
+        repositories = None
+    else:
+        latency = args.query_latency_ms / 1000
+        descriptors = payloads.known_descriptors.copy()
+        if args.backend == 'stand-in':
+            # Half of normalized images are faces of known users
+            recognizer = StandInRecognizer()
+            for i, data in enumerate(payloads.normalized_images[::2]):
+                descriptors[i] = recognizer.extract_features(np.asarray(Image.open(BytesIO(data))))
+        repositories = Repositories(
+            access_control=StandInAccessControlRepository(descriptors, args.rooms, latency),
+            authorization=StandInAuthorizationRepository(args.rooms, latency),
+            tasks=StandInTasksRepository(args.rooms, args.tasks, latency),
+        )
+    face_recognition = None
+    if args.backend == 'stand-in':
+        face_recognition = ThreadedFaceRecognition(
+            face_recognizer=FaceRecognizer(
+                recognizer=StandInRecognizer(),
+                index=make_descriptor_index(config.DESCRIPTOR_INDEX, **config.IVF_INDEX_OPTIONS),
+            ),
+            face_image_normalizer=FaceImageNormalizer(detector=StandInDetector(), normalizer=StandInNormalizer()),
+        )
+    return init(repositories, face_recognition)
+
+
+RequestMaker = Callable[[TestClient, random.Random], Awaitable[int]]
+
+
+def make_requests(args, payloads: Payloads) -> dict[str, RequestMaker]:
+    descriptors = payloads.known_descriptors
+
+    def room_headers(rnd: random.Random) -> dict:
+        return {'Room-Token': room_token(rnd.randint(1, args.rooms))}
+
+    def descriptor(rnd: random.Random) -> np.ndarray:
+        # Half of descriptors are slightly changed known ones, the rest are unknown
+        if rnd.random() < .5:
+            return descriptors[rnd.randrange(len(descriptors))] + np.full(DESCRIPTOR_SIZE, .001)
+        return np.roll(descriptors[rnd.randrange(len(descriptors))], 1)
+
+    def image_form(data: bytes) -> FormData:
+        form = FormData()
+        form.add_field('image', data, filename='image.jpg', content_type='image/jpeg')
+        return form
+
+    async def check_descriptor(client: TestClient, rnd: random.Random) -> int:
+        async with client.post('/access/check/descriptor', json={'features': descriptor(rnd).tolist()},
+                               headers=room_headers(rnd)) as response:
+            await response.read()
+            return response.status
+
+    async def check_descriptor_binary(client: TestClient, rnd: random.Random) -> int:
+        headers = {**room_headers(rnd), 'Content-Type': FLOAT32}
+        async with client.post('/access/check/descriptor', data=descriptor(rnd).astype('<f4').tobytes(),
+                               headers=headers) as response:
+            await response.read()
+            return response.status
+
+    async def check_descriptors(client: TestClient, rnd: random.Random) -> int:
+        batch = [{'features': descriptor(rnd).tolist()} for _ in range(DESCRIPTORS_BATCH_SIZE)]
+        async with client.post('/access/check/descriptors', json={'descriptors': batch},
+                               headers=room_headers(rnd)) as response:
+            await response.read()
+            return response.status
+
+    async def check_face(client: TestClient, rnd: random.Random) -> int:
+        async with client.post('/access/check/face', data=image_form(rnd.choice(payloads.normalized_images)),
+                               headers=room_headers(rnd)) as response:
+            await response.read()
+            return response.status
+
+    async def calculate_descriptor(client: TestClient, rnd: random.Random) -> int:
+        async with client.post('/access/descriptor/calculate', data=image_form(rnd.choice(payloads.raw_images)),
+                               headers={'Admin-Token': ADMIN_TOKEN}) as response:
+            await response.read()
+            return response.status
+
+    async def get_undone_tasks(client: TestClient, rnd: random.Random) -> int:
+        async with client.get('/tasks/undone', headers=room_headers(rnd)) as response:
+            await response.read()
+            return response.status
+
+    async def record_visit(client: TestClient, rnd: random.Random) -> int:
+        visit = {'user_id': rnd.randint(1, args.users), 'datetime': datetime.now().astimezone().isoformat()}
+        async with client.post('/access/visit/new', json=visit, headers=room_headers(rnd)) as response:
+            await response.read()
+            return response.status
+
+    return {
+        'check_descriptor': check_descriptor,
+        'check_descriptor_binary': check_descriptor_binary,
+        'check_descriptors': check_descriptors,
+        'check_face': check_face,
+        'calculate_descriptor': calculate_descriptor,
+        'get_undone_tasks': get_undone_tasks,
+        'record_visit': record_visit,
+    }
+
+
+def parse_mix(mix: str, kinds: dict) -> dict[str, float]:
+    weights = {}
+    for item in mix.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in kinds:
+            raise SystemExit(f'Unknown request kind {kind!r}, known: {", ".join(kinds)}.')
+        weights[kind] = float(weight or 1)
+    return weights
+
+
+async def run_level(client: TestClient, requests: dict[str, RequestMaker], plan: list[str],
+                    concurrency: int, seed: int) -> tuple[list[tuple[str, float, int]], float, float]:
+    """Send planned requests by concurrent workers, return (kind, latency, status) samples, duration and CPU time."""
+    samples = []
+    position = iter(range(len(plan)))
+
+    async def worker(worker_number: int):
+        rnd = random.Random(seed * 1000 + worker_number)
+        for index in position:
+            kind = plan[index]
+            start = perf_counter()
+            try:
+                status = await requests[kind](client, rnd)
+            except Exception:
+                status = 0
+            samples.append((kind, perf_counter() - start, status))
+
+    cpu_start, start = _cpu_time(), perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return samples, perf_counter() - start, _cpu_time() - cpu_start
+
+
+def summarize(samples: list[tuple[str, float, int]]) -> dict:
+    latencies = np.array([latency for _, latency, _ in samples]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float('nan'),) * 3
+    return {
+        'requests': len(samples),
+        'rejected': sum(status == 503 for _, _, status in samples),  # by admission control
+        'errors': sum(status not in (200, 503) for _, _, status in samples),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+    }
+
+
+async def benchmark(args) -> dict:
+    rng = np.random.default_rng(args.seed)
+    payloads = make_payloads(args, rng)
+    requests = make_requests(args, payloads)
+    weights = parse_mix(args.mix, requests)
+    plan_random = random.Random(args.seed)
+
+    results = []
+    async with TestClient(TestServer(make_app(args, payloads))) as client:
+        warmup_plan = plan_random.choices(list(weights), list(weights.values()), k=args.warmup)
+        await run_level(client, requests, warmup_plan, min(args.concurrency), args.seed)
+        for concurrency in args.concurrency:
+            plan = plan_random.choices(list(weights), list(weights.values()), k=args.requests)
+            samples, duration, cpu = await run_level(client, requests, plan, concurrency, args.seed)
+            result = {
+                'concurrency': concurrency,
+                'duration_sec': round(duration, 3),
+                'throughput_rps': round(len(samples) / duration, 1),
+                'cpu_ms_per_request': round(cpu / len(samples) * 1000, 3),
+                'overall': summarize(samples),
+                'kinds': {kind: summarize([sample for sample in samples if sample[0] == kind]) for kind in weights},
+            }
+            results.append(result)
+            print_result(result)
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'date': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'arguments': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        },
+        'results': results,
+    }
+
+
+def print_result(result: dict) -> None:
+    print(f'concurrency = {result["concurrency"]}: {result["throughput_rps"]} req/s, '
+          f'CPU {result["cpu_ms_per_request"]} ms/req')
+    for kind, summary in {**result['kinds'], 'overall': result['overall']}.items():
+        print(f'\t{kind:<24} n = {summary["requests"]:<6} rejected = {summary["rejected"]:<5} '
+              f'errors = {summary["errors"]:<4} '
+              f'p50 = {summary["p50_ms"]:8.2f} ms   p95 = {summary["p95_ms"]:8.2f} ms   '
+              f'p99 = {summary["p99_ms"]:8.2f} ms')
+
+
+def _cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = make_parser().parse_args()
+    report = asyncio.run(benchmark(args))
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f'Results are written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
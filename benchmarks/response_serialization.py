@@ -0,0 +1,69 @@
+"""
+Response serialization time: pydantic `.json(exclude_none=True)` vs field plans of main_node.controllers.serialization.
+Outputs of both are checked to be byte-identical.
+
+    python -m benchmarks.response_serialization --tasks 100 --repeat 2000
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+
+from main_node.controllers.serialization import dump_model
+from main_node.controllers.json_models import NodeStats
+from main_node.modules.access_control.access_control_service import (AccessCheck, AccessCheckList,
+                                                                      AnonymousDescriptor, AccessControlStats,
+                                                                      RecognitionStats)
+from main_node.modules.access_control.access_control_entities import User
+from main_node.modules.authorization import AuthorizationStats
+from main_node.modules.tasks.tasks_service import TaskList
+from main_node.modules.tasks.tasks_entities import Task
+from main_node.utils import Ok, Error, DatabasePoolStats
+
+
+def make_parser():
+    parser = ArgumentParser()
+    parser.add_argument('--tasks', dest='tasks', type=int, default=100, help='tasks in the task list response')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=2000)
+    return parser
+
+
+def make_responses(tasks_quantity: int) -> dict:
+    user = User(id=1, name='Jörg', surname='Smith', extra_info=None)
+    tasks = [Task(id=i, room_id=3, manager_id=7, body=f'Check the window №{i}', status='UNDONE')
+             for i in range(tasks_quantity)]
+    return {
+        'access check': Ok(result=AccessCheck(is_known=True, have_access=True, user=user)),
+        'unknown face': Ok(result=AccessCheck(is_known=False)),
+        'error': Error(cause='Provided descriptor is invalid.'),
+        'access check list': Ok(result=AccessCheckList(
+            checks=[Ok(result=AccessCheck(is_known=True, have_access=False, user=user)), Error(cause='Invalid.')] * 8)),
+        'descriptor': Ok(result=AnonymousDescriptor(features=[i / 127 - 0.5 for i in range(128)])),
+        f'task list ({tasks_quantity})': Ok(result=TaskList(tasks=tasks)),
+        'stats': Ok(result=NodeStats(
+            access_control=AccessControlStats(recognition=RecognitionStats(current_epoch=4, decisions=10)),
+            authorization=AuthorizationStats.construct(),
+            database_pool=DatabasePoolStats.construct(min_size=2, max_size=10))),
+    }
+
+
+def measure(function, model, repeat: int) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        function(model)
+    return (perf_counter() - start) / repeat
+
+
+def main():
+    args = make_parser().parse_args()
+    print(f'{"response":<20} {"pydantic":>12} {"field plans":>12} {"speedup":>8}')
+    for name, model in make_responses(args.tasks).items():
+        expected = model.json(exclude_none=True)
+        if (actual := dump_model(model)) != expected:
+            raise AssertionError(f'{name}: outputs differ\n{expected}\n{actual}')
+        pydantic_time = measure(lambda m: m.json(exclude_none=True), model, args.repeat)
+        plans_time = measure(dump_model, model, args.repeat)
+        print(f'{name:<20} {pydantic_time * 1e6:9.1f} us {plans_time * 1e6:9.1f} us {pydantic_time / plans_time:7.1f}x')
+    print('outputs are byte-identical')
+
+
+if __name__ == '__main__':
+    main()
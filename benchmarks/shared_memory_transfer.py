@@ -0,0 +1,67 @@
+"""
+Throughput of handing images to worker processes: pickling vs SharedImageRing.
+
+    python -m benchmarks.shared_memory_transfer --images 500
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from time import perf_counter
+
+import numpy as np
+
+from face_recognition.full.shared_images import SharedImageRing, load_image
+
+
+SHAPES = {
+    'normalized 150x150': (150, 150, 3),
+    'raw 1280x720': (720, 1280, 3),
+    'raw 1920x1080': (1080, 1920, 3),
+    'raw 4000x3000': (3000, 4000, 3),
+}
+
+
+def make_parser():
+    parser = ArgumentParser()
+    parser.add_argument('--images', dest='images', type=int, default=200)
+    parser.add_argument('--workers', dest='workers', type=int, default=4)
+    return parser
+
+
+def touch_image(image) -> int:
+    """Worker side: get the image and read it, as detector would do."""
+    return int(load_image(image)[::16, ::16].sum())
+
+
+def transfer(pool: ProcessPoolExecutor, images_quantity: int, window: int, image: np.ndarray,
+             ring: SharedImageRing = None) -> float:
+    start = perf_counter()
+    for _ in range(0, images_quantity, window):
+        arguments = [ring.put(image) if ring is not None else image for _ in range(window)]
+        wait([pool.submit(touch_image, argument) for argument in arguments])
+        if ring is not None:
+            for argument in arguments:
+                ring.release(argument)
+    return perf_counter() - start
+
+
+def main():
+    args = make_parser().parse_args()
+    window = 2 * args.workers
+
+    with ProcessPoolExecutor(args.workers, mp_context=get_context('spawn')) as pool:
+        wait([pool.submit(int) for _ in range(args.workers)])  # start workers before measuring
+        for name, shape in SHAPES.items():
+            image = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+            ring = SharedImageRing(window, image.nbytes)
+            images_quantity = args.images - args.images % window
+            print(name)
+            for method, used_ring in (('pickle', None), ('shared memory', ring)):
+                elapsed = transfer(pool, images_quantity, window, image, used_ring)
+                throughput = images_quantity / elapsed
+                print(f'\t{method:<14} {throughput:10.1f} images/s  {throughput * image.nbytes / 2**20:10.1f} MiB/s')
+            ring.close()
+
+
+if __name__ == '__main__':
+    main()
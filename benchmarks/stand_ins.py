@@ -0,0 +1,249 @@
+"""
+In-memory stand-ins of node repositories and a numpy face recognition backend for benchmarks.
+Repositories keep the interface of main_node repositories, every query can be delayed
+by query_latency_sec to model the database round trip.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Optional, Callable, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+
+from face_recognition import Rectangle, Descriptor, NumpyImage
+from face_recognition.gallery import DESCRIPTOR_SIZE
+from main_node.modules.access_control.access_control_entities import (User, UserAccess, UserFaceDescriptor,
+                                                                      RoomVisitReport)
+from main_node.modules.authorization.authorization_entities import RoomTempToken, RoomLoginToken, AdminToken
+from main_node.modules.tasks.tasks_entities import Task, Status
+
+
+NORMALIZED_SIZE = 150
+ADMIN_TOKEN = 'admin'
+
+
+def room_token(room_id: int) -> str:
+    return f'room-{room_id}'
+
+
+class _Latency:
+    def __init__(self, query_latency_sec: float):
+        self._query_latency_sec = query_latency_sec
+
+    async def _query(self) -> None:
+        if self._query_latency_sec > 0:
+            await asyncio.sleep(self._query_latency_sec)
+
+    async def ensure_listening(self) -> None:
+        pass
+
+
+class StandInAccessControlRepository(_Latency):
+    """Users 1..N with one descriptor each (descriptor id = user id), every user has access to every room."""
+    def __init__(self, descriptors: NDArray[np.float64], rooms_quantity: int, query_latency_sec: float = 0.):
+        super().__init__(query_latency_sec)
+        self._descriptors = {i + 1: descriptor for i, descriptor in enumerate(descriptors)}
+        self._users = {user_id: User(id=user_id, name=f'Name {user_id}', surname=f'Surname {user_id}',
+                                     extra_info=None)
+                       for user_id in self._descriptors}
+        self._rooms = range(1, rooms_quantity + 1)
+        self._visit_ids = count(1)
+
+    async def get_user_by_descriptor_id(self, descriptor_id: int) -> Optional[User]:
+        await self._query()
+        return self._users.get(descriptor_id)
+
+    async def get_user_access_by_descriptor_id(self, descriptor_id: int, room_id: int) -> Optional[UserAccess]:
+        await self._query()
+        if (user := self._users.get(descriptor_id)) is None:
+            return None
+        return UserAccess(user=user, have_access=room_id in self._rooms)
+
+    async def get_users_by_descriptor_ids(self, descriptor_ids: list[int]) -> dict[int, User]:
+        await self._query()
+        return {id_: self._users[id_] for id_ in descriptor_ids if id_ in self._users}
+
+    async def get_user_accesses_by_descriptor_ids(self, descriptor_ids: list[int],
+                                                  room_id: int) -> dict[int, UserAccess]:
+        await self._query()
+        return {id_: UserAccess(user=self._users[id_], have_access=room_id in self._rooms)
+                for id_ in descriptor_ids if id_ in self._users}
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        await self._query()
+        return self._users.get(user_id)
+
+    async def check_access_permission_exist(self, user_id: int, room_id: int) -> bool:
+        await self._query()
+        return user_id in self._users and room_id in self._rooms
+
+    async def get_all_access_permissions(self) -> list[tuple[int, int]]:
+        await self._query()
+        return [(user_id, room_id) for user_id in self._users for room_id in self._rooms]
+
+    async def listen_access_permission_changes(self, callback: Callable[[str], None]) -> None:
+        pass
+
+    async def create_visit_report(self, room_id: int, user_id: int, datetime_: datetime) -> RoomVisitReport:
+        await self._query()
+        return RoomVisitReport(id=next(self._visit_ids), room_id=room_id, user_id=user_id, datetime=datetime_)
+
+    async def allocate_visit_report_ids(self, quantity: int) -> list[int]:
+        await self._query()
+        return [next(self._visit_ids) for _ in range(quantity)]
+
+    async def copy_visit_reports(self, reports: list) -> None:
+        await self._query()
+
+    async def get_face_descriptor(self, descriptor_id: int) -> Optional[UserFaceDescriptor]:
+        await self._query()
+        if (descriptor := self._descriptors.get(descriptor_id)) is None:
+            return None
+        return UserFaceDescriptor(id=descriptor_id, features=descriptor.tolist(), user_id=descriptor_id)
+
+    async def create_face_descriptor(self, user_id: int, features: list[float]) -> UserFaceDescriptor:
+        raise NotImplementedError('Descriptors are fixed in benchmarks.')
+
+    async def delete_face_descriptor(self, descriptor_id: int) -> bool:
+        raise NotImplementedError('Descriptors are fixed in benchmarks.')
+
+    async def listen_face_descriptor_changes(self, callback: Callable[[str], None]) -> None:
+        pass
+
+    async def has_face_descriptor_versions(self) -> bool:
+        return True
+
+    async def get_face_descriptors_version(self) -> int:
+        return 0
+
+    async def get_face_descriptor_ids(self) -> NDArray[np.int64]:
+        return np.fromiter(self._descriptors, dtype=np.int64, count=len(self._descriptors))
+
+    async def get_face_descriptors_changed_since(self, version: int
+                                                 ) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        return np.empty(0, dtype=np.int64), np.empty((0, DESCRIPTOR_SIZE))
+
+    async def get_face_descriptors_by_ids(self, descriptor_ids: list[int]
+                                          ) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        await self._query()
+        ids = [id_ for id_ in descriptor_ids if id_ in self._descriptors]
+        return (np.array(ids, dtype=np.int64),
+                np.array([self._descriptors[id_] for id_ in ids], dtype=np.float64).reshape(len(ids), DESCRIPTOR_SIZE))
+
+    async def copy_all_face_descriptors(self) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        ids = await self.get_face_descriptor_ids()
+        return ids, np.array(list(self._descriptors.values()), dtype=np.float64).reshape(len(ids), DESCRIPTOR_SIZE)
+
+
+class StandInAuthorizationRepository(_Latency):
+    """Room temp tokens are `room_token(room_id)` valid for a day, admin token is ADMIN_TOKEN."""
+    def __init__(self, rooms_quantity: int, query_latency_sec: float = 0.):
+        super().__init__(query_latency_sec)
+        valid_before = datetime.now().astimezone() + timedelta(days=1)
+        self._temp_tokens = {room_token(room_id): RoomTempToken(token=room_token(room_id), room_id=room_id,
+                                                               valid_before=valid_before)
+                             for room_id in range(1, rooms_quantity + 1)}
+
+    async def create_room_temp_token(self, room_id: int, valid_before: datetime) -> RoomTempToken:
+        await self._query()
+        token = self._temp_tokens[room_token(room_id)] = RoomTempToken(token=room_token(room_id), room_id=room_id,
+                                                                       valid_before=valid_before)
+        return token
+
+    async def delete_room_temp_token(self, room_id: int) -> None:
+        await self._query()
+
+    async def get_room_temp_token(self, token: str) -> Optional[RoomTempToken]:
+        await self._query()
+        return self._temp_tokens.get(token)
+
+    async def get_room_login_token(self, token: str) -> Optional[RoomLoginToken]:
+        await self._query()
+        return None
+
+    async def get_admin_token(self, token: str) -> Optional[AdminToken]:
+        await self._query()
+        return AdminToken(token=token, admin_id=1) if token == ADMIN_TOKEN else None
+
+
+class StandInTasksRepository(_Latency):
+    """Every room has the same quantity of undone tasks."""
+    def __init__(self, rooms_quantity: int, tasks_per_room: int, query_latency_sec: float = 0.):
+        super().__init__(query_latency_sec)
+        ids = count(1)
+        self._tasks = {room_id: [Task(id=next(ids), room_id=room_id, manager_id=1,
+                                      body=f'Task {task_number} of room {room_id}', status=Status.UNDONE)
+                                 for task_number in range(tasks_per_room)]
+                       for room_id in range(1, rooms_quantity + 1)}
+
+    async def get_room_tasks(self, room_id: int, status: str) -> list[Task]:
+        await self._query()
+        return [task for task in self._tasks.get(room_id, ()) if task.status == status]
+
+    async def check_manager_exist(self, id_: int):
+        return True
+
+    async def check_room_exist(self, id_: int):
+        return id_ in self._tasks
+
+    async def update_task_status(self, new_status: str, *task_ids: int) -> None:
+        await self._query()
+
+    async def create_task(self, room_id: int, manager_id: int, body: str) -> Task:
+        raise NotImplementedError('Tasks are fixed in benchmarks.')
+
+    async def get_task(self, id_: int) -> Optional[Task]:
+        await self._query()
+        return next((task for tasks in self._tasks.values() for task in tasks if task.id == id_), None)
+
+    async def listen_task_changes(self, callback: Callable[[str], None]) -> None:
+        pass
+
+
+class StandInDetector:
+    """Finds one face in the middle of any image."""
+    def find_faces(self, image: NumpyImage) -> tuple[Rectangle, ...]:
+        height, width = image.shape[:2]
+        size = min(height, width) // 2
+        return Rectangle((width - size) // 2, (height - size) // 2, size, size),
+
+    def check_image_valid(self, image: NumpyImage) -> bool:
+        return image.ndim == 3 and image.shape[2] == 3
+
+
+class StandInNormalizer:
+    """Crops the face rectangle and resizes it, as alignment would."""
+    def normalize_image(self, image: NumpyImage, face_rectangle: Rectangle) -> NumpyImage:
+        face = image[face_rectangle.y:face_rectangle.y + face_rectangle.height,
+                     face_rectangle.x:face_rectangle.x + face_rectangle.width]
+        return np.asarray(Image.fromarray(face).resize((NORMALIZED_SIZE, NORMALIZED_SIZE)))
+
+    def check_image_valid(self, image: NumpyImage) -> bool:
+        return image.ndim == 3 and image.shape[2] == 3
+
+
+class StandInRecognizer:
+    """Descriptor is a fixed random projection of the downsampled image, so equal images give equal descriptors."""
+    DISTANCE_THRESHOLD = 0.6
+
+    def __init__(self, seed: int = 0):
+        self._projection = np.random.default_rng(seed).normal(size=(DESCRIPTOR_SIZE, 30 * 30 * 3))
+
+    def extract_features(self, normalized_image: NumpyImage) -> Descriptor:
+        pixels = normalized_image[::5, ::5].reshape(-1) / 255. - .5
+        descriptor = self._projection @ pixels
+        return descriptor / np.linalg.norm(descriptor)
+
+    def extract_features_batch(self, normalized_images: Sequence[NumpyImage]) -> list[Descriptor]:
+        return [self.extract_features(image) for image in normalized_images]
+
+    def compare_descriptors(self, descriptor_1: Descriptor, descriptor_2: Descriptor) -> bool:
+        return float(np.linalg.norm(descriptor_1 - descriptor_2)) < self.DISTANCE_THRESHOLD
+
+    def check_image_normalized(self, image: NumpyImage) -> bool:
+        return image.shape == (NORMALIZED_SIZE, NORMALIZED_SIZE, 3)
+
+    def check_descriptor_valid(self, descriptor: Descriptor) -> bool:
+        return descriptor.dtype in (np.float64, np.float32) and descriptor.shape == (DESCRIPTOR_SIZE,)
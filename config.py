@@ -7,7 +7,88 @@ database_config = {
     "user": "postgres",
     "password": "postgres"
 }
+database_pool_config = {
+    "min_size": 2,
+    "max_size": 10,
+    "statement_cache_size": 100,  # prepared statements cached per connection
+    "acquire_timeout": 5.0,  # seconds to wait for a free connection
+}
+
+
+# Controllers
+IMAGE_MAX_SIZE_BYTES = 1024 ** 2  # uploaded image file size limit, as aiohttp limits buffered bodies by default
+ENROLLMENT_IMAGE_MAX_SIZE_BYTES = 16 * 1024 ** 2  # image file size limit of descriptor calculation, full photos
+DESCRIPTOR_BATCH_MAX_SIZE = 256  # descriptors checked by one batch request
+ROOM_CHANNEL_HEARTBEAT_SEC = 30  # ping interval of room terminal WebSocket, dead connections are closed
+ROOM_CHANNEL_MAX_IN_FLIGHT = 16  # requests processed concurrently per connection, reading waits beyond it
+ROOM_CHANNEL_MAX_HEADER_SIZE = 4096  # JSON header size allowed in binary frames above IMAGE_MAX_SIZE_BYTES
+
+
+# Admission control of recognition work (face, descriptor checks and descriptor calculation)
+ADMISSION_CONTROL_ENABLED = True  # requests beyond limits wait in a bounded queue, then get 503 with Retry-After
+ADMISSION_CAPACITY = None  # recognition requests processed concurrently, None – cores / BLAS threads
+ADMISSION_MAX_QUEUE_SIZE = 64  # waiting requests, more are rejected at once
+ADMISSION_MAX_WAIT_MS = 1000  # requests waiting longer are rejected
+ADMISSION_ROUTES = {  # "max_concurrency": None – limited by capacity only; lower "priority" is admitted first
+    "check_descriptor": {"max_concurrency": None, "priority": 0},
+    "check_descriptors": {"max_concurrency": None, "priority": 0},
+    "check_face": {"max_concurrency": None, "priority": 1},
+    "stream_frame": {"max_concurrency": None, "priority": 1},
+    "calculate_descriptor": {"max_concurrency": 2, "priority": 2},
+}
+
+
+# Metrics
+METRICS_ENABLED = True  # collect latency histograms and expose them on /metrics in Prometheus format
+METRICS_TOKEN = None  # Bearer token of /metrics scrapes, None – Admin-Token is required instead
 
 
 # Authorization module
 ROOM_TOKEN_LIFETIME_SEC = 3600  # 1 hour
+TOKEN_CACHE_SIZE = 1024  # cached room temp tokens and admin tokens (each)
+TOKEN_CACHE_TTL_SEC = 60
+TOKEN_CACHE_NEGATIVE_TTL_SEC = 5  # lifetime of cached "unknown token" lookups
+
+
+# Face recognition
+DETECTION_IMAGE_SIZE = 1024  # faces are searched on image downscaled to fit this square, None – on full image
+RECOGNITION_ENGINE = 'threads'  # 'threads' – in-process dlib in thread pool, 'processes' – worker processes pool
+RECOGNITION_PROCESSES = None  # worker processes quantity, None – quantity of CPU cores
+SHARED_IMAGE_SLOTS = 8  # shared memory slots for images sent to worker processes, 0 – images are pickled
+SHARED_IMAGE_SLOT_SIZE = 1920 * 1080 * 3  # bigger images are pickled
+RECOGNITION_STAGE_EXECUTORS = {  # executors of 'threads' engine stages, None – all stages in loop default executor
+    # "kind": 'thread' | 'process' (worker processes with own dlib models), "workers": None – cores / BLAS threads
+    "detection": {"kind": "thread", "workers": None},
+    "alignment": {"kind": "thread", "workers": None},
+    "extraction": {"kind": "thread", "workers": None},
+}
+DESCRIPTOR_INDEX = 'exact'  # 'exact' – brute-force scan, 'ivf' – approximate inverted file index
+IVF_INDEX_OPTIONS = {
+    "n_lists": 1024,  # descriptors partitions quantity
+    "n_probe": 16,  # partitions scanned per query, more probes – higher recall and latency
+}
+
+
+# Access control module
+RECOGNITION_BATCH_WINDOW_MS = 5  # time to wait for other images to recognize them by one batch
+RECOGNITION_BATCH_MAX_SIZE = 8  # 1 – batching is disabled
+PERMISSION_INDEX_ENABLED = True  # check access permissions in memory instead of DB
+PERMISSION_RESYNC_INTERVAL_SEC = 300  # full permissions reload period
+DESCRIPTOR_SYNC_ENABLED = True  # apply descriptors added/deleted in DB without restart
+DESCRIPTOR_RECONCILE_INTERVAL_SEC = 60  # period of catching up descriptor changes missed by notifications
+GALLERY_SNAPSHOT_DIR = None  # directory of on-disk gallery copy for fast restarts, None – always load from DB
+STREAM_TRACKER = 'correlation'  # faces of video stream are moved between detections by: 'correlation' – dlib tracker, 'iou' – not moved
+STREAM_DETECTION_INTERVAL = 5  # faces are detected on every n-th processed stream frame
+STREAM_IOU_THRESHOLD = 0.3  # detected face continues a track if their rectangles overlap at least so
+STREAM_MIN_TRACKING_CONFIDENCE = 7.  # track is ended (and face recognized again) below this tracker confidence
+STREAM_MAX_MISSED_DETECTIONS = 1  # track is ended if its face isn't detected more times in a row
+VISIT_WRITE_BEHIND = False  # buffer visit reports and write them by COPY in background
+VISIT_BUFFER_MAX_SIZE = 500  # buffered reports quantity triggering flush
+VISIT_FLUSH_INTERVAL_SEC = 1.0
+VISIT_IDS_BLOCK_SIZE = 100  # visit ids reserved from the sequence at once
+VISIT_BUFFER_MAX_BUFFERED_SIZE = 50000  # reports kept while DB is unavailable, the oldest are dropped beyond it
+VISIT_FLUSH_MAX_ATTEMPTS = 10  # failed flushes after which a report is dropped
+
+
+# Tasks module
+TASK_PUSH_ENABLED = True  # push added and changed tasks to room WebSocket channels
@@ -0,0 +1,25 @@
+-- Adds versions of "UserFaceDescriptor" rows to a database created by database_schema.sql before they existed.
+-- Idempotent: running it again changes nothing. Existing rows get versions of the sequence on the column adding.
+
+alter table "UserFaceDescriptor"
+    add column if not exists version bigserial not null;
+
+create index if not exists "UserFaceDescriptor_version_idx" on "UserFaceDescriptor" (version);
+
+create or replace function bump_user_face_descriptor_version() returns trigger
+    language plpgsql
+as
+$$
+begin
+    new.version = nextval(pg_get_serial_sequence('"UserFaceDescriptor"', 'version'));
+    return new;
+end
+$$;
+
+drop trigger if exists user_face_descriptor_version on "UserFaceDescriptor";
+
+create trigger user_face_descriptor_version
+    before update
+    on "UserFaceDescriptor"
+    for each row
+execute function bump_user_face_descriptor_version();
@@ -57,12 +57,15 @@ create table "UserFaceDescriptor"
     id       serial,
     features double precision[128] not null,
     user_id  integer               not null,
+    version  bigserial             not null,
     primary key (id),
     constraint user_id
         foreign key (user_id) references "User"
             on update cascade on delete cascade
 );
 
+create index on "UserFaceDescriptor" (version);
+
 create table "Manager"
 (
     id serial,
@@ -137,3 +140,84 @@ create table "RoomTempToken"
         foreign key (room_id) references "Room"
             on update cascade on delete cascade
 );
+
+create function notify_user_room_access_permission() returns trigger
+    language plpgsql
+as
+$$
+begin
+    if TG_OP in ('DELETE', 'UPDATE') then
+        perform pg_notify('user_room_access_permission',
+                          json_build_object('operation', 'DELETE',
+                                            'user_id', old.user_id, 'room_id', old.room_id)::text);
+    end if;
+    if TG_OP in ('INSERT', 'UPDATE') then
+        perform pg_notify('user_room_access_permission',
+                          json_build_object('operation', 'INSERT',
+                                            'user_id', new.user_id, 'room_id', new.room_id)::text);
+    end if;
+    return null;
+end
+$$;
+
+create trigger user_room_access_permission_notify
+    after insert or update or delete
+    on "UserRoomAccessPermission"
+    for each row
+execute function notify_user_room_access_permission();
+
+create function notify_user_face_descriptor() returns trigger
+    language plpgsql
+as
+$$
+begin
+    if TG_OP = 'DELETE' then
+        perform pg_notify('user_face_descriptor',
+                          json_build_object('operation', TG_OP, 'id', old.id)::text);
+    else
+        perform pg_notify('user_face_descriptor',
+                          json_build_object('operation', TG_OP, 'id', new.id)::text);
+    end if;
+    return null;
+end
+$$;
+
+create trigger user_face_descriptor_notify
+    after insert or update or delete
+    on "UserFaceDescriptor"
+    for each row
+execute function notify_user_face_descriptor();
+
+-- Every changed descriptor gets a new version, so rows changed since a moment are selected by version
+create function bump_user_face_descriptor_version() returns trigger
+    language plpgsql
+as
+$$
+begin
+    new.version = nextval(pg_get_serial_sequence('"UserFaceDescriptor"', 'version'));
+    return new;
+end
+$$;
+
+create trigger user_face_descriptor_version
+    before update
+    on "UserFaceDescriptor"
+    for each row
+execute function bump_user_face_descriptor_version();
+
+create function notify_room_task() returns trigger
+    language plpgsql
+as
+$$
+begin
+    perform pg_notify('room_task',
+                      json_build_object('operation', TG_OP, 'id', new.id, 'room_id', new.room_id)::text);
+    return null;
+end
+$$;
+
+create trigger room_task_notify
+    after insert or update
+    on "RoomTask"
+    for each row
+execute function notify_room_task();
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Protocol
+from typing import Protocol, Sequence
 
 import numpy as np
 from numpy.typing import NDArray
@@ -16,6 +16,17 @@ class Rectangle:
     def area(self) -> int:
         return self.width * self.height
 
+    def intersection_over_union(self, other: 'Rectangle') -> float:
+        width = min(self.x + self.width, other.x + other.width) - max(self.x, other.x)
+        height = min(self.y + self.height, other.y + other.height) - max(self.y, other.y)
+        intersection = max(width, 0) * max(height, 0)
+        union = self.area + other.area - intersection
+        return intersection / union if union > 0 else 0.
+
+    def scaled(self, x_scale: float, y_scale: float) -> 'Rectangle':
+        return Rectangle(round(self.x * x_scale), round(self.y * y_scale),
+                         round(self.width * x_scale), round(self.height * y_scale))
+
 
 Descriptor = NDArray[np.float64]
 NumpyImage = NDArray[np.uint8]
@@ -34,8 +45,12 @@ class Normalizer(Protocol):
 
 
 class Recognizer(Protocol):
+    DISTANCE_THRESHOLD: float
+
     def extract_features(self, normalized_image: NumpyImage) -> Descriptor: ...
 
+    def extract_features_batch(self, normalized_images: Sequence[NumpyImage]) -> list[Descriptor]: ...
+
     def compare_descriptors(self, descriptor_1: Descriptor, descriptor_2: Descriptor) -> bool: ...
 
     def check_image_normalized(self, image: NumpyImage) -> bool: ...
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Sequence
 
 import numpy as np
 import dlib
@@ -21,7 +22,9 @@ class DlibDetector:
         self._upsample_num_times = upsample_num_times
         self._detector = dlib.get_frontal_face_detector()
 
-        self.check_image_valid = _check_image_valid
+    @staticmethod
+    def check_image_valid(image: NumpyImage) -> bool:
+        return _check_image_valid(image)
 
     def find_faces(self, image: NumpyImage) -> tuple[Rectangle, ...]:
         dlib_rectangles = self._detector(image, self._upsample_num_times)
@@ -34,7 +37,9 @@ class DlibNormalizer:
         self._output_image_size = output_image_size
         self._face_padding = face_padding
 
-        self.check_image_valid = _check_image_valid
+    @staticmethod
+    def check_image_valid(image: NumpyImage) -> bool:
+        return _check_image_valid(image)
 
     def normalize_image(self, image: NumpyImage, face_rectangle: Rectangle) -> NumpyImage:
         shape = self._shape_predictor(image, _convert_to_dlib_rect(face_rectangle))
@@ -42,22 +47,47 @@ class DlibNormalizer:
         return aligned_face
 
 
+class DlibCorrelationTracker:
+    """Tracker following an image region by correlation filter, confidence is peak-to-sidelobe ratio."""
+    def __init__(self):
+        self._tracker = dlib.correlation_tracker()
+
+    def start(self, image: NumpyImage, rectangle: Rectangle) -> None:
+        self._tracker.start_track(image, _convert_to_dlib_rect(rectangle))
+
+    def update(self, image: NumpyImage) -> tuple[Rectangle, float]:
+        confidence = self._tracker.update(image)
+        position = self._tracker.get_position()
+        rectangle = Rectangle(round(position.left()), round(position.top()),
+                              round(position.width()), round(position.height()))
+        return rectangle, confidence
+
+
 class DlibRecognizer:
     # Maximal distance between face descriptors to confirm similarity
-    _DISTANCE_THRESHOLD = 0.6
+    DISTANCE_THRESHOLD = 0.6
 
     def __init__(self, num_jitters: int = 0):
         self._recognizer = dlib.face_recognition_model_v1(str(FACE_RECOGNITION_MODEL_PATH))
         self._num_jitters = num_jitters
 
-        self.check_image_normalized = _check_image_normalized
-        self.check_descriptor_valid = _check_descriptor_valid
+    @staticmethod
+    def check_image_normalized(image: NumpyImage) -> bool:
+        return _check_image_normalized(image)
+
+    @staticmethod
+    def check_descriptor_valid(descriptor: Descriptor) -> bool:
+        return _check_descriptor_valid(descriptor)
 
     def extract_features(self, normalized_image: NumpyImage) -> Descriptor:
         return np.array(self._recognizer.compute_face_descriptor(normalized_image))
 
+    def extract_features_batch(self, normalized_images: Sequence[NumpyImage]) -> list[Descriptor]:
+        descriptors = self._recognizer.compute_face_descriptor(list(normalized_images))
+        return [np.array(descriptor) for descriptor in descriptors]
+
     def compare_descriptors(self, descriptor_1: Descriptor, descriptor_2: Descriptor) -> bool:
-        return np.linalg.norm(descriptor_2 - descriptor_1) < self._DISTANCE_THRESHOLD
+        return np.linalg.norm(descriptor_2 - descriptor_1) < self.DISTANCE_THRESHOLD
 
 
 def _check_image_normalized(image: NumpyImage) -> bool:
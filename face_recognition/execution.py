@@ -0,0 +1,145 @@
+"""
+Executors of CPU-bound recognition stages.
+
+Detection, alignment and descriptors extraction have very different costs, so every stage gets its own pool
+of threads or worker processes instead of sharing the loop default executor with each other and unrelated calls.
+Every pool is sized by available cores divided by threads a BLAS call may use, so one stage alone
+doesn't oversubscribe cores. Pools of all stages together have up to three times more workers:
+a request uses one stage at a time, and total concurrent work is bounded by admission control
+of the caller (its default capacity is the same default_workers_quantity()), not by the pools.
+"""
+import asyncio
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+from time import monotonic
+from typing import Optional, Mapping, Callable, Any
+
+from .face_recognition_protocols import StageObserver
+
+
+STAGES = ('detection', 'alignment', 'extraction')
+BLAS_THREADS_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+@dataclass
+class StageExecution:
+    kind: str = 'thread'  # 'thread' – threads of this process, 'process' – worker processes with own backend
+    workers: Optional[int] = None  # None – default_workers_quantity()
+
+
+@dataclass
+class StageUtilization:
+    kind: str
+    workers: int
+    in_flight: int = 0  # submitted calls not completed yet, waiting or running
+    completed: int = 0
+    busy_sec: float = 0.  # total time workers spent on calls
+    mean_wait_ms: float = 0.  # mean time calls waited for a free worker
+    utilization: float = 0.  # busy share of workers time since the policy is created
+
+
+def available_cores() -> int:
+    """Cores this process may run on, respecting CPU affinity (e.g. of a container)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def blas_threads() -> int:
+    """Threads one BLAS call may use by environment variables, 1 if they aren't set."""
+    values = [int(value) for name in BLAS_THREADS_VARIABLES
+              if (value := os.environ.get(name, '').strip()).isdigit() and int(value) > 0]
+    return max(values, default=1)
+
+
+def default_workers_quantity() -> int:
+    """Workers keeping all cores busy with one BLAS call each."""
+    return max(1, available_cores() // blas_threads())
+
+
+class ExecutionPolicy:
+    """
+    Runs backend methods of recognition stages in executors of the stages.
+    Thread stages call the given backend object, process stages call the backend
+    their worker made by the stage factory of backend_factories (a picklable callable, e.g. backend class).
+    If observe_stage is given, it is called with executor queue wait and duration of every call.
+    """
+    def __init__(self, stages: Mapping[str, StageExecution],
+                 backend_factories: Mapping[str, Callable[[], Any]] = None,
+                 observe_stage: Optional[StageObserver] = None):
+        backend_factories = backend_factories or {}
+        self._executors: dict[str, Executor] = {}
+        self._utilization: dict[str, StageUtilization] = {}
+        for stage in STAGES:
+            execution = stages.get(stage, StageExecution())
+            workers = execution.workers or default_workers_quantity()
+            if execution.kind == 'process':
+                if stage not in backend_factories:
+                    raise ValueError(f'Process executor of {stage} stage requires its backend factory.')
+                self._executors[stage] = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=get_context('spawn'),  # workers must not inherit event loop and DB connections
+                    initializer=_init_stage_process,
+                    initargs=(backend_factories[stage],),
+                )
+            elif execution.kind == 'thread':
+                self._executors[stage] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=stage)
+            else:
+                raise ValueError(f'Unknown executor kind of {stage} stage: {execution.kind!r}.')
+            self._utilization[stage] = StageUtilization(kind=execution.kind, workers=workers)
+        self._observe_stage = observe_stage
+        self._started = monotonic()
+
+    async def run(self, stage: str, backend: Any, method: str, *args):
+        """Call method of the stage backend with args in the stage executor."""
+        utilization = self._utilization[stage]
+        if utilization.kind == 'process':
+            backend = None  # worker calls its own backend
+        utilization.in_flight += 1
+        submitted = monotonic()
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                self._executors[stage], _call_backend, backend, method, args)
+        finally:
+            utilization.in_flight -= 1
+        # Monotonic clock is system-wide, so times of worker processes are comparable
+        wait, duration = started - submitted, finished - started
+        utilization.mean_wait_ms = (utilization.mean_wait_ms * utilization.completed + wait * 1000) \
+            / (utilization.completed + 1)
+        utilization.completed += 1
+        utilization.busy_sec += duration
+        if self._observe_stage is not None:
+            self._observe_stage('executor_wait', wait)
+            self._observe_stage(stage, duration)
+        return result
+
+    def get_utilization(self) -> dict[str, StageUtilization]:
+        elapsed = monotonic() - self._started
+        utilization = {}
+        for stage, stage_utilization in self._utilization.items():
+            utilization[stage] = StageUtilization(**vars(stage_utilization))
+            utilization[stage].utilization = stage_utilization.busy_sec / (stage_utilization.workers * elapsed)
+        return utilization
+
+    def shutdown(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Backend of the stage in a worker process
+_process_backend: Any = None
+
+
+def _init_stage_process(backend_factory: Callable[[], Any]) -> None:
+    global _process_backend
+    _process_backend = backend_factory()
+
+
+def _call_backend(backend: Any, method: str, args: tuple) -> tuple[Any, float, float]:
+    """Call method of backend (of the worker process if None), return result and its start and finish times."""
+    started = monotonic()
+    result = getattr(backend if backend is not None else _process_backend, method)(*args)
+    return result, started, monotonic()
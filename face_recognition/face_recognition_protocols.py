@@ -1,16 +1,45 @@
 from dataclasses import dataclass
-from typing import Protocol, Union, Mapping, Iterable, Optional
+from typing import Protocol, Union, Mapping, Iterable, Optional, Sequence, Callable
 
-from .backend_protocols import Descriptor, NumpyImage
+from numpy.typing import NDArray
+
+from .backend_protocols import Descriptor, NumpyImage, Rectangle
 
 
 NewDescriptors = Union[Mapping[int, Descriptor], Iterable[tuple[int, Descriptor]]]
+# Called with name of a recognition stage and its duration in seconds
+StageObserver = Callable[[str, float], None]
 
 @dataclass
 class RecognitionResult:
     is_known_face: Optional[bool] = None
     descriptor_id: Optional[int] = None
     descriptor: Optional[list[float]] = None
+    epoch: Optional[int] = None  # epoch of descriptors snapshot the decision was made on
+
+
+class IndexSnapshot(Protocol):
+    epoch: int
+
+    def nearest(self, descriptor: Descriptor) -> Optional[tuple[int, float]]: ...
+
+    def nearest_batch(self, descriptors: NDArray) -> tuple[NDArray, NDArray]: ...
+
+
+class DescriptorIndex(Protocol):
+    def __len__(self) -> int: ...
+
+    def snapshot(self) -> IndexSnapshot: ...
+
+    def load(self, ids: NDArray, descriptors: NDArray) -> None: ...
+
+    def descriptors(self) -> tuple[NDArray, NDArray]: ...
+
+    def update(self, new_descriptors: NewDescriptors) -> None: ...
+
+    def remove(self, ids: Iterable[int]) -> None: ...
+
+    def nearest(self, descriptor: Descriptor) -> Optional[tuple[int, float]]: ...
 
 
 class FaceRecognition(Protocol):
@@ -20,7 +49,7 @@ class FaceRecognition(Protocol):
 
     def recognize(self, normalized_image: NumpyImage) -> RecognitionResult: ...
 
-    def normalize(self, image: NumpyImage) -> Optional[NumpyImage]: ...
+    def normalize(self, image: NumpyImage, detection_image: Optional[NumpyImage] = None) -> Optional[NumpyImage]: ...
 
     def check_image_normalized(self) -> bool: ...
 
@@ -28,14 +57,35 @@ class FaceRecognition(Protocol):
 
 
 class AsyncFaceRecognition(Protocol):
+    def load_descriptors(self, ids: NDArray, descriptors: NDArray) -> None: ...
+
+    def get_descriptors(self) -> tuple[NDArray, NDArray]: ...
+
     def update_descriptors(self, new_descriptors: NewDescriptors) -> None: ...
 
+    def remove_descriptors(self, ids: Iterable[int]) -> None: ...
+
     async def calculate_descriptor(self, normalized_image: NumpyImage) -> Descriptor: ...
 
     async def recognize(self, normalized_image: NumpyImage) -> RecognitionResult: ...
 
-    async def normalize(self, image: NumpyImage) -> Optional[NumpyImage]: ...
+    async def recognize_batch(self, normalized_images: Sequence[NumpyImage]) -> list[RecognitionResult]: ...
 
-    def check_image_normalized(self) -> bool: ...
+    def recognize_by_descriptor(self, descriptor: Descriptor) -> RecognitionResult: ...
 
-    def check_image_valid(self) -> bool: ...
+    def recognize_by_descriptors(self, descriptors: Sequence[Descriptor]) -> list[RecognitionResult]: ...
+
+    async def normalize(self, image: NumpyImage,
+                        detection_image: Optional[NumpyImage] = None) -> Optional[NumpyImage]: ...
+
+    async def detect_faces(self, image: NumpyImage) -> tuple[Rectangle, ...]: ...
+
+    async def normalize_face(self, image: NumpyImage, face_rectangle: Rectangle) -> NumpyImage: ...
+
+    def check_image_normalized(self, image: NumpyImage) -> bool: ...
+
+    def check_image_valid(self, image: NumpyImage) -> bool: ...
+
+    def check_descriptor_valid(self, descriptor: Descriptor) -> bool: ...
+
+    def get_descriptors_epoch(self) -> int: ...
@@ -1 +1,2 @@
 from .full_recognition import FaceRecognition
+from .face_recognition_pool import FaceRecognitionPool
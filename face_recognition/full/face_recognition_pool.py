@@ -1,56 +1,154 @@
 import asyncio
 from concurrent.futures import ProcessPoolExecutor
-from typing import Optional, Type, Iterable
+from multiprocessing import get_context
+from typing import Optional, Type, Iterable, Sequence, Union
+
+import numpy as np
+from numpy.typing import NDArray
 
 from ..backend_protocols import (Detector, Normalizer, Recognizer,
                                  Descriptor, NumpyImage, Rectangle)
-from ..face_recognition_protocols import NewDescriptors, RecognitionResult
+from ..face_recognition_protocols import NewDescriptors, RecognitionResult, DescriptorIndex, IndexSnapshot
+from ..gallery import DescriptorGallery
+from .shared_images import SharedImageRing, SharedImage, load_image
+
+
+PoolImage = Union[NumpyImage, SharedImage]
 
 
 class FaceRecognitionPool:
+    """
+    AsyncFaceRecognition running detection, normalization and descriptors extraction
+    in worker processes, each with its own backends. Matching is done in the parent process.
+    Images are handed to workers through a SharedImageRing if shared_slots_quantity > 0,
+    images not fitting a slot (or arriving when all slots are busy) are pickled.
+    """
     def __init__(self,
                  detector: Type[Detector],
                  normalizer: Type[Normalizer],
                  recognizer: Type[Recognizer],
-                 workers_quantity: int):
+                 workers_quantity: Optional[int] = None,
+                 index: Optional[DescriptorIndex] = None,
+                 shared_slots_quantity: int = 0,
+                 shared_slot_size: int = 0):
         self._pool = ProcessPoolExecutor(
             max_workers=workers_quantity,
+            mp_context=get_context('spawn'),  # workers must not inherit event loop and DB connections
             initializer=init_face_recognition_process,
             initargs=(detector, normalizer, recognizer)
         )
-        self._descriptors: dict[int, Descriptor] = {}
+        self._ring: Optional[SharedImageRing] = None
+        if shared_slots_quantity > 0:
+            self._ring = SharedImageRing(shared_slots_quantity, shared_slot_size)
+        self._gallery = index if index is not None else DescriptorGallery()
+        self._distance_threshold = recognizer.DISTANCE_THRESHOLD
 
         self.check_image_valid = detector.check_image_valid
         self.check_image_normalized = recognizer.check_image_normalized
+        self.check_descriptor_valid = recognizer.check_descriptor_valid
+
+    def load_descriptors(self, ids: NDArray, descriptors: NDArray) -> None:
+        self._gallery.load(ids, descriptors)
+
+    def get_descriptors(self) -> tuple[NDArray, NDArray]:
+        return self._gallery.descriptors()
 
     def update_descriptors(self, new_descriptors: NewDescriptors) -> None:
-        self._descriptors.update(new_descriptors)
+        self._gallery.update(new_descriptors)
 
-    async def calculator_descriptor(self, normalized_image: NumpyImage) -> Descriptor:
-        future = self._pool.submit(extract_features, normalized_image)
-        return await asyncio.wrap_future(future)
+    def remove_descriptors(self, ids: Iterable[int]) -> None:
+        self._gallery.remove(ids)
 
-    async def recognize(self, normalizer_image: NumpyImage) -> RecognitionResult:
-        descriptor = await self.calculator_descriptor(normalizer_image)
-        if descriptor_id := self._find_similar_descriptor(descriptor):
-            return RecognitionResult(is_known_face=True, descriptor_id=descriptor_id)
-        else:
-            return RecognitionResult(is_known_face=False, descriptor=list(descriptor))
+    async def calculate_descriptor(self, normalized_image: NumpyImage) -> Descriptor:
+        return await self._run(extract_features, normalized_image)
+
+    async def recognize(self, normalized_image: NumpyImage) -> RecognitionResult:
+        descriptor = await self.calculate_descriptor(normalized_image)
+        return self._recognize_extracted(descriptor, self._gallery.snapshot())
+
+    async def recognize_batch(self, normalized_images: Sequence[NumpyImage]) -> list[RecognitionResult]:
+        descriptors = await self._run(extract_features_batch, *normalized_images)
+        snapshot = self._gallery.snapshot()
+        return [self._recognize_extracted(descriptor, snapshot) for descriptor in descriptors]
 
-    async def normalize(self, image: NumpyImage) -> Optional[NumpyImage]:
-        face_rectangles = self._detector.find_faces(image)
+    def recognize_by_descriptor(self, descriptor: Descriptor) -> RecognitionResult:
+        snapshot = self._gallery.snapshot()
+        if (descriptor_id := self._find_similar_descriptor(descriptor, snapshot)) is not None:
+            return RecognitionResult(is_known_face=True, descriptor_id=descriptor_id, epoch=snapshot.epoch)
+        else:
+            return RecognitionResult(is_known_face=False, epoch=snapshot.epoch)
+
+    def recognize_by_descriptors(self, descriptors: Sequence[Descriptor]) -> list[RecognitionResult]:
+        """Recognize several descriptors by one vectorized query to one snapshot."""
+        if len(descriptors) == 0:
+            return []
+        snapshot = self._gallery.snapshot()
+        matrix = np.array(descriptors, dtype=np.float64).reshape(len(descriptors), -1)
+        ids, distances = snapshot.nearest_batch(matrix)
+        threshold = self._distance_threshold
+        return [RecognitionResult(is_known_face=True, descriptor_id=int(descriptor_id), epoch=snapshot.epoch)
+                if distance < threshold else RecognitionResult(is_known_face=False, epoch=snapshot.epoch)
+                for descriptor_id, distance in zip(ids, distances)]
+
+    def get_descriptors_epoch(self) -> int:
+        return self._gallery.snapshot().epoch
+
+    async def normalize(self, image: NumpyImage,
+                        detection_image: Optional[NumpyImage] = None) -> Optional[NumpyImage]:
+        if detection_image is None:
+            detection_image = image
+        face_rectangles = await self._run(detect_faces, detection_image)
         if face_rectangle := _find_biggest_rectangle(face_rectangles):
-            return self._normalizer.normalize_image(image, face_rectangle)
+            if detection_image is not image:
+                (detection_height, detection_width), (height, width) = detection_image.shape[:2], image.shape[:2]
+                face_rectangle = face_rectangle.scaled(width / detection_width, height / detection_height)
+            return await self._run(normalize_face_image, image, face_rectangle)
         else:
             return None
 
-    def _find_similar_descriptor(self, descriptor: Descriptor) -> Optional[int]:
-        are_similar = self._recognizer.compare_descriptors  # to avoid extra __getattr__
-        for id_, checking_descriptor in self._descriptors.items():
-            if are_similar(descriptor, checking_descriptor):
-                return id_
+    async def detect_faces(self, image: NumpyImage) -> tuple[Rectangle, ...]:
+        return await self._run(detect_faces, image)
+
+    async def normalize_face(self, image: NumpyImage, face_rectangle: Rectangle) -> NumpyImage:
+        return await self._run(normalize_face_image, image, face_rectangle)
+
+    def close(self) -> None:
+        self._pool.shutdown(cancel_futures=True)
+        if self._ring is not None:
+            self._ring.close()
+
+    async def _run(self, function, *args):
+        """Run function in a worker process, NumpyImage arguments are passed through the ring if possible."""
+        args = [self._share(arg) if isinstance(arg, np.ndarray) else arg for arg in args]
+        future = self._pool.submit(function, *args)
+        if shared_images := [arg for arg in args if isinstance(arg, SharedImage)]:
+            # Slots are recycled only when the worker is done with them
+            future.add_done_callback(lambda _: self._release(shared_images))
+        return await asyncio.wrap_future(future)
+
+    def _share(self, image: NumpyImage) -> PoolImage:
+        if self._ring is not None and (shared_image := self._ring.put(image)) is not None:
+            return shared_image
+        return image
+
+    def _release(self, shared_images: list[SharedImage]) -> None:
+        for shared_image in shared_images:
+            self._ring.release(shared_image)
+
+    def _recognize_extracted(self, descriptor: Descriptor, snapshot: IndexSnapshot) -> RecognitionResult:
+        if (descriptor_id := self._find_similar_descriptor(descriptor, snapshot)) is not None:
+            return RecognitionResult(is_known_face=True, descriptor_id=descriptor_id, epoch=snapshot.epoch)
+        else:
+            return RecognitionResult(is_known_face=False, descriptor=list(descriptor), epoch=snapshot.epoch)
+
+    def _find_similar_descriptor(self, descriptor: Descriptor, snapshot: IndexSnapshot) -> Optional[int]:
+        if nearest := snapshot.nearest(descriptor):
+            descriptor_id, distance = nearest
+            if distance < self._distance_threshold:
+                return descriptor_id
         return None
 
+
 def _find_biggest_rectangle(face_rectangles: Iterable[Rectangle]) -> Optional[Rectangle]:
     if face_rectangles:
         return max(face_rectangles, key=lambda rect: rect.area)
@@ -70,16 +168,21 @@ def init_face_recognition_process(detector, normalizer, recognizer):
     _face_recognizer = recognizer()
 
 
-def detect_faces(image: NumpyImage) -> tuple[Rectangle]:
+def detect_faces(image: PoolImage) -> tuple[Rectangle]:
     global _faces_detector
-    return _faces_detector.find_faces(image)
+    return _faces_detector.find_faces(load_image(image))
 
 
-def normalize_face_image(image: NumpyImage, face_rectangle: Rectangle) -> NumpyImage:
+def normalize_face_image(image: PoolImage, face_rectangle: Rectangle) -> NumpyImage:
     global _face_image_normalizer
-    return _face_image_normalizer.normalize_image(image, face_rectangle)
+    return _face_image_normalizer.normalize_image(load_image(image), face_rectangle)
+
+
+def extract_features(image: PoolImage) -> Descriptor:
+    global _face_recognizer
+    return _face_recognizer.extract_features(load_image(image))
 
 
-def extract_features(image: NumpyImage) -> Descriptor:
+def extract_features_batch(*images: PoolImage) -> list[Descriptor]:
     global _face_recognizer
-    return _face_recognizer.extract_features(image)
+    return _face_recognizer.extract_features_batch([load_image(image) for image in images])
@@ -0,0 +1,66 @@
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from typing import Optional, Union
+
+import numpy as np
+
+from ..backend_protocols import NumpyImage
+
+
+@dataclass(frozen=True)
+class SharedImage:
+    """Reference to an image placed to a SharedImageRing slot, cheap to pickle."""
+    memory_name: str
+    slot: int
+    offset: int
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class SharedImageRing:
+    """
+    Shared memory segment split into fixed size slots for handing images to worker processes
+    without pickling them. Slot must be released when the worker is done with the image.
+    """
+    def __init__(self, slots_quantity: int, slot_size: int):
+        self._slot_size = slot_size
+        self._memory = SharedMemory(create=True, size=slots_quantity * slot_size)
+        self._free_slots = deque(range(slots_quantity))
+        self._lock = Lock()  # slots are released from executor threads
+
+    def put(self, image: NumpyImage) -> Optional[SharedImage]:
+        """Copy image to a free slot. None if image is larger than slot or all slots are busy."""
+        if image.nbytes > self._slot_size:
+            return None
+        with self._lock:
+            if not self._free_slots:
+                return None
+            slot = self._free_slots.popleft()
+        offset = slot * self._slot_size
+        destination = np.ndarray(image.shape, dtype=image.dtype, buffer=self._memory.buf, offset=offset)
+        destination[...] = image
+        return SharedImage(self._memory.name, slot, offset, image.shape, image.dtype.str)
+
+    def release(self, shared_image: SharedImage) -> None:
+        with self._lock:
+            self._free_slots.append(shared_image.slot)
+
+    def close(self) -> None:
+        self._memory.close()
+        self._memory.unlink()
+
+
+_attached_memories: dict[str, SharedMemory] = {}
+
+
+def load_image(image: Union[NumpyImage, SharedImage]) -> NumpyImage:
+    """Return image itself or a view of the shared memory slot it was placed to."""
+    if not isinstance(image, SharedImage):
+        return image
+    if (memory := _attached_memories.get(image.memory_name)) is None:
+        # Workers share the parent resource tracker, so the segment is unlinked only by the parent
+        memory = SharedMemory(name=image.memory_name)
+        _attached_memories[image.memory_name] = memory
+    return np.ndarray(image.shape, dtype=np.dtype(image.dtype), buffer=memory.buf, offset=image.offset)
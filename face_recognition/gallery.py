@@ -0,0 +1,187 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional, Iterable
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .backend_protocols import Descriptor
+from .face_recognition_protocols import NewDescriptors
+
+
+DESCRIPTOR_SIZE = 128
+# Batch queries are split into chunks, so the (chunk, N) distances matrix stays about 32 MB
+_BATCH_DISTANCES_SIZE = 1 << 22
+
+
+@dataclass(frozen=True)
+class GallerySnapshot:
+    """
+    Immutable state of the gallery published under an epoch number.
+    Arrays are views of the first `len(ids)` rows of gallery storage, these rows are never written again.
+    """
+    epoch: int
+    ids: NDArray[np.int64]
+    matrix: NDArray[np.float64]
+    squared_norms: NDArray[np.float64]
+
+    def nearest(self, descriptor: Descriptor) -> Optional[tuple[int, float]]:
+        """Return (id, distance) of the descriptor closest to the given one or None if gallery is empty."""
+        if len(self.ids) == 0:
+            return None
+        # |x - q|² = |x|² - 2·x·q + |q|², the only O(N) work is one matrix-vector product
+        squared_distances = self.squared_norms - 2 * (self.matrix @ descriptor)
+        row = int(np.argmin(squared_distances))
+        squared_distance = max(squared_distances[row] + descriptor @ descriptor, 0.)
+        return int(self.ids[row]), float(np.sqrt(squared_distance))
+
+    def nearest_batch(self, descriptors: NDArray[np.float64]) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """
+        Return ids and distances of descriptors closest to each row of (M, 128) descriptors matrix
+        by one matrix product per chunk of rows. Id is -1 and distance is inf if gallery is empty.
+        """
+        ids = np.full(len(descriptors), -1, dtype=np.int64)
+        distances = np.full(len(descriptors), np.inf)
+        if len(self.ids) == 0:
+            return ids, distances
+        chunk_size = max(1, _BATCH_DISTANCES_SIZE // len(self.ids))
+        for start in range(0, len(descriptors), chunk_size):
+            chunk = descriptors[start:start + chunk_size]
+            squared_distances = self.squared_norms - 2 * (chunk @ self.matrix.T)
+            rows = np.argmin(squared_distances, axis=1)
+            squared_distances = squared_distances[np.arange(len(chunk)), rows] + np.einsum('ij,ij->i', chunk, chunk)
+            ids[start:start + len(chunk)] = self.ids[rows]
+            distances[start:start + len(chunk)] = np.sqrt(np.maximum(squared_distances, 0.))
+        return ids, distances
+
+
+class DescriptorGallery:
+    """
+    Known face descriptors stored as one contiguous (N, 128) matrix with a parallel ids array.
+    Query is answered by a single batched distance computation over the whole matrix.
+
+    Readers work with immutable snapshots and never block. Writers are serialized and publish a new snapshot:
+    appended rows are written past the end of the current snapshot views (no copy),
+    overwriting or removing rows copies storage first (copy-on-write).
+    """
+    def __init__(self, initial_capacity: int = 1024, descriptor_size: int = DESCRIPTOR_SIZE):
+        self._descriptor_size = descriptor_size
+        self._matrix: NDArray[np.float64] = np.empty((initial_capacity, descriptor_size), dtype=np.float64)
+        self._squared_norms: NDArray[np.float64] = np.empty(initial_capacity, dtype=np.float64)
+        self._ids: NDArray[np.int64] = np.empty(initial_capacity, dtype=np.int64)
+        self._rows: dict[int, int] = {}  # descriptor id -> matrix row
+        self._size = 0
+        self._epoch = 0
+        self._write_lock = Lock()
+        self._snapshot = self._make_snapshot()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def snapshot(self) -> GallerySnapshot:
+        return self._snapshot
+
+    def load(self, ids: NDArray, descriptors: NDArray) -> None:
+        """
+        Replace content by given ids and (N, 128) descriptors matrix.
+        Arrays are used as storage without copying, so a read-only memory-mapped matrix stays shared
+        until the first change copies it.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        descriptors = np.asarray(descriptors, dtype=np.float64)
+        with self._write_lock:
+            self._matrix = descriptors
+            self._squared_norms = np.einsum('ij,ij->i', descriptors, descriptors)
+            self._ids = ids
+            self._rows = dict(zip(ids.tolist(), range(len(ids))))
+            self._size = len(ids)
+            self._publish()
+
+    def update(self, new_descriptors: NewDescriptors) -> None:
+        """Append new descriptors, already known ids are overwritten. Of repeated ids the last descriptor is kept."""
+        items = new_descriptors.items() if isinstance(new_descriptors, Mapping) else dict(new_descriptors).items()
+        overwritten_rows, overwritten_ids, overwritten_descriptors = [], [], []
+        appended_ids, appended_descriptors = [], []
+        with self._write_lock:
+            for id_, descriptor in items:
+                if (row := self._rows.get(id_)) is not None:
+                    overwritten_rows.append(row)
+                    overwritten_ids.append(id_)
+                    overwritten_descriptors.append(descriptor)
+                else:
+                    appended_ids.append(id_)
+                    appended_descriptors.append(descriptor)
+            if overwritten_rows:
+                self._copy_storage(len(self._ids))
+                self._write_rows(np.array(overwritten_rows), np.array(overwritten_ids, dtype=np.int64),
+                                 np.asarray(overwritten_descriptors, dtype=np.float64))
+            if appended_ids:
+                self._append(np.array(appended_ids, dtype=np.int64),
+                             np.asarray(appended_descriptors, dtype=np.float64))
+            if overwritten_rows or appended_ids:
+                self._publish()
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """
+        Remove descriptors by ids, the last row is moved into the freed one.
+        Unknown ids are ignored, repeated ones are removed once.
+        """
+        with self._write_lock:
+            rows = [(id_, row) for id_ in dict.fromkeys(ids) if (row := self._rows.get(id_)) is not None]
+            if not rows:
+                return
+            self._copy_storage(len(self._ids))
+            for id_, _ in rows:
+                row = self._rows.pop(id_)
+                last = self._size - 1
+                if row != last:
+                    moved_id = int(self._ids[last])
+                    self._matrix[row] = self._matrix[last]
+                    self._squared_norms[row] = self._squared_norms[last]
+                    self._ids[row] = moved_id
+                    self._rows[moved_id] = row
+                self._size = last
+            self._publish()
+
+    def descriptors(self) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """Return ids and descriptors matrix of the current snapshot."""
+        snapshot = self._snapshot
+        return snapshot.ids, snapshot.matrix
+
+    def nearest(self, descriptor: Descriptor) -> Optional[tuple[int, float]]:
+        return self._snapshot.nearest(descriptor)
+
+    def _append(self, ids: NDArray[np.int64], descriptors: NDArray[np.float64]) -> None:
+        required_capacity = self._size + len(ids)
+        if required_capacity > len(self._ids):
+            self._copy_storage(max(required_capacity, 2 * len(self._ids)))
+        rows = np.arange(self._size, required_capacity)
+        self._write_rows(rows, ids, descriptors)
+        self._rows.update(zip(ids.tolist(), rows.tolist()))
+        self._size = required_capacity
+
+    def _write_rows(self, rows: NDArray, ids: NDArray[np.int64], descriptors: NDArray[np.float64]) -> None:
+        self._matrix[rows] = descriptors
+        self._squared_norms[rows] = np.einsum('ij,ij->i', descriptors, descriptors)
+        self._ids[rows] = ids
+
+    def _copy_storage(self, capacity: int) -> None:
+        """Move storage to new arrays, so rows visible to published snapshots stay untouched."""
+        matrix = np.empty((capacity, self._descriptor_size), dtype=np.float64)
+        squared_norms = np.empty(capacity, dtype=np.float64)
+        ids = np.empty(capacity, dtype=np.int64)
+        matrix[:self._size] = self._matrix[:self._size]
+        squared_norms[:self._size] = self._squared_norms[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._squared_norms, self._ids = matrix, squared_norms, ids
+
+    def _publish(self) -> None:
+        self._epoch += 1
+        self._snapshot = self._make_snapshot()
+
+    def _make_snapshot(self) -> GallerySnapshot:
+        return GallerySnapshot(epoch=self._epoch,
+                               ids=self._ids[:self._size],
+                               matrix=self._matrix[:self._size],
+                               squared_norms=self._squared_norms[:self._size])
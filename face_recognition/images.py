@@ -0,0 +1,23 @@
+from io import BytesIO
+from math import ceil
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from .backend_protocols import NumpyImage
+
+
+def decode_image(data: bytes, detection_size: Optional[int] = None) -> tuple[NumpyImage, Optional[NumpyImage]]:
+    """
+    Decode image file content to the image and its copy downscaled by an integer factor
+    to fit into detection_size x detection_size square (None if detection_size is None or image fits already).
+    Arrays are writable copies of decoded pixels: numpy views of Pillow buffers are read-only,
+    which dlib functions taking mutable images reject.
+    """
+    image = Image.open(BytesIO(data))
+    image.load()
+    detection_image = None
+    if detection_size is not None and max(image.size) > detection_size:
+        detection_image = np.array(image.reduce(ceil(max(image.size) / detection_size)))
+    return np.array(image), detection_image
@@ -0,0 +1,251 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional, Iterable, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .backend_protocols import Descriptor
+from .face_recognition_protocols import NewDescriptors, DescriptorIndex
+from .gallery import DescriptorGallery, GallerySnapshot
+
+
+# Assignment of descriptors to centroids is done by chunks to bound the (chunk, lists) distances matrix
+_ASSIGNMENT_CHUNK_SIZE = 16384
+
+
+@dataclass(frozen=True)
+class IVFSnapshot:
+    """Immutable state of IVFIndex: centroids and snapshots of all lists taken under one epoch."""
+    epoch: int
+    n_probe: int
+    centroids: NDArray[np.float64]
+    centroid_squared_norms: NDArray[np.float64]
+    lists: tuple[GallerySnapshot, ...]
+
+    def nearest(self, descriptor: Descriptor) -> Optional[tuple[int, float]]:
+        centroid_distances = self.centroid_squared_norms - 2 * (self.centroids @ descriptor)
+        n_probe = min(self.n_probe, len(self.lists))
+        probed = np.argpartition(centroid_distances, n_probe - 1)[:n_probe]
+
+        best: Optional[tuple[int, float]] = None
+        for list_number in probed:
+            candidate = self.lists[list_number].nearest(descriptor)
+            if candidate is not None and (best is None or candidate[1] < best[1]):
+                best = candidate
+        return best
+
+    def nearest_batch(self, descriptors: NDArray[np.float64]) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """Like GallerySnapshot.nearest_batch, every list is scanned once for all queries probing it."""
+        ids = np.full(len(descriptors), -1, dtype=np.int64)
+        distances = np.full(len(descriptors), np.inf)
+        centroid_distances = self.centroid_squared_norms - 2 * (descriptors @ self.centroids.T)
+        n_probe = min(self.n_probe, len(self.lists))
+        probed = np.argpartition(centroid_distances, n_probe - 1, axis=1)[:, :n_probe]
+
+        for list_number in np.unique(probed):
+            queries = np.flatnonzero((probed == list_number).any(axis=1))
+            list_ids, list_distances = self.lists[list_number].nearest_batch(descriptors[queries])
+            closer = list_distances < distances[queries]
+            ids[queries[closer]] = list_ids[closer]
+            distances[queries[closer]] = list_distances[closer]
+        return ids, distances
+
+
+class IVFIndex:
+    """
+    Inverted file index: descriptors are partitioned by k-means centroids into lists,
+    a query scans only n_probe lists with the nearest centroids.
+    Distances inside scanned lists are exact, so the returned distance can be
+    compared with the recognizer threshold as is.
+
+    Speed/recall knobs:
+        n_lists – quantity of partitions (more lists – smaller lists to scan),
+        n_probe – quantity of lists scanned per query (more probes – higher recall, slower query),
+        train_size – quantity of descriptors k-means is trained on,
+        kmeans_iterations – quantity of Lloyd iterations.
+    Until min_train_size descriptors are added the index is an exact gallery.
+
+    Like DescriptorGallery, queries run on immutable snapshots, every write publishes a new one.
+    """
+    def __init__(self, n_lists: int = 1024, n_probe: int = 16,
+                 min_train_size: Optional[int] = None, train_size: Optional[int] = None,
+                 kmeans_iterations: int = 10, seed: int = 0):
+        self._n_lists = n_lists
+        self._n_probe = n_probe
+        self._min_train_size = min_train_size if min_train_size is not None else 39 * n_lists
+        self._train_size = train_size if train_size is not None else 256 * n_lists
+        self._kmeans_iterations = kmeans_iterations
+        self._random = np.random.default_rng(seed)
+
+        self._untrained = DescriptorGallery()
+        self._centroids: Optional[NDArray[np.float64]] = None
+        self._centroid_squared_norms: Optional[NDArray[np.float64]] = None
+        self._lists: list[DescriptorGallery] = []
+        self._list_by_id: dict[int, int] = {}
+        self._epoch = 0
+        self._write_lock = Lock()
+        self._snapshot: Union[GallerySnapshot, IVFSnapshot] = self._untrained.snapshot()
+
+    @property
+    def n_probe(self) -> int:
+        return self._n_probe
+
+    @n_probe.setter
+    def n_probe(self, n_probe: int) -> None:
+        with self._write_lock:
+            self._n_probe = n_probe
+            self._publish()
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._list_by_id) if self.is_trained else len(self._untrained)
+
+    def snapshot(self) -> Union[GallerySnapshot, IVFSnapshot]:
+        return self._snapshot
+
+    def load(self, ids: NDArray, descriptors: NDArray) -> None:
+        """Replace content by given descriptors, index is retrained if there are enough of them."""
+        with self._write_lock:
+            self._centroids = None
+            self._centroid_squared_norms = None
+            self._lists = []
+            self._list_by_id = {}
+            self._untrained = DescriptorGallery()
+            self._untrained.load(ids, descriptors)
+            if len(self._untrained) >= self._min_train_size:
+                self._train()
+            self._publish()
+
+    def descriptors(self) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """Return ids and descriptors matrix of the current snapshot."""
+        snapshot = self._snapshot
+        if isinstance(snapshot, GallerySnapshot):
+            return snapshot.ids, snapshot.matrix
+        return (np.concatenate([inverted_list.ids for inverted_list in snapshot.lists]),
+                np.concatenate([inverted_list.matrix for inverted_list in snapshot.lists]))
+
+    def update(self, new_descriptors: NewDescriptors) -> None:
+        with self._write_lock:
+            if not self.is_trained:
+                self._untrained.update(new_descriptors)
+                if len(self._untrained) >= self._min_train_size:
+                    self._train()
+                self._publish()
+                return
+
+            # Repeated ids would be added to several lists, the last descriptor is kept as by DescriptorGallery
+            items = new_descriptors.items() if isinstance(new_descriptors, Mapping) else dict(new_descriptors).items()
+            ids, descriptors = [], []
+            for id_, descriptor in items:
+                ids.append(id_)
+                descriptors.append(descriptor)
+            if ids:
+                self._add(np.array(ids, dtype=np.int64), np.asarray(descriptors, dtype=np.float64))
+                self._publish()
+
+    def remove(self, ids: Iterable[int]) -> None:
+        with self._write_lock:
+            if not self.is_trained:
+                self._untrained.remove(ids)
+            else:
+                self._remove(ids)
+            self._publish()
+
+    def nearest(self, descriptor: Descriptor) -> Optional[tuple[int, float]]:
+        return self._snapshot.nearest(descriptor)
+
+    def train(self) -> None:
+        """(Re)train centroids on stored descriptors and redistribute them to the lists."""
+        with self._write_lock:
+            self._train()
+            self._publish()
+
+    def _train(self) -> None:
+        if self.is_trained:
+            ids, descriptors = self._collect()
+        else:
+            ids, descriptors = (a.copy() for a in self._untrained.descriptors())
+        if len(ids) < self._n_lists:
+            raise ValueError(f'At least {self._n_lists} descriptors are required to train index.')
+
+        self._centroids = self._kmeans(descriptors)
+        self._centroid_squared_norms = np.einsum('ij,ij->i', self._centroids, self._centroids)
+        self._lists = [DescriptorGallery(initial_capacity=16) for _ in range(self._n_lists)]
+        self._list_by_id = {}
+        self._untrained = DescriptorGallery()
+        self._add(ids, descriptors)
+
+    def _add(self, ids: NDArray[np.int64], descriptors: NDArray[np.float64]) -> None:
+        # Ids moving to another list must leave the old one
+        self._remove(id_ for id_ in ids.tolist() if id_ in self._list_by_id)
+        assignment = self._assign(descriptors, self._centroids)
+        order = np.argsort(assignment, kind='stable')
+        list_numbers, starts = np.unique(assignment[order], return_index=True)
+        for list_number, rows in zip(list_numbers.tolist(), np.split(order, starts[1:])):
+            self._lists[list_number].update(zip(ids[rows].tolist(), descriptors[rows]))
+        self._list_by_id.update(zip(ids.tolist(), assignment.tolist()))
+
+    def _remove(self, ids: Iterable[int]) -> None:
+        for id_ in ids:
+            if (list_number := self._list_by_id.pop(id_, None)) is not None:
+                self._lists[list_number].remove((id_,))
+
+    def _publish(self) -> None:
+        self._epoch += 1
+        if not self.is_trained:
+            # Epoch of the untrained gallery is local to it, the index numbers snapshots by its own epoch
+            untrained = self._untrained.snapshot()
+            self._snapshot = GallerySnapshot(epoch=self._epoch, ids=untrained.ids, matrix=untrained.matrix,
+                                             squared_norms=untrained.squared_norms)
+        else:
+            self._snapshot = IVFSnapshot(epoch=self._epoch,
+                                         n_probe=self._n_probe,
+                                         centroids=self._centroids,
+                                         centroid_squared_norms=self._centroid_squared_norms,
+                                         lists=tuple(inverted_list.snapshot() for inverted_list in self._lists))
+
+    def _collect(self) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        ids, descriptors = zip(*(inverted_list.descriptors() for inverted_list in self._lists))
+        return np.concatenate(ids), np.concatenate(descriptors)
+
+    def _kmeans(self, descriptors: NDArray[np.float64]) -> NDArray[np.float64]:
+        """Lloyd's k-means on a random sample of descriptors."""
+        sample_size = min(len(descriptors), self._train_size)
+        sample = descriptors[self._random.choice(len(descriptors), sample_size, replace=False)]
+        centroids = sample[self._random.choice(sample_size, self._n_lists, replace=False)].copy()
+        for _ in range(self._kmeans_iterations):
+            assignment = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=self._n_lists)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+            # Empty clusters are reseeded by random sample points
+            if (empty_quantity := int((~non_empty).sum())) > 0:
+                centroids[~non_empty] = sample[self._random.choice(sample_size, empty_quantity)]
+        return centroids
+
+    @staticmethod
+    def _assign(descriptors: NDArray[np.float64], centroids: NDArray[np.float64]) -> NDArray[np.int64]:
+        """Return number of the nearest centroid for each descriptor."""
+        centroid_squared_norms = np.einsum('ij,ij->i', centroids, centroids)
+        assignment = np.empty(len(descriptors), dtype=np.int64)
+        for start in range(0, len(descriptors), _ASSIGNMENT_CHUNK_SIZE):
+            chunk = descriptors[start:start + _ASSIGNMENT_CHUNK_SIZE]
+            distances = centroid_squared_norms - 2 * (chunk @ centroids.T)
+            assignment[start:start + len(chunk)] = np.argmin(distances, axis=1)
+        return assignment
+
+
+def make_descriptor_index(kind: str, **options) -> DescriptorIndex:
+    """Build descriptor index by its name: 'exact' – brute-force gallery, 'ivf' – IVFIndex."""
+    if kind == 'exact':
+        return DescriptorGallery()
+    if kind == 'ivf':
+        return IVFIndex(**options)
+    raise ValueError(f'Unknown descriptor index kind: {kind!r}.')
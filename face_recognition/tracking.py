@@ -0,0 +1,91 @@
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Protocol, Optional, Callable, Sequence
+
+from .backend_protocols import NumpyImage, Rectangle
+
+
+class Tracker(Protocol):
+    def start(self, image: NumpyImage, rectangle: Rectangle) -> None: ...
+
+    def update(self, image: NumpyImage) -> tuple[Rectangle, float]:
+        """Return new position of the tracked object and confidence of it."""
+
+
+@dataclass
+class Track:
+    id: int
+    rectangle: Rectangle
+    tracker: Optional[Tracker] = field(default=None, repr=False)
+    missed_detections: int = 0
+
+
+class FaceTracks:
+    """
+    Faces of a video stream followed across frames, so a face is recognized once per track.
+    Faces detected periodically are associated to tracks by rectangles IoU, unmatched ones start new tracks.
+    Between detections tracks are moved by visual trackers (if tracker_factory is given),
+    a track whose tracker confidence drops below min_confidence is ended, so the face gets a new track
+    and is recognized again at the next detection.
+    """
+    def __init__(self, tracker_factory: Optional[Callable[[], Tracker]] = None,
+                 iou_threshold: float = 0.3, min_confidence: float = 7.,
+                 max_missed_detections: int = 1):
+        self._tracker_factory = tracker_factory
+        self._iou_threshold = iou_threshold
+        self._min_confidence = min_confidence
+        self._max_missed_detections = max_missed_detections
+        self._tracks: list[Track] = []
+        self._ids = count(1)
+
+    @property
+    def tracks(self) -> tuple[Track, ...]:
+        return tuple(self._tracks)
+
+    def update_by_detection(self, image: NumpyImage, rectangles: Sequence[Rectangle]) -> list[Track]:
+        """Associate detected faces to tracks, return tracks started by this detection."""
+        pairs = sorted(((track.rectangle.intersection_over_union(rectangle), track_number, rectangle_number)
+                        for track_number, track in enumerate(self._tracks)
+                        for rectangle_number, rectangle in enumerate(rectangles)), reverse=True)
+        matched_tracks, matched_rectangles = set(), set()
+        for iou, track_number, rectangle_number in pairs:
+            if iou < self._iou_threshold:
+                break
+            if track_number in matched_tracks or rectangle_number in matched_rectangles:
+                continue
+            matched_tracks.add(track_number)
+            matched_rectangles.add(rectangle_number)
+            track = self._tracks[track_number]
+            track.rectangle, track.missed_detections = rectangles[rectangle_number], 0
+            self._start_tracker(track, image)
+
+        tracks = []
+        for track_number, track in enumerate(self._tracks):
+            if track_number not in matched_tracks:
+                track.missed_detections += 1
+            if track.missed_detections <= self._max_missed_detections:
+                tracks.append(track)
+        new_tracks = [Track(id=next(self._ids), rectangle=rectangle)
+                      for rectangle_number, rectangle in enumerate(rectangles)
+                      if rectangle_number not in matched_rectangles]
+        for track in new_tracks:
+            self._start_tracker(track, image)
+        self._tracks = tracks + new_tracks
+        return new_tracks
+
+    def update_by_tracking(self, image: NumpyImage) -> None:
+        """Move tracks by their trackers, tracks lost by trackers are ended."""
+        if self._tracker_factory is None:
+            return
+        tracks = []
+        for track in self._tracks:
+            rectangle, confidence = track.tracker.update(image)
+            if confidence >= self._min_confidence:
+                track.rectangle = rectangle
+                tracks.append(track)
+        self._tracks = tracks
+
+    def _start_tracker(self, track: Track, image: NumpyImage) -> None:
+        if self._tracker_factory is not None:
+            track.tracker = self._tracker_factory()
+            track.tracker.start(image, track.rectangle)
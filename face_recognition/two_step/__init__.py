@@ -1,2 +1,3 @@
 from .recognizer import FaceRecognizer, RecognitionResult
 from .face_image_normalizer import FaceImageNormalizer
+from .threaded_recognition import ThreadedFaceRecognition
@@ -10,13 +10,50 @@ class FaceImageNormalizer:
 
         self.check_image_valid = self._detector.check_image_valid
 
-    def normalize(self, image: NumpyImage) -> Optional[NumpyImage]:
-        face_rectangles = self._detector.find_faces(image)
-        if face_rectangle := _find_biggest_rectangle(face_rectangles):
+    @property
+    def detector(self) -> Detector:
+        return self._detector
+
+    @property
+    def normalizer(self) -> Normalizer:
+        return self._normalizer
+
+    def find_faces(self, image: NumpyImage) -> tuple[Rectangle, ...]:
+        return self._detector.find_faces(image)
+
+    def normalize_face(self, image: NumpyImage, face_rectangle: Rectangle) -> NumpyImage:
+        return self._normalizer.normalize_image(image, face_rectangle)
+
+    def normalize(self, image: NumpyImage, detection_image: Optional[NumpyImage] = None) -> Optional[NumpyImage]:
+        """
+        Find the biggest face and align it. Faces can be searched on a downscaled copy of the image
+        (detection_image), the face is aligned from the full resolution image anyway.
+        """
+        if detection_image is None:
+            detection_image = image
+        face_rectangles = self._detector.find_faces(detection_image)
+        if face_rectangle := self.select_face(face_rectangles, detection_image, image):
             return self._normalizer.normalize_image(image, face_rectangle)
         else:
             return None
 
+    @staticmethod
+    def select_face(face_rectangles: Iterable[Rectangle], detection_image: NumpyImage,
+                    image: NumpyImage) -> Optional[Rectangle]:
+        """The biggest of faces found on detection_image in coordinates of image, None if there are no faces."""
+        if face_rectangle := _find_biggest_rectangle(face_rectangles):
+            return _to_image_scale(face_rectangle, detection_image, image)
+        return None
+
+
+def _to_image_scale(rectangle: Rectangle, detection_image: NumpyImage, image: NumpyImage) -> Rectangle:
+    """Map rectangle found on detection_image to coordinates of image."""
+    if detection_image is image:
+        return rectangle
+    (detection_height, detection_width), (height, width) = detection_image.shape[:2], image.shape[:2]
+    return rectangle.scaled(width / detection_width, height / detection_height)
+
+
 def _find_biggest_rectangle(face_rectangles: Iterable[Rectangle]) -> Optional[Rectangle]:
     if face_rectangles:
         return max(face_rectangles, key=lambda rect: rect.area)
@@ -1,39 +1,116 @@
-from typing import Optional
+from time import perf_counter
+from typing import Optional, Sequence, Iterable
+
+import numpy as np
+from numpy.typing import NDArray
 
 from ..backend_protocols import Recognizer, Descriptor, NumpyImage
-from ..face_recognition_protocols import NewDescriptors, RecognitionResult
+from ..face_recognition_protocols import (NewDescriptors, RecognitionResult, DescriptorIndex, IndexSnapshot,
+                                         StageObserver)
+from ..gallery import DescriptorGallery
 
 
 class FaceRecognizer:
-    def __init__(self, recognizer: Recognizer):
+    def __init__(self, recognizer: Recognizer, index: Optional[DescriptorIndex] = None,
+                 observe_stage: Optional[StageObserver] = None):
         self._recognizer = recognizer
-        self._descriptors: dict[int, Descriptor] = dict()
+        self._gallery = index if index is not None else DescriptorGallery()
+        self._observe_stage = observe_stage
 
         self.check_image_normalized = self._recognizer.check_image_normalized
         self.check_descriptor_valid = self._recognizer.check_descriptor_valid
 
+    @property
+    def recognizer(self) -> Recognizer:
+        return self._recognizer
+
+    def load_descriptors(self, ids: NDArray, descriptors: NDArray) -> None:
+        self._gallery.load(ids, descriptors)
+
+    def get_descriptors(self) -> tuple[NDArray, NDArray]:
+        return self._gallery.descriptors()
+
     def update_descriptors(self, new_descriptors: NewDescriptors) -> None:
-        self._descriptors.update(new_descriptors)
+        self._gallery.update(new_descriptors)
+
+    def remove_descriptors(self, ids: Iterable[int]) -> None:
+        self._gallery.remove(ids)
 
     def calculate_descriptor(self, normalizes_image: NumpyImage) -> Descriptor:
         return self._recognizer.extract_features(normalizes_image)
 
     def recognize(self, normalized_image: NumpyImage) -> RecognitionResult:
+        start = perf_counter()
         descriptor = self._recognizer.extract_features(normalized_image)
-        if descriptor_id := self._find_similar_descriptor(descriptor):
-            return RecognitionResult(is_known_face=True, descriptor_id=descriptor_id)
-        else:
-            return RecognitionResult(is_known_face=False, descriptor=list(descriptor))
+        matching_start = perf_counter()
+        result = self._recognize_extracted(descriptor, self._gallery.snapshot())
+        self._observe(start, matching_start)
+        return result
+
+    def recognize_batch(self, normalized_images: Sequence[NumpyImage]) -> list[RecognitionResult]:
+        """Recognize several faces by one batched descriptors extraction."""
+        start = perf_counter()
+        descriptors = self._recognizer.extract_features_batch(normalized_images)
+        matching_start = perf_counter()
+        # The whole batch is matched against one snapshot
+        snapshot = self._gallery.snapshot()
+        results = [self._recognize_extracted(descriptor, snapshot) for descriptor in descriptors]
+        self._observe(start, matching_start)
+        return results
+
+    def recognize_extracted(self, descriptors: Sequence[Descriptor]) -> list[RecognitionResult]:
+        """Recognize faces by descriptors extracted from their images elsewhere, matching them against one snapshot."""
+        start = perf_counter()
+        snapshot = self._gallery.snapshot()
+        results = [self._recognize_extracted(descriptor, snapshot) for descriptor in descriptors]
+        self._observe(None, start)
+        return results
 
     def recognize_by_descriptor(self, descriptor: Descriptor) -> RecognitionResult:
-        if descriptor_id := self._find_similar_descriptor(descriptor):
-            return RecognitionResult(is_known_face=True, descriptor_id=descriptor_id)
+        start = perf_counter()
+        snapshot = self._gallery.snapshot()
+        descriptor_id = self._find_similar_descriptor(descriptor, snapshot)
+        self._observe(None, start)
+        if descriptor_id is not None:
+            return RecognitionResult(is_known_face=True, descriptor_id=descriptor_id, epoch=snapshot.epoch)
+        else:
+            return RecognitionResult(is_known_face=False, epoch=snapshot.epoch)
+
+    def recognize_by_descriptors(self, descriptors: Sequence[Descriptor]) -> list[RecognitionResult]:
+        """Recognize several descriptors by one vectorized query to one snapshot."""
+        if len(descriptors) == 0:
+            return []
+        start = perf_counter()
+        snapshot = self._gallery.snapshot()
+        matrix = np.array(descriptors, dtype=np.float64).reshape(len(descriptors), -1)
+        ids, distances = snapshot.nearest_batch(matrix)
+        self._observe(None, start)
+        threshold = self._recognizer.DISTANCE_THRESHOLD
+        return [RecognitionResult(is_known_face=True, descriptor_id=int(descriptor_id), epoch=snapshot.epoch)
+                if distance < threshold else RecognitionResult(is_known_face=False, epoch=snapshot.epoch)
+                for descriptor_id, distance in zip(ids, distances)]
+
+    def get_descriptors_epoch(self) -> int:
+        return self._gallery.snapshot().epoch
+
+    def _observe(self, extraction_start: Optional[float], matching_start: float) -> None:
+        """Report durations of descriptors extraction (if it was done) and matching stages."""
+        if self._observe_stage is None:
+            return
+        if extraction_start is not None:
+            self._observe_stage('extraction', matching_start - extraction_start)
+        self._observe_stage('matching', perf_counter() - matching_start)
+
+    def _recognize_extracted(self, descriptor: Descriptor, snapshot: IndexSnapshot) -> RecognitionResult:
+        if (descriptor_id := self._find_similar_descriptor(descriptor, snapshot)) is not None:
+            return RecognitionResult(is_known_face=True, descriptor_id=descriptor_id, epoch=snapshot.epoch)
         else:
-            return RecognitionResult(is_known_face=False)
+            return RecognitionResult(is_known_face=False, descriptor=list(descriptor), epoch=snapshot.epoch)
 
-    def _find_similar_descriptor(self, descriptor: Descriptor) -> Optional[int]:
-        are_similar = self._recognizer.compare_descriptors  # to avoid extra __getattr__
-        for id_, checking_descriptor in self._descriptors.items():
-            if are_similar(descriptor, checking_descriptor):
-                return id_
+    def _find_similar_descriptor(self, descriptor: Descriptor, snapshot: IndexSnapshot) -> Optional[int]:
+        """Return id of the nearest known descriptor if it is closer than recognizer threshold."""
+        if nearest := snapshot.nearest(descriptor):
+            descriptor_id, distance = nearest
+            if distance < self._recognizer.DISTANCE_THRESHOLD:
+                return descriptor_id
         return None
@@ -0,0 +1,111 @@
+from asyncio import to_thread
+from time import perf_counter
+from typing import Optional, Sequence, Iterable
+
+from numpy.typing import NDArray
+
+from ..backend_protocols import Descriptor, NumpyImage, Rectangle
+from ..face_recognition_protocols import NewDescriptors, RecognitionResult, StageObserver
+from ..execution import ExecutionPolicy
+from .recognizer import FaceRecognizer
+from .face_image_normalizer import FaceImageNormalizer
+
+
+class ThreadedFaceRecognition:
+    """
+    AsyncFaceRecognition running in-process recognizer and normalizer in the loop default executor,
+    or, if execution_policy is given, detection, alignment and extraction stages in executors of the policy
+    (extracted descriptors are matched in the loop default executor then).
+    If observe_stage is given, it is called with executor queue wait of every call and normalization stages durations.
+    """
+    def __init__(self, face_recognizer: FaceRecognizer, face_image_normalizer: FaceImageNormalizer,
+                 observe_stage: Optional[StageObserver] = None,
+                 execution_policy: Optional[ExecutionPolicy] = None):
+        self._face_recognizer = face_recognizer
+        self._face_image_normalizer = face_image_normalizer
+        self._observe_stage = observe_stage
+        self._execution = execution_policy
+
+        self.check_image_valid = self._face_image_normalizer.check_image_valid
+        self.check_image_normalized = self._face_recognizer.check_image_normalized
+        self.check_descriptor_valid = self._face_recognizer.check_descriptor_valid
+
+    def load_descriptors(self, ids: NDArray, descriptors: NDArray) -> None:
+        self._face_recognizer.load_descriptors(ids, descriptors)
+
+    def get_descriptors(self) -> tuple[NDArray, NDArray]:
+        return self._face_recognizer.get_descriptors()
+
+    def update_descriptors(self, new_descriptors: NewDescriptors) -> None:
+        self._face_recognizer.update_descriptors(new_descriptors)
+
+    def remove_descriptors(self, ids: Iterable[int]) -> None:
+        self._face_recognizer.remove_descriptors(ids)
+
+    async def calculate_descriptor(self, normalized_image: NumpyImage) -> Descriptor:
+        if self._execution is not None:
+            return await self._extract('extract_features', normalized_image)
+        return await self._run('extraction', self._face_recognizer.calculate_descriptor, normalized_image)
+
+    async def recognize(self, normalized_image: NumpyImage) -> RecognitionResult:
+        if self._execution is not None:
+            descriptor = await self._extract('extract_features', normalized_image)
+            return (await self._run(None, self._face_recognizer.recognize_extracted, [descriptor]))[0]
+        return await self._run(None, self._face_recognizer.recognize, normalized_image)
+
+    async def recognize_batch(self, normalized_images: Sequence[NumpyImage]) -> list[RecognitionResult]:
+        if self._execution is not None:
+            descriptors = await self._extract('extract_features_batch', normalized_images)
+            return await self._run(None, self._face_recognizer.recognize_extracted, descriptors)
+        return await self._run(None, self._face_recognizer.recognize_batch, normalized_images)
+
+    def recognize_by_descriptor(self, descriptor: Descriptor) -> RecognitionResult:
+        return self._face_recognizer.recognize_by_descriptor(descriptor)
+
+    def recognize_by_descriptors(self, descriptors: Sequence[Descriptor]) -> list[RecognitionResult]:
+        return self._face_recognizer.recognize_by_descriptors(descriptors)
+
+    def get_descriptors_epoch(self) -> int:
+        return self._face_recognizer.get_descriptors_epoch()
+
+    async def normalize(self, image: NumpyImage,
+                        detection_image: Optional[NumpyImage] = None) -> Optional[NumpyImage]:
+        if self._execution is None:
+            return await self._run('normalization', self._face_image_normalizer.normalize, image, detection_image)
+        if detection_image is None:
+            detection_image = image
+        face_rectangles = await self.detect_faces(detection_image)
+        if (face_rectangle := self._face_image_normalizer.select_face(face_rectangles, detection_image, image)) is None:
+            return None
+        return await self.normalize_face(image, face_rectangle)
+
+    async def detect_faces(self, image: NumpyImage) -> tuple[Rectangle, ...]:
+        if self._execution is not None:
+            return await self._execution.run('detection', self._face_image_normalizer.detector, 'find_faces', image)
+        return await self._run('detection', self._face_image_normalizer.find_faces, image)
+
+    async def normalize_face(self, image: NumpyImage, face_rectangle: Rectangle) -> NumpyImage:
+        if self._execution is not None:
+            return await self._execution.run('alignment', self._face_image_normalizer.normalizer, 'normalize_image',
+                                             image, face_rectangle)
+        return await self._run('alignment', self._face_image_normalizer.normalize_face, image, face_rectangle)
+
+    async def _extract(self, method: str, *args):
+        return await self._execution.run('extraction', self._face_recognizer.recognizer, method, *args)
+
+    async def _run(self, stage: Optional[str], function, *args):
+        """Run function in the executor, reporting queue wait and (if stage is given) its duration."""
+        if self._observe_stage is None:
+            return await to_thread(function, *args)
+        submitted = perf_counter()
+
+        def run_observed():
+            started = perf_counter()
+            self._observe_stage('executor_wait', started - submitted)
+            try:
+                return function(*args)
+            finally:
+                if stage is not None:
+                    self._observe_stage(stage, perf_counter() - started)
+
+        return await to_thread(run_observed)
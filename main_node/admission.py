@@ -0,0 +1,185 @@
+"""
+Admission control of CPU-bound recognition work.
+
+Requests doing recognition work hold a slot of AdmissionController while they are processed.
+Slots are limited in total (capacity) and per route, requests beyond the limits wait in a bounded queue
+ordered by route priority, so cheap descriptor checks overtake image work (and take places of it in a full queue).
+A request that finds the queue full or waits longer than max_wait_sec is rejected by Overloaded
+instead of growing latency and memory of everyone.
+"""
+import asyncio
+from bisect import insort
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from itertools import count
+from math import ceil
+from time import monotonic
+from typing import AsyncIterator, Optional
+
+from pydantic import BaseModel
+
+from .metrics import registry
+
+
+_wait_seconds = registry.histogram('admission_wait_seconds', 'Time admitted requests waited for a slot.',
+                                   ('route',))
+_rejections = registry.counter('admission_rejections_total', 'Requests rejected by admission control.',
+                               ('route', 'reason'))
+
+
+class Overloaded(Exception):
+    """Request is rejected by admission control, it can be retried after retry_after_sec."""
+    def __init__(self, route: str, retry_after_sec: int):
+        super().__init__(f'Node is overloaded by {route} work, retry after {retry_after_sec} s.')
+        self.route = route
+        self.retry_after_sec = retry_after_sec
+
+
+@dataclass
+class RouteLimit:
+    max_concurrency: Optional[int] = None  # None – limited by capacity only
+    priority: int = 0  # waiting requests of lower priority value are admitted first
+
+
+class AdmissionStats(BaseModel):
+    capacity: int
+    running: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    max_wait_ms: float = 0.
+    mean_wait_ms: float = 0.
+
+    def record_admission(self, wait_sec: float) -> None:
+        wait_ms = wait_sec * 1000
+        self.mean_wait_ms = (self.mean_wait_ms * self.admitted + wait_ms) / (self.admitted + 1)
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.admitted += 1
+
+
+class AdmissionController:
+    # Weight of the last slot holding time in its moving average used for Retry-After
+    _HOLD_TIME_SMOOTHING = 0.1
+
+    def __init__(self, capacity: int, max_queue_size: int, max_wait_sec: float, routes: dict[str, RouteLimit]):
+        self._capacity = capacity
+        self._max_queue_size = max_queue_size
+        self._max_wait_sec = max_wait_sec
+        self._routes = routes
+        self._running: dict[str, int] = {route: 0 for route in routes}
+        self._running_total = 0
+        # Sorted (priority, sequence number, route, future) of waiting requests
+        self._queue: list[tuple[int, int, str, asyncio.Future]] = []
+        self._sequence = count()
+        self._mean_hold_sec = 0.
+        self._stats = AdmissionStats(capacity=capacity)
+
+    @asynccontextmanager
+    async def admit(self, route: str) -> AsyncIterator[None]:
+        """Hold a slot of the route while the body runs, raises Overloaded if it isn't given in time."""
+        slot = await self.acquire(route)
+        try:
+            yield
+        finally:
+            slot.release()
+
+    async def acquire(self, route: str) -> 'Slot':
+        """Take a slot of the route, waiting for it in the queue. Raises Overloaded if it isn't given in time."""
+        start = monotonic()
+        if self._can_run(route):
+            self._take(route)
+            return self._start(route, start)
+        priority = self._routes[route].priority
+        if len(self._queue) >= self._max_queue_size:
+            if not self._queue or self._queue[-1][0] <= priority:
+                raise self._reject(route, 'queue_full')
+            # Full queue gives place to more prioritized request, the last waiting one is rejected
+            _, _, evicted_route, evicted = self._queue.pop()
+            evicted.set_exception(self._reject(evicted_route, 'evicted'))
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._sequence), route, future)
+        insort(self._queue, waiter)
+        try:
+            # Unlike wait_for, wait neither cancels the future nor loses cancellation of a done one
+            await asyncio.wait((future,), timeout=self._max_wait_sec)
+        except asyncio.CancelledError:
+            if not future.done():
+                self._queue.remove(waiter)
+            elif future.exception() is None:
+                # Slot given at the moment of cancellation is passed on
+                self._release(route, None)
+            raise
+        if not future.done():
+            self._queue.remove(waiter)
+            raise self._reject(route, 'timeout')
+        future.result()  # raises Overloaded of eviction
+        return self._start(route, start)
+
+    def try_acquire(self, route: str) -> Optional['Slot']:
+        """Take a slot of the route if it's free now, None otherwise. For work that is dropped rather than delayed."""
+        if not self._can_run(route):
+            self._reject(route, 'no_free_slot')
+            return None
+        self._take(route)
+        return self._start(route, monotonic())
+
+    def get_stats(self) -> AdmissionStats:
+        stats = self._stats.copy()
+        stats.running = self._running_total
+        stats.queued = len(self._queue)
+        return stats
+
+    def _take(self, route: str) -> None:
+        self._running[route] += 1
+        self._running_total += 1
+
+    def _can_run(self, route: str) -> bool:
+        max_concurrency = self._routes[route].max_concurrency
+        return self._running_total < self._capacity \
+            and (max_concurrency is None or self._running[route] < max_concurrency)
+
+    def _start(self, route: str, request_time: float) -> 'Slot':
+        now = monotonic()
+        _wait_seconds.observe(now - request_time, route)
+        self._stats.record_admission(now - request_time)
+        return Slot(self, route, now)
+
+    def _release(self, route: str, hold_sec: Optional[float]) -> None:
+        self._running[route] -= 1
+        self._running_total -= 1
+        if hold_sec is not None:
+            self._mean_hold_sec += (hold_sec - self._mean_hold_sec) * self._HOLD_TIME_SMOOTHING
+        self._admit_waiting()
+
+    def _admit_waiting(self) -> None:
+        """Give free slots to waiting requests in priority order, skipping routes at their limits."""
+        i = 0
+        while i < len(self._queue) and self._running_total < self._capacity:
+            _, _, route, future = self._queue[i]
+            if self._can_run(route):
+                del self._queue[i]
+                self._take(route)
+                future.set_result(None)
+            else:
+                i += 1
+
+    def _reject(self, route: str, reason: str) -> Overloaded:
+        self._stats.rejected += 1
+        _rejections.inc(route, reason)
+        # Time to process queued requests by all slots, at least a second as Retry-After has seconds resolution
+        retry_after_sec = max(1, ceil(len(self._queue) * self._mean_hold_sec / self._capacity))
+        return Overloaded(route, retry_after_sec)
+
+
+class Slot:
+    """Admitted request's share of AdmissionController, must be released once the work is done."""
+    __slots__ = ('_controller', '_route', '_start')
+
+    def __init__(self, controller: AdmissionController, route: str, start: float):
+        self._controller = controller
+        self._route = route
+        self._start = start
+
+    def release(self) -> None:
+        self._controller._release(self._route, monotonic() - self._start)
@@ -1,77 +1,231 @@
+import weakref
+from dataclasses import dataclass
+from typing import Optional
+
 from aiohttp import web
 
-from face_recognition.two_step import FaceRecognizer, FaceImageNormalizer
-from face_recognition.backends.dlib_ import DlibRecognizer, DlibDetector, DlibNormalizer
+from face_recognition.face_recognition_protocols import AsyncFaceRecognition
+from face_recognition.two_step import FaceRecognizer, FaceImageNormalizer, ThreadedFaceRecognition
+from face_recognition.full import FaceRecognitionPool
+from face_recognition.backends.dlib_ import DlibRecognizer, DlibDetector, DlibNormalizer, DlibCorrelationTracker
+from face_recognition.ivf_index import make_descriptor_index
+from face_recognition.execution import ExecutionPolicy, StageExecution, default_workers_quantity
+from face_recognition.face_recognition_protocols import StageObserver
 
 from .utils import DatabaseManager
-from .modules.access_control import AccessControlService, AccessControlRepository
+from .metrics import registry, stats_samples
+from .admission import AdmissionController, RouteLimit
+from .modules.access_control import (AccessControlService, AccessControlRepository,
+                                     VisitReportBuffer, GallerySnapshotStore, StreamSettings)
 from .modules.authorization import AuthorizationService, AuthorizationRepository
 from .modules.tasks import TasksService, TasksRepository
-from main_node.controllers import handlers
+from main_node.controllers import handlers, room_channel
 
 import config
 
 
-def init() -> web.Application:
-    app = web.Application()
-    manager = DatabaseManager(config.database_config)
+_recognition_stage_seconds = registry.histogram('recognition_stage_seconds',
+                                                'Durations of face recognition stages and executor queue wait.',
+                                                ('stage',))
+
+@dataclass
+class Repositories:
+    access_control: AccessControlRepository
+    authorization: AuthorizationRepository
+    tasks: TasksRepository
+
 
-    init_database(app, manager)
-    init_access_control_service(app, manager)
-    init_authorization_service(app, manager)
-    init_tasks_service(app, manager)
+def init(repositories: Optional[Repositories] = None,
+         face_recognition: Optional[AsyncFaceRecognition] = None) -> web.Application:
+    """
+    Create the node application. Repositories working with config database and recognition engine
+    of config are created unless given, so stand-ins can be injected (see benchmarks.load).
+    """
+    app = web.Application()
+    if repositories is None:
+        manager = DatabaseManager(config.database_config, config.database_pool_config)
+        init_database(app, manager)
+        repositories = Repositories(access_control=AccessControlRepository(manager),
+                                    authorization=AuthorizationRepository(manager),
+                                    tasks=TasksRepository(manager))
+
+    init_access_control_service(app, repositories.access_control, face_recognition)
+    init_authorization_service(app, repositories.authorization)
+    init_tasks_service(app, repositories.tasks)
+    init_room_channels(app)
+    init_admission_control(app)
+    init_metrics(app)
 
     app.add_routes([
         web.post('/access/check/face', handlers.check_access_by_face),
         web.post('/access/check/descriptor', handlers.check_access_by_descriptor),
+        web.post('/access/check/descriptors', handlers.check_access_by_descriptors),
         web.post('/access/visit/new', handlers.record_visit),
         web.post('/access/descriptor/calculate', handlers.calculate_descriptor),
+        web.post('/access/descriptor/add', handlers.add_descriptor),
+        web.post('/access/descriptor/delete', handlers.delete_descriptor),
 
         web.get('/tasks/undone', handlers.get_undone_tasks),
         web.post('/tasks/report', handlers.report_task_performed),
 
         web.post('/authorization/room/login', handlers.room_login),
+
+        web.get('/stats', handlers.get_stats),
+
+        web.get('/ws/room', room_channel.room_websocket),
     ])
+    if config.METRICS_ENABLED:
+        app.add_routes([web.get('/metrics', handlers.get_metrics)])
     return app
 
 
 def init_database(app: web.Application, manager: DatabaseManager):
+    app['database'] = manager
     app.on_startup.append(manager.launch_connection)
-    app.on_shutdown.append(manager.close_connection)
-
-
-def init_access_control_service(app: web.Application, manager: DatabaseManager):
-    repository = AccessControlRepository(manager)
+    # Closed on cleanup, after services are deinitialized (and have flushed their writes) on shutdown
+    app.on_cleanup.append(manager.close_connection)
+
+
+def init_access_control_service(app: web.Application, repository: AccessControlRepository,
+                                face_recognition: Optional[AsyncFaceRecognition] = None):
+    visit_buffer = None
+    if config.VISIT_WRITE_BEHIND:
+        visit_buffer = VisitReportBuffer(
+            repository=repository,
+            max_size=config.VISIT_BUFFER_MAX_SIZE,
+            flush_interval_sec=config.VISIT_FLUSH_INTERVAL_SEC,
+            ids_block_size=config.VISIT_IDS_BLOCK_SIZE,
+            max_buffered_size=config.VISIT_BUFFER_MAX_BUFFERED_SIZE,
+            max_flush_attempts=config.VISIT_FLUSH_MAX_ATTEMPTS,
+        )
+    gallery_store = None
+    if config.GALLERY_SNAPSHOT_DIR is not None:
+        gallery_store = GallerySnapshotStore(config.GALLERY_SNAPSHOT_DIR)
+    stream_settings = StreamSettings(
+        detection_interval=config.STREAM_DETECTION_INTERVAL,
+        iou_threshold=config.STREAM_IOU_THRESHOLD,
+        min_tracking_confidence=config.STREAM_MIN_TRACKING_CONFIDENCE,
+        max_missed_detections=config.STREAM_MAX_MISSED_DETECTIONS,
+        tracker_factory=DlibCorrelationTracker if config.STREAM_TRACKER == 'correlation' else None,
+    )
+    execution_policy = None
+    if face_recognition is None:
+        if config.RECOGNITION_ENGINE == 'threads' and config.RECOGNITION_STAGE_EXECUTORS is not None:
+            execution_policy = init_execution_policy()
+        face_recognition = init_face_recognition(app, execution_policy)
     access_control = AccessControlService(
         repository=repository,
+        face_recognition=face_recognition,
+        batch_window_sec=config.RECOGNITION_BATCH_WINDOW_MS / 1000,
+        max_batch_size=config.RECOGNITION_BATCH_MAX_SIZE,
+        use_permission_index=config.PERMISSION_INDEX_ENABLED,
+        permission_resync_interval_sec=config.PERMISSION_RESYNC_INTERVAL_SEC,
+        visit_buffer=visit_buffer,
+        sync_descriptors=config.DESCRIPTOR_SYNC_ENABLED,
+        descriptor_reconcile_interval_sec=config.DESCRIPTOR_RECONCILE_INTERVAL_SEC,
+        gallery_store=gallery_store,
+        stream_settings=stream_settings,
+        execution_policy=execution_policy,
+    )
+    app[access_control.SERVICE_NAME] = access_control
+    app.on_startup.append(access_control.init_service)
+    app.on_shutdown.append(access_control.deinit_service)
+
+
+def init_face_recognition(app: web.Application,
+                          execution_policy: Optional[ExecutionPolicy] = None) -> AsyncFaceRecognition:
+    index = make_descriptor_index(config.DESCRIPTOR_INDEX, **config.IVF_INDEX_OPTIONS)
+    if config.RECOGNITION_ENGINE == 'processes':
+        pool = FaceRecognitionPool(
+            detector=DlibDetector,
+            normalizer=DlibNormalizer,
+            recognizer=DlibRecognizer,
+            workers_quantity=config.RECOGNITION_PROCESSES,
+            index=index,
+            shared_slots_quantity=config.SHARED_IMAGE_SLOTS,
+            shared_slot_size=config.SHARED_IMAGE_SLOT_SIZE,
+        )
+
+        async def close_pool(_):
+            pool.close()
+
+        app.on_cleanup.append(close_pool)
+        return pool
+    observe_stage = _recognition_stage_observer()
+    return ThreadedFaceRecognition(
         face_recognizer=FaceRecognizer(
-            recognizer=DlibRecognizer()
+            recognizer=DlibRecognizer(),
+            index=index,
+            observe_stage=observe_stage,
         ),
         face_image_normalizer=FaceImageNormalizer(
             detector=DlibDetector(),
             normalizer=DlibNormalizer()
         ),
+        observe_stage=observe_stage,
+        execution_policy=execution_policy,
     )
-    app[access_control.SERVICE_NAME] = access_control
-    app.on_startup.append(access_control.init_service)
-    app.on_shutdown.append(access_control.deinit_service)
 
 
-def init_authorization_service(app: web.Application, manager: DatabaseManager):
-    repository = AuthorizationRepository(manager)
+def init_execution_policy() -> ExecutionPolicy:
+    return ExecutionPolicy(
+        stages={stage: StageExecution(**execution) for stage, execution in config.RECOGNITION_STAGE_EXECUTORS.items()},
+        # Backends of worker processes of 'process' stages
+        backend_factories={'detection': DlibDetector, 'alignment': DlibNormalizer, 'extraction': DlibRecognizer},
+        observe_stage=_recognition_stage_observer(),
+    )
+
+
+def _recognition_stage_observer() -> Optional[StageObserver]:
+    if not config.METRICS_ENABLED:
+        return None
+
+    def observe_stage(stage: str, seconds: float):
+        _recognition_stage_seconds.observe(seconds, stage)
+    return observe_stage
+
+
+def init_authorization_service(app: web.Application, repository: AuthorizationRepository):
     authorization = AuthorizationService(
         repository=repository,
+        token_cache_size=config.TOKEN_CACHE_SIZE,
+        token_cache_ttl_sec=config.TOKEN_CACHE_TTL_SEC,
+        token_cache_negative_ttl_sec=config.TOKEN_CACHE_NEGATIVE_TTL_SEC,
     )
     app[authorization.SERVICE_NAME] = authorization
     app.on_startup.append(authorization.init_service)
     app.on_shutdown.append(authorization.deinit_service)
 
 
-def init_tasks_service(app: web.Application, manager: DatabaseManager):
-    repository = TasksRepository(manager)
+def init_tasks_service(app: web.Application, repository: TasksRepository):
     tasks_service = TasksService(
-        repository=repository
+        repository=repository,
+        push_tasks=config.TASK_PUSH_ENABLED,
     )
     app[tasks_service.SERVICE_NAME] = tasks_service
     app.on_startup.append(tasks_service.init_service)
     app.on_shutdown.append(tasks_service.deinit_service)
+
+
+def init_room_channels(app: web.Application):
+    app['room_channels'] = weakref.WeakSet()
+    app.on_shutdown.append(room_channel.close_room_channels)
+
+
+def init_admission_control(app: web.Application):
+    app['admission'] = None
+    if config.ADMISSION_CONTROL_ENABLED:
+        app['admission'] = AdmissionController(
+            capacity=config.ADMISSION_CAPACITY or default_workers_quantity(),
+            max_queue_size=config.ADMISSION_MAX_QUEUE_SIZE,
+            max_wait_sec=config.ADMISSION_MAX_WAIT_MS / 1000,
+            routes={route: RouteLimit(**limit) for route, limit in config.ADMISSION_ROUTES.items()},
+        )
+
+
+def init_metrics(app: web.Application):
+    registry.enabled = config.METRICS_ENABLED
+    if config.METRICS_ENABLED:
+        # Statistics of /stats are exposed as gauges
+        registry.set_gauge_collector('node', 'Node statistics, see /stats.',
+                                     lambda: stats_samples('node', handlers.collect_node_stats(app)))
@@ -0,0 +1,53 @@
+"""
+Binary descriptor wire formats, negotiated by Content-Type of requests and Accept of responses
+as an alternative to JSON FaceDescriptor:
+    application/x-descriptor-float32 – 128 little-endian float32 (512 bytes),
+    application/x-descriptor-float64 – 128 little-endian float64 (1024 bytes),
+    application/x-descriptor-base85 – zlib compressed float64 bytes encoded by base85 (text).
+Descriptors are decoded straight into numpy arrays, no Python floats are created.
+"""
+from typing import Optional
+from zlib import error as ZlibError
+
+import numpy as np
+
+from face_recognition import Descriptor
+from face_recognition.utils import descriptor_to_str, descriptor_from_str
+
+
+FLOAT32 = 'application/x-descriptor-float32'
+FLOAT64 = 'application/x-descriptor-float64'
+BASE85 = 'application/x-descriptor-base85'
+
+_RAW_DTYPES = {FLOAT32: np.dtype('<f4'), FLOAT64: np.dtype('<f8')}
+DESCRIPTOR_FORMATS = (FLOAT32, FLOAT64, BASE85)
+
+
+def decode_descriptor(content_type: str, data: bytes) -> Descriptor:
+    """Decode descriptor of the binary format, ValueError is raised for malformed data."""
+    if (dtype := _RAW_DTYPES.get(content_type)) is not None:
+        if len(data) % dtype.itemsize != 0:
+            raise ValueError(f'Descriptor size must be a multiple of {dtype.itemsize} bytes.')
+        return np.frombuffer(data, dtype=dtype)
+    if content_type == BASE85:
+        try:
+            return descriptor_from_str(data.decode('ascii'))
+        except (ValueError, TypeError, ZlibError):
+            raise ValueError('Descriptor is not a valid base85 string.')
+    raise ValueError(f'Unknown descriptor format: {content_type}.')
+
+
+def encode_descriptor(content_type: str, descriptor: Descriptor) -> bytes:
+    if (dtype := _RAW_DTYPES.get(content_type)) is not None:
+        return descriptor.astype(dtype, copy=False).tobytes()
+    if content_type == BASE85:
+        return descriptor_to_str(descriptor.astype(np.float64, copy=False)).encode('ascii')
+    raise ValueError(f'Unknown descriptor format: {content_type}.')
+
+
+def accepted_descriptor_format(accept: Optional[str]) -> Optional[str]:
+    """Return the first binary descriptor format listed in Accept header or None if JSON is expected."""
+    for media_range in (accept or '').split(','):
+        if (media_type := media_range.split(';', 1)[0].strip().lower()) in DESCRIPTOR_FORMATS:
+            return media_type
+    return None
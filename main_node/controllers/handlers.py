@@ -1,37 +1,47 @@
+from typing import Optional
+
 from aiohttp import web
-from PIL.Image import Image
 import numpy as np
 
-from face_recognition import NumpyImage
+from face_recognition import NumpyImage, Descriptor
 from main_node.modules.access_control import AccessControlService
 from main_node.modules.authorization import AuthorizationService
 
 from .utils import require, pydantic_response
-from .requirements import RoomAuth, AdminAuth, ImageField, PydanticPayload
-from .json_models import VisitInfo, FaceDescriptor, TaskPerformingReport, DescriptorAdding
+from .requirements import (RoomAuth, AdminAuth, MetricsAuth, Admission, ImageBody, ImageField,
+                           DetectionImageField, UploadedImage, PydanticPayload, DescriptorPayload)
+from .descriptor_formats import accepted_descriptor_format, encode_descriptor
+from .json_models import (VisitInfo, FaceDescriptors, TaskPerformingReport, DescriptorAdding,
+                          DescriptorDeleting, NodeStats)
 from ..modules.tasks import TasksService
+from ..utils import Ok, DatabaseManager
+from ..admission import AdmissionController
+from .. import metrics
+import config
 
 
-def convert_to_NumpyImage(image: Image) -> NumpyImage:
-    return np.array(image)
-
-
-@require(RoomAuth('room_id'), ImageField('image'))
-async def check_access_by_face(r: web.Request, room_id: int, image: Image):
+@require(RoomAuth('room_id'), ImageBody(config.IMAGE_MAX_SIZE_BYTES), Admission('check_face'), ImageField('image'))
+async def check_access_by_face(r: web.Request, room_id: int, image: NumpyImage):
     access_control: AccessControlService = r.app['access_control']
-    numpy_image = convert_to_NumpyImage(image)
-    access_check = await access_control.check_access_by_face(room_id, numpy_image)
+    access_check = await access_control.check_access_by_face(room_id, image)
     return pydantic_response(access_check)
 
 
-@require(RoomAuth('room_id'), PydanticPayload('payload', FaceDescriptor))
-async def check_access_by_descriptor(r: web.Request, room_id: int, payload: FaceDescriptor):
+@require(RoomAuth('room_id'), DescriptorPayload('descriptor'), Admission('check_descriptor'))
+async def check_access_by_descriptor(r: web.Request, room_id: int, descriptor: Descriptor):
     access_control: AccessControlService = r.app['access_control']
-    descriptor = np.array(payload.features)
     access_check = await access_control.check_access_by_descriptor(room_id, descriptor)
     return pydantic_response(access_check)
 
 
+@require(RoomAuth('room_id'), PydanticPayload('payload', FaceDescriptors), Admission('check_descriptors'))
+async def check_access_by_descriptors(r: web.Request, room_id: int, payload: FaceDescriptors):
+    access_control: AccessControlService = r.app['access_control']
+    descriptors = [np.array(descriptor.features) for descriptor in payload.descriptors]
+    access_checks = await access_control.check_access_by_descriptors(room_id, descriptors)
+    return pydantic_response(access_checks)
+
+
 @require(RoomAuth('room_id'), PydanticPayload('payload', VisitInfo))
 async def record_visit(r: web.Request, room_id: int, payload: VisitInfo):
     access_control: AccessControlService = r.app['access_control']
@@ -65,9 +75,51 @@ async def room_login(r: web.Request):
     return pydantic_response(room_login_)
 
 
-@require(AdminAuth(), ImageField('image'))
-async def calculate_descriptor(r: web.Request, image: Image):
+@require(AdminAuth(), ImageBody(config.ENROLLMENT_IMAGE_MAX_SIZE_BYTES), Admission('calculate_descriptor'),
+         DetectionImageField('image', config.DETECTION_IMAGE_SIZE))
+async def calculate_descriptor(r: web.Request, image: UploadedImage):
     access_control: AccessControlService = r.app['access_control']
-    numpy_image = convert_to_NumpyImage(image)
-    descriptor_calculation = await access_control.calculate_descriptor(numpy_image)
+    descriptor_calculation = await access_control.calculate_descriptor(image.image, image.detection_image)
+    # Descriptor is sent in binary format if client accepts one, errors are always JSON
+    if isinstance(descriptor_calculation, Ok) \
+            and (descriptor_format := accepted_descriptor_format(r.headers.get('Accept'))) is not None:
+        descriptor = np.array(descriptor_calculation.result.features)
+        return web.Response(body=encode_descriptor(descriptor_format, descriptor), content_type=descriptor_format)
     return pydantic_response(descriptor_calculation)
+
+
+@require(AdminAuth(), PydanticPayload('payload', DescriptorAdding))
+async def add_descriptor(r: web.Request, payload: DescriptorAdding):
+    access_control: AccessControlService = r.app['access_control']
+    descriptor = np.array(payload.descriptor.features)
+    descriptor_adding = await access_control.add_descriptor(payload.user_id, descriptor)
+    return pydantic_response(descriptor_adding)
+
+
+@require(AdminAuth(), PydanticPayload('payload', DescriptorDeleting))
+async def delete_descriptor(r: web.Request, payload: DescriptorDeleting):
+    access_control: AccessControlService = r.app['access_control']
+    descriptor_deleting = await access_control.delete_descriptor(payload.descriptor_id)
+    return pydantic_response(descriptor_deleting)
+
+
+@require(AdminAuth())
+async def get_stats(r: web.Request):
+    return pydantic_response(Ok(result=collect_node_stats(r.app)))
+
+
+@require(MetricsAuth(config.METRICS_TOKEN))
+async def get_metrics(r: web.Request):
+    return web.Response(text=metrics.registry.render(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+def collect_node_stats(app: web.Application) -> NodeStats:
+    access_control: AccessControlService = app['access_control']
+    auth_service: AuthorizationService = app['authorization']
+    database: Optional[DatabaseManager] = app.get('database')
+    admission: Optional[AdmissionController] = app['admission']
+    return NodeStats(access_control=access_control.get_stats(),
+                     authorization=auth_service.get_stats(),
+                     database_pool=database.stats if database is not None else None,
+                     admission=admission.get_stats() if admission is not None else None)
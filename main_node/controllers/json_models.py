@@ -1,6 +1,13 @@
 from datetime import datetime
+from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
+
+from main_node.modules.access_control import AccessControlStats
+from main_node.modules.authorization import AuthorizationStats
+from main_node.utils import DatabasePoolStats
+from main_node.admission import AdmissionStats
+import config
 
 
 class VisitInfo(BaseModel):
@@ -12,6 +19,10 @@ class FaceDescriptor(BaseModel):
     features: list[float]
 
 
+class FaceDescriptors(BaseModel):
+    descriptors: conlist(FaceDescriptor, min_items=1, max_items=config.DESCRIPTOR_BATCH_MAX_SIZE)
+
+
 class TaskPerformingReport(BaseModel):
     task_id: int
     new_status: str
@@ -20,3 +31,14 @@ class TaskPerformingReport(BaseModel):
 class DescriptorAdding(BaseModel):
     user_id: int
     descriptor: FaceDescriptor
+
+
+class DescriptorDeleting(BaseModel):
+    descriptor_id: int
+
+
+class NodeStats(BaseModel):
+    access_control: AccessControlStats
+    authorization: AuthorizationStats
+    database_pool: Optional[DatabasePoolStats] = None  # None if node runs without database
+    admission: Optional[AdmissionStats] = None  # None if admission control is disabled
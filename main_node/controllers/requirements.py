@@ -1,13 +1,25 @@
-import json
-from typing import Union, Any, Type
-
-from aiohttp import web
-from aiohttp.web_request import FileField
-from PIL import Image, UnidentifiedImageError
+import asyncio
+import hmac
+from dataclasses import dataclass
+from typing import Union, Any, Type, Optional
+
+import numpy as np
+from aiohttp import web, BodyPartReader
+from PIL import UnidentifiedImageError
 from pydantic import BaseModel, ValidationError
 
 from .utils import ControllerRequirement
-from main_node.modules.authorization import AuthorizationService
+from .descriptor_formats import DESCRIPTOR_FORMATS, decode_descriptor
+from .json_models import FaceDescriptor
+from face_recognition import NumpyImage, Descriptor
+from face_recognition.images import decode_image
+from main_node.modules.authorization import AuthorizationService, RoomAuthorization
+from main_node.metrics import registry
+from main_node.admission import AdmissionController, Overloaded, Slot
+
+
+_image_stage_seconds = registry.histogram('image_upload_stage_seconds',
+                                          'Durations of uploaded image reading and decoding.', ('stage',))
 
 
 class RoomAuth(ControllerRequirement):
@@ -25,9 +37,18 @@ class RoomAuth(ControllerRequirement):
         if not auth.token_check.valid:
             return web.HTTPUnauthorized(text='Token is already invalid.')
 
+        return self._result(auth)
+
+    def _result(self, auth: RoomAuthorization) -> Any:
         return auth.room_id
 
 
+class RoomSessionAuth(RoomAuth):
+    """RoomAuth providing whole RoomAuthorization, so a long session knows when the token expires."""
+    def _result(self, auth: RoomAuthorization) -> RoomAuthorization:
+        return auth
+
+
 class AdminAuth(ControllerRequirement):
     async def prepare_requirement(self, request: web.Request) -> Union[Any, web.Response]:
         auth_service: AuthorizationService = request.app['authorization']
@@ -43,28 +64,115 @@ class AdminAuth(ControllerRequirement):
         return auth.admin_id
 
 
-class ImageField(ControllerRequirement):
+class MetricsAuth(AdminAuth):
+    """«Authorization: Bearer <token>» of a Prometheus scrape if token is given, AdminAuth otherwise."""
+    def __init__(self, token: Optional[str]):
+        super().__init__()
+        self._token = token
+
     async def prepare_requirement(self, request: web.Request) -> Union[Any, web.Response]:
+        if self._token is None:
+            return await super().prepare_requirement(request)
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(credentials.encode(), self._token.encode()):
+            return web.HTTPUnauthorized(text='Bearer token of metrics is required.',
+                                        headers={'WWW-Authenticate': 'Bearer'})
+
+
+class Admission(ControllerRequirement):
+    """
+    Slot of admission control for recognition work of the route, held until the handler returns.
+    Goes after body reading requirements (slow uploads don't hold slots) and before decoding ones.
+    """
+    def __init__(self, route: str):
+        super().__init__()
+        self._route = route
+
+    async def prepare_requirement(self, request: web.Request) -> Union[Optional[Slot], web.Response]:
+        admission: Optional[AdmissionController] = request.app['admission']
+        if admission is None:
+            return None
+        try:
+            return await admission.acquire(self._route)
+        except Overloaded as e:
+            return web.HTTPServiceUnavailable(text=str(e), headers={'Retry-After': str(e.retry_after_sec)})
+
+    def release_requirement(self, slot: Optional[Slot]) -> None:
+        if slot is not None:
+            slot.release()
+
+
+class ImageBody(ControllerRequirement):
+    """
+    Reads image file from «image» field of multipart/form-data body for a following ImageField.
+    Body is streamed: other fields are skipped without buffering, image part is read up to max_size bytes.
+    """
+    REQUEST_KEY = 'image_body'
+    _CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self._max_size = max_size
+
+    async def prepare_requirement(self, request: web.Request) -> Union[None, web.Response]:
         if request.content_type != 'multipart/form-data':
             return web.HTTPBadRequest(text="Send image as multipart/form-data in field named «image».")
 
-        post_data = await request.post()
-
-        image_field = post_data.get('image')
-        if image_field is None:
+        reader = await request.multipart()
+        while (part := await reader.next()) is not None:
+            if isinstance(part, BodyPartReader) and part.name == 'image':
+                break
+            await part.release()
+        else:
             return web.HTTPBadRequest(text="Required «image» multipart field.")
 
-        if not isinstance(image_field, FileField):
+        if part.filename is None:
             return web.HTTPBadRequest(text="Field «image» doesn't contain an image file.")
 
+        image_data = bytearray()
+        with _image_stage_seconds.time('read'):
+            while chunk := await part.read_chunk(self._CHUNK_SIZE):
+                image_data += chunk
+                if len(image_data) > self._max_size:
+                    return web.HTTPRequestEntityTooLarge(max_size=self._max_size, actual_size=len(image_data))
+        request[self.REQUEST_KEY] = bytes(image_data)
+
+
+class ImageField(ControllerRequirement):
+    """Image read by preceding ImageBody as NumpyImage."""
+    async def prepare_requirement(self, request: web.Request) -> Union[Any, web.Response]:
+        image_data = request.pop(ImageBody.REQUEST_KEY)
         try:
-            image = Image.open(image_field.file)
+            with _image_stage_seconds.time('decode'):
+                # Decoding a large image takes milliseconds, the loop serves other requests meanwhile
+                return await asyncio.to_thread(self._decode, image_data)
         except UnidentifiedImageError:
             return web.HTTPBadRequest(text="Cannot identify image file. It's invalid.")
+        except OSError:
+            return web.HTTPBadRequest(text="Cannot decode image file. It's damaged.")
 
+    def _decode(self, image_data: bytes) -> Any:
+        image, _ = decode_image(image_data)
         return image
 
 
+@dataclass
+class UploadedImage:
+    image: NumpyImage
+    detection_image: Optional[NumpyImage]  # downscaled copy to search faces on, None if image is small enough
+
+
+class DetectionImageField(ImageField):
+    """ImageField also providing a copy of the image downscaled to fit detection_size to search faces on."""
+    def __init__(self, keyword_argument_name: str, detection_size: Optional[int]):
+        super().__init__(keyword_argument_name)
+        self._detection_size = detection_size
+
+    def _decode(self, image_data: bytes) -> UploadedImage:
+        image, detection_image = decode_image(image_data, self._detection_size)
+        return UploadedImage(image=image, detection_image=detection_image)
+
+
 class PydanticPayload(ControllerRequirement):
     def __init__(self, keyword_argument_name: str, pydantic_model: Type[BaseModel]):
         super().__init__(keyword_argument_name)
@@ -81,3 +189,24 @@ class PydanticPayload(ControllerRequirement):
             return web.HTTPBadRequest(text=f"Json data has wrong schema or types.")
 
         return pydantic_data
+
+
+class DescriptorPayload(ControllerRequirement):
+    """
+    Face descriptor from request body as Descriptor: JSON FaceDescriptor
+    or one of binary formats of .descriptor_formats selected by Content-Type.
+    """
+    async def prepare_requirement(self, r: web.Request) -> Union[Descriptor, web.Response]:
+        if r.content_type == 'application/json':
+            try:
+                return np.array(FaceDescriptor.parse_raw(await r.text()).features)
+            except ValidationError:
+                return web.HTTPBadRequest(text="Json data has wrong schema or types.")
+
+        if r.content_type not in DESCRIPTOR_FORMATS:
+            formats = ', '.join(('application/json',) + DESCRIPTOR_FORMATS)
+            return web.HTTPUnsupportedMediaType(text=f"Descriptor Content-Type must be one of: {formats}.")
+        try:
+            return decode_descriptor(r.content_type, await r.read())
+        except ValueError as e:
+            return web.HTTPBadRequest(text=str(e))
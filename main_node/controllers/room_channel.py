@@ -0,0 +1,236 @@
+"""
+Room terminal WebSocket channel: one connection authorized by Room-Token at connect time
+carries all terminal requests and server pushes.
+
+Text frames are JSON messages {"id": <any>, "type": <str>, "payload": <object>}.
+Binary frames are a 4-byte big-endian header length, JSON header {"id", "type"} and an image file.
+Every request is answered by {"id": <request id>, "type": "result", "payload": <Result>},
+requests are processed concurrently, so results can arrive out of order.
+Recognition requests pass admission control as HTTP ones do, rejected ones are answered with Error.
+
+Request types:
+    check_face (binary frame) – image file of normalized face,
+    stream_frame (binary frame) – image file of a camera video frame, result is StreamFrame:
+        faces are tracked across frames and access is checked once per track, when the face appears.
+        A frame sent while the previous one is processed or no admission slot is free is dropped
+        (answered with dropped = true) without waiting, so a terminal can send frames at camera rate.
+    check_descriptor – FaceDescriptor payload,
+    check_descriptors – FaceDescriptors payload, result is AccessCheckList with results in order of descriptors,
+    record_visit – VisitInfo payload,
+    get_undone_tasks – no payload,
+    report_task – TaskPerformingReport payload.
+Pushed messages:
+    {"type": "task", "payload": <Task>} – task of the room is added or changed.
+"""
+import asyncio
+import json
+import logging
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+from aiohttp import web, WSMsgType, WSCloseCode
+from PIL import UnidentifiedImageError
+from pydantic import BaseModel, ValidationError
+
+from face_recognition.images import decode_image
+from main_node.modules.access_control import AccessControlService, StreamSession, StreamFrame
+from main_node.modules.authorization import RoomAuthorization
+from main_node.modules.tasks import TasksService, Task
+from main_node.admission import AdmissionController, Overloaded
+
+from .utils import require
+from .serialization import dump_model
+from .requirements import RoomSessionAuth
+from .json_models import VisitInfo, FaceDescriptor, FaceDescriptors, TaskPerformingReport
+from ..utils import Ok, Error, Result
+import config
+
+
+logger = logging.getLogger(__name__)
+
+_HEADER_LENGTH_SIZE = 4
+
+
+class ChannelError(Exception):
+    """Malformed message, reported to the terminal as Error result."""
+
+
+class RoomChannel:
+    def __init__(self, app: web.Application, ws: web.WebSocketResponse, room_id: int, max_in_flight: int):
+        self._access_control: AccessControlService = app['access_control']
+        self._tasks: TasksService = app['tasks']
+        self._admission: Optional[AdmissionController] = app['admission']
+        self._ws = ws
+        self._room_id = room_id
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._requests: set[asyncio.Task] = set()
+        self._send_lock = asyncio.Lock()
+        self._stream_session: Optional[StreamSession] = None
+        self._handlers: dict[str, Callable[[Any, bytes], Awaitable[Result]]] = {
+            'check_face': self._check_face,
+            'stream_frame': self._stream_frame,
+            'check_descriptor': self._check_descriptor,
+            'check_descriptors': self._check_descriptors,
+            'record_visit': self._record_visit,
+            'get_undone_tasks': self._get_undone_tasks,
+            'report_task': self._report_task,
+        }
+
+    async def serve(self, valid_before: datetime) -> None:
+        """Process messages until the connection is closed or the room token expires."""
+        expiration = asyncio.create_task(self._close_at(valid_before))
+        self._tasks.subscribe(self._room_id, self._push_task)
+        try:
+            async for message in self._ws:
+                if message.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                    continue
+                # Reading is paused while too many requests are processed
+                await self._in_flight.acquire()
+                request = asyncio.create_task(self._process(message.type, message.data))
+                self._requests.add(request)
+                request.add_done_callback(self._request_done)
+        finally:
+            self._tasks.unsubscribe(self._room_id, self._push_task)
+            expiration.cancel()
+            for request in self._requests:
+                request.cancel()
+
+    async def _process(self, message_type: WSMsgType, data: Any) -> None:
+        message_id = None
+        try:
+            if message_type == WSMsgType.TEXT:
+                message, body = _parse_json(data), b''
+            else:
+                message, body = _split_binary(data)
+            message_id = message.get('id')
+            if (handler := self._handlers.get(message.get('type'))) is None:
+                raise ChannelError(f'Unknown message type: {message.get("type")!r}.')
+            result = await handler(message.get('payload'), body)
+        except (ChannelError, Overloaded) as e:
+            result = Error(cause=str(e))
+        except Exception:
+            logger.exception('Room channel request processing failed.')
+            result = Error(cause='Internal server error.')
+        await self._send('result', dump_model(result), message_id)
+
+    def _request_done(self, request: asyncio.Task) -> None:
+        self._requests.discard(request)
+        self._in_flight.release()
+        if not request.cancelled() and (exception := request.exception()) is not None:
+            logger.error('Room channel request failed.', exc_info=exception)
+
+    async def _send(self, message_type: str, payload_json: str, message_id: Any = None) -> None:
+        if self._ws.closed:
+            return
+        message_id_json = f'"id": {json.dumps(message_id)}, ' if message_id is not None else ''
+        async with self._send_lock:
+            await self._ws.send_str(f'{{{message_id_json}"type": "{message_type}", "payload": {payload_json}}}')
+
+    def _push_task(self, task: Task) -> None:
+        request = asyncio.create_task(self._send('task', task.json()))
+        self._requests.add(request)
+        request.add_done_callback(self._requests.discard)
+
+    async def _close_at(self, valid_before: datetime) -> None:
+        await asyncio.sleep((valid_before - datetime.now().astimezone()).total_seconds())
+        await self._ws.close(code=WSCloseCode.POLICY_VIOLATION, message=b'Room-Token is expired.')
+
+    def _admit(self, route: str):
+        """Slot of admission control for recognition work, raises Overloaded if it isn't given."""
+        return self._admission.admit(route) if self._admission is not None else nullcontext()
+
+    async def _check_face(self, payload: Any, body: bytes) -> Result:
+        async with self._admit('check_face'):
+            try:
+                image, _ = await asyncio.to_thread(decode_image, body)
+            except (UnidentifiedImageError, OSError):
+                raise ChannelError("Cannot decode image file. It's invalid.")
+            return await self._access_control.check_access_by_face(self._room_id, image)
+
+    async def _stream_frame(self, payload: Any, body: bytes) -> Result:
+        if self._stream_session is None:
+            self._stream_session = self._access_control.open_stream_session(self._room_id)
+        # Frames are sent at camera rate, the terminal just sends the next one instead of a dropped frame,
+        # so a frame isn't decoded or queued for a slot if it would be dropped
+        if self._stream_session.busy:
+            return Ok(result=StreamFrame(dropped=True))
+        slot = self._admission.try_acquire('stream_frame') if self._admission is not None else None
+        if self._admission is not None and slot is None:
+            return Ok(result=StreamFrame(dropped=True))
+        try:
+            try:
+                frame, _ = await asyncio.to_thread(decode_image, body)
+            except (UnidentifiedImageError, OSError):
+                raise ChannelError("Cannot decode image file. It's invalid.")
+            return Ok(result=await self._stream_session.process_frame(frame))
+        finally:
+            if slot is not None:
+                slot.release()
+
+    async def _check_descriptor(self, payload: Any, body: bytes) -> Result:
+        descriptor = np.array(_parse_payload(payload, FaceDescriptor).features)
+        async with self._admit('check_descriptor'):
+            return await self._access_control.check_access_by_descriptor(self._room_id, descriptor)
+
+    async def _check_descriptors(self, payload: Any, body: bytes) -> Result:
+        batch = _parse_payload(payload, FaceDescriptors)
+        descriptors = [np.array(descriptor.features) for descriptor in batch.descriptors]
+        async with self._admit('check_descriptors'):
+            return await self._access_control.check_access_by_descriptors(self._room_id, descriptors)
+
+    async def _record_visit(self, payload: Any, body: bytes) -> Result:
+        visit = _parse_payload(payload, VisitInfo)
+        return await self._access_control.record_visit(self._room_id, visit.user_id, visit.datetime)
+
+    async def _get_undone_tasks(self, payload: Any, body: bytes) -> Result:
+        return await self._tasks.get_undone_tasks(self._room_id)
+
+    async def _report_task(self, payload: Any, body: bytes) -> Result:
+        report = _parse_payload(payload, TaskPerformingReport)
+        return await self._tasks.report_task_performed(self._room_id, report.task_id, report.new_status)
+
+
+def _parse_json(data: str | bytes) -> dict:
+    try:
+        message = json.loads(data)
+    except ValueError:
+        raise ChannelError('Message is not a valid JSON.')
+    if not isinstance(message, dict):
+        raise ChannelError('Message must be a JSON object.')
+    return message
+
+
+def _split_binary(data: bytes) -> tuple[dict, bytes]:
+    header_end = _HEADER_LENGTH_SIZE + int.from_bytes(data[:_HEADER_LENGTH_SIZE], 'big')
+    if len(data) < header_end:
+        raise ChannelError('Binary message is shorter than its header.')
+    return _parse_json(data[_HEADER_LENGTH_SIZE:header_end]), data[header_end:]
+
+
+def _parse_payload(payload: Any, model: type[BaseModel]) -> Any:
+    try:
+        return model.parse_obj(payload)
+    except ValidationError:
+        raise ChannelError('Payload has wrong schema or types.')
+
+
+@require(RoomSessionAuth('auth'))
+async def room_websocket(r: web.Request, auth: RoomAuthorization):
+    ws = web.WebSocketResponse(heartbeat=config.ROOM_CHANNEL_HEARTBEAT_SEC,
+                               max_msg_size=config.IMAGE_MAX_SIZE_BYTES + config.ROOM_CHANNEL_MAX_HEADER_SIZE)
+    await ws.prepare(r)
+    r.app['room_channels'].add(ws)
+    try:
+        channel = RoomChannel(r.app, ws, auth.room_id, config.ROOM_CHANNEL_MAX_IN_FLIGHT)
+        await channel.serve(auth.valid_before)
+    finally:
+        r.app['room_channels'].discard(ws)
+    return ws
+
+
+async def close_room_channels(app: web.Application) -> None:
+    """Close open channels on shutdown, otherwise server waits for terminals to disconnect."""
+    for ws in set(app['room_channels']):
+        await ws.close(code=WSCloseCode.GOING_AWAY, message=b'Server shutdown.')
@@ -0,0 +1,76 @@
+"""
+Fast serialization of response models, output is byte-identical to `model.json(exclude_none=True)`.
+
+pydantic builds the dict through its generic include/exclude machinery for every nested model.
+Here every model class gets a field plan once: names of its fields and whether a value can be
+put into JSON as is (str, int, float, bool or list of them). Serialization then is a plain walk building dicts
+and one call of the C JSON encoder with pydantic's default encoder for the rest of types.
+Models with custom JSON config or field exclusions are serialized by pydantic itself.
+"""
+import json
+from typing import Any, Union
+
+from pydantic import BaseModel, Extra
+from pydantic.fields import ModelField, SHAPE_SINGLETON, SHAPE_LIST
+from pydantic.json import pydantic_encoder
+
+
+# Field plan: names of fields whose values need conversion, empty if all values go to JSON as is
+FieldPlan = frozenset[str]
+
+_SCALAR_TYPES = (str, int, float, bool)
+_plans: dict[type, Union[FieldPlan, None]] = {}
+# The encoder json.dumps(data, default=pydantic_encoder) would create, made once
+_encoder = json.JSONEncoder(default=pydantic_encoder)
+
+
+def dump_model(model: BaseModel) -> str:
+    """Return JSON of the model without None fields, as `model.json(exclude_none=True)` does."""
+    if (plan := _get_plan(type(model))) is None:
+        return model.json(exclude_none=True)
+    return _encoder.encode(_model_to_dict(model, plan))
+
+
+def _get_plan(model_class: type[BaseModel]) -> Union[FieldPlan, None]:
+    try:
+        return _plans[model_class]
+    except KeyError:
+        plan = _plans[model_class] = _make_plan(model_class)
+        return plan
+
+
+def _make_plan(model_class: type[BaseModel]) -> Union[FieldPlan, None]:
+    config = model_class.__config__
+    if config.json_encoders or config.json_dumps is not json.dumps or config.extra == Extra.allow \
+            or model_class.dict is not BaseModel.dict or model_class.__custom_root_type__ \
+            or model_class.__exclude_fields__ or model_class.__include_fields__:
+        return None
+    return frozenset(name for name, field in model_class.__fields__.items() if not _is_plain(field))
+
+
+def _is_plain(field: ModelField) -> bool:
+    """Field value is a scalar or a list of scalars, so it goes to JSON as is."""
+    return field.shape in (SHAPE_SINGLETON, SHAPE_LIST) \
+        and isinstance(field.type_, type) and issubclass(field.type_, _SCALAR_TYPES)
+
+
+def _model_to_dict(model: BaseModel, plan: FieldPlan) -> dict:
+    # Like pydantic, values are taken in __dict__ order
+    if not plan:
+        return {name: value for name, value in model.__dict__.items() if value is not None}
+    return {name: _to_plain(value) if name in plan else value
+            for name, value in model.__dict__.items() if value is not None}
+
+
+def _to_plain(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        if (plan := _get_plan(type(value))) is None:
+            return value.dict(exclude_none=True)
+        return _model_to_dict(value, plan)
+    if isinstance(value, list):
+        return [_to_plain(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_to_plain(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _to_plain(item) for key, item in value.items()}
+    return value
@@ -5,8 +5,16 @@ from typing import Callable, Union, Any
 from aiohttp.web import Request, Response, StreamResponse, json_response
 from pydantic import BaseModel
 
+from .serialization import dump_model
+from main_node.metrics import registry
+
 Handler = Callable
 
+_requirement_seconds = registry.histogram('http_requirement_seconds', 'Preparation time of handler requirements.',
+                                          ('handler', 'requirement'))
+_handler_seconds = registry.histogram('http_handler_seconds', 'Handler time after requirements are prepared.',
+                                      ('handler',))
+
 
 class require:
     def __init__(self, *requirements: 'ControllerRequirement'):
@@ -20,16 +28,24 @@ class require:
             nonlocal requirements, handler
 
             requirements_kwargs = {}
-            for req in requirements:
-                preparing_result = await req.prepare_requirement(request)
+            prepared = []
+            try:
+                for req in requirements:
+                    with _requirement_seconds.time(handler.__name__, type(req).__name__):
+                        preparing_result = await req.prepare_requirement(request)
 
-                if isinstance(preparing_result, Response):
-                    return preparing_result
+                    if isinstance(preparing_result, Response):
+                        return preparing_result
+                    prepared.append((req, preparing_result))
 
-                if req.name is not None:
-                    requirements_kwargs[req.name] = preparing_result
+                    if req.name is not None:
+                        requirements_kwargs[req.name] = preparing_result
 
-            return await handler(request, *args, **kwargs, **requirements_kwargs)
+                with _handler_seconds.time(handler.__name__):
+                    return await handler(request, *args, **kwargs, **requirements_kwargs)
+            finally:
+                for req, preparing_result in reversed(prepared):
+                    req.release_requirement(preparing_result)
 
         return wrapper_handler
 
@@ -41,6 +57,9 @@ class ControllerRequirement(ABC):
     @abstractmethod
     async def prepare_requirement(self, request: Request) -> Union[Any, Response]: ...
 
+    def release_requirement(self, prepared: Any) -> None:
+        """Free what prepare_requirement() took, called after the handler returns or a later requirement fails."""
+
 
 def pydantic_response(model: BaseModel) -> Response:
-    return json_response(text=model.json(exclude_none=True))
+    return json_response(text=dump_model(model))
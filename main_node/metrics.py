@@ -0,0 +1,188 @@
+"""
+In-process metrics: counters and histograms rendered in Prometheus text format.
+
+Metrics are declared once at module level of the code they measure and registered in the global `registry`.
+While the registry is disabled every recording is a single flag check, so instrumented code
+can stay instrumented in production builds that don't scrape metrics.
+"""
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Iterable, Optional, Sequence, Union
+
+from pydantic import BaseModel
+
+
+# Latency buckets in seconds: 0.5 ms … 10 s
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+# Sample of a collected metric: name, label values by names and value
+Sample = tuple[str, dict[str, str], float]
+Collector = Callable[[], Iterable[Sample]]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = False
+        self._metrics: dict[str, Union['Counter', 'Histogram']] = {}
+        self._collectors: dict[str, tuple[str, Collector]] = {}
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> 'Counter':
+        return self._register(Counter(self, name, documentation, tuple(label_names)))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> 'Histogram':
+        return self._register(Histogram(self, name, documentation, tuple(label_names), tuple(buckets)))
+
+    def set_gauge_collector(self, name: str, documentation: str, collector: Collector) -> None:
+        """Register gauges whose samples are produced by collector at render time, replacing one of the name."""
+        self._collectors[name] = (documentation, collector)
+
+    def render(self) -> str:
+        """Return all metrics in Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.TYPE}')
+            lines.extend(_format_sample(*sample) for sample in metric.samples())
+        for documentation, collector in self._collectors.values():
+            samples = list(collector())
+            for sample_name in dict.fromkeys(sample_name for sample_name, _, _ in samples):
+                lines.append(f'# HELP {sample_name} {documentation}')
+                lines.append(f'# TYPE {sample_name} gauge')
+                lines.extend(_format_sample(*sample) for sample in samples if sample[0] == sample_name)
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered.')
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class Counter:
+    TYPE = 'counter'
+
+    def __init__(self, registry: MetricsRegistry, name: str, documentation: str, label_names: tuple[str, ...]):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self._label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.) -> None:
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, dict(zip(self._label_names, label_values)), value
+
+
+class Histogram:
+    TYPE = 'histogram'
+
+    def __init__(self, registry: MetricsRegistry, name: str, documentation: str,
+                 label_names: tuple[str, ...], buckets: tuple[float, ...]):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self._label_names = label_names
+        self._buckets = buckets
+        # Label values -> [bucket counts..., +Inf count, sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not self._registry.enabled:
+            return
+        bucket = bisect_left(self._buckets, value)
+        with self._lock:
+            if (counts := self._values.get(label_values)) is None:
+                counts = self._values[label_values] = [0.] * (len(self._buckets) + 2)
+            counts[bucket] += 1
+            counts[-1] += value
+
+    def time(self, *label_values: str) -> '_Timer':
+        """Context manager observing duration of its body."""
+        return _Timer(self, label_values)
+
+    def timed(self, *label_values: str) -> Callable:
+        """Decorator of coroutine functions observing their duration."""
+        def decorator(function):
+            @wraps(function)
+            async def wrapper(*args, **kwargs):
+                if not self._registry.enabled:
+                    return await function(*args, **kwargs)
+                start = perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.observe(perf_counter() - start, *label_values)
+            return wrapper
+        return decorator
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = [(label_values, list(counts)) for label_values, counts in self._values.items()]
+        for label_values, counts in values:
+            labels = dict(zip(self._label_names, label_values))
+            cumulative = 0.
+            for upper_bound, count in zip(self._buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', {**labels, 'le': _format_value(upper_bound)}, cumulative
+            yield f'{self.name}_sum', labels, counts[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_label_values', '_start')
+
+    def __init__(self, histogram: Histogram, label_values: tuple[str, ...]):
+        self._histogram = histogram
+        self._label_values = label_values
+        self._start: Optional[float] = None
+
+    def __enter__(self):
+        if self._histogram._registry.enabled:
+            self._start = perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        if self._start is not None:
+            self._histogram.observe(perf_counter() - self._start, *self._label_values)
+
+
+def stats_samples(prefix: str, stats: BaseModel) -> Iterable[Sample]:
+    """Numeric fields of a stats model and its nested models as samples named by their path."""
+    for name, value in stats:
+        if isinstance(value, BaseModel):
+            yield from stats_samples(f'{prefix}_{name}', value)
+        elif isinstance(value, (int, float)):
+            yield f'{prefix}_{name}', {}, float(value)
+
+
+def _format_sample(name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        label_pairs = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels.items())
+        return f'{name}{{{label_pairs}}} {_format_value(value)}'
+    return f'{name} {_format_value(value)}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape(label_value: str) -> str:
+    return str(label_value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+registry = MetricsRegistry()
@@ -1,2 +1,5 @@
-from .access_control_service import AccessControlService
+from .access_control_service import AccessControlService, AccessControlStats
 from .access_control_repository import AccessControlRepository
+from .visit_buffer import VisitReportBuffer
+from .gallery_store import GallerySnapshotStore
+from .stream_session import StreamSession, StreamSettings, StreamFrame
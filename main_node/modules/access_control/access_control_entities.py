@@ -11,6 +11,11 @@ class User(BaseModel):
     extra_info: Optional[str]
 
 
+class UserAccess(BaseModel):
+    user: User
+    have_access: bool
+
+
 class UserFaceDescriptor(BaseModel):
     id: int
     features: list[float]
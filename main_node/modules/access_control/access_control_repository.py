@@ -1,41 +1,198 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Callable
 
+import numpy as np
+from numpy.typing import NDArray
+
+from face_recognition.gallery import DESCRIPTOR_SIZE
 from main_node.utils import Repository
 
-from .access_control_entities import User, UserFaceDescriptor, RoomVisitReport
+from .access_control_entities import User, UserAccess, UserFaceDescriptor, RoomVisitReport
+from .descriptors_copy import copy_buffer_size, parse_descriptors_copy
+
+
+# ("id", "room_id", "user_id", "datetime") row of "RoomVisitReport"
+VisitReportRecord = tuple[int, int, int, datetime]
 
 
 class AccessControlRepository(Repository):
     async def get_user_by_descriptor_id(self, descriptor_id: int) -> Optional[User]:
         query = 'select * from "User" where "id" = ' \
                 '(select "user_id" from "UserFaceDescriptor" where "id" = $1)'
-        if record := await self._conn.fetchrow(query, descriptor_id):
-            return User.parse_obj(record)
-        else:
-            return None
+        async with self._connection() as conn:
+            if record := await conn.fetchrow(query, descriptor_id):
+                return User.parse_obj(record)
+            else:
+                return None
+
+    async def get_user_access_by_descriptor_id(self, descriptor_id: int, room_id: int) -> Optional[UserAccess]:
+        """Get user bound to descriptor and his access permission to the room by one query."""
+        query = 'select "User".*, exists(select from "UserRoomAccessPermission" ' \
+                '                        where "room_id" = $2 and "user_id" = "User"."id") as "have_access" ' \
+                'from "UserFaceDescriptor" join "User" on "User"."id" = "UserFaceDescriptor"."user_id" ' \
+                'where "UserFaceDescriptor"."id" = $1'
+        async with self._connection() as conn:
+            if record := await conn.fetchrow(query, descriptor_id, room_id):
+                return UserAccess(user=User.parse_obj(record), have_access=record['have_access'])
+            else:
+                return None
+
+    async def get_users_by_descriptor_ids(self, descriptor_ids: list[int]) -> dict[int, User]:
+        """Get users bound to descriptors by one query, unbound descriptors are absent in the result."""
+        query = 'select "UserFaceDescriptor"."id" as "descriptor_id", "User".* ' \
+                'from "UserFaceDescriptor" join "User" on "User"."id" = "UserFaceDescriptor"."user_id" ' \
+                'where "UserFaceDescriptor"."id" = any($1::bigint[])'
+        async with self._connection() as conn:
+            records = await conn.fetch(query, descriptor_ids)
+        return {record['descriptor_id']: User.parse_obj(record) for record in records}
+
+    async def get_user_accesses_by_descriptor_ids(self, descriptor_ids: list[int],
+                                                  room_id: int) -> dict[int, UserAccess]:
+        """Get users bound to descriptors and their access permissions to the room by one query."""
+        query = 'select "UserFaceDescriptor"."id" as "descriptor_id", "User".*, ' \
+                '       exists(select from "UserRoomAccessPermission" ' \
+                '              where "room_id" = $2 and "user_id" = "User"."id") as "have_access" ' \
+                'from "UserFaceDescriptor" join "User" on "User"."id" = "UserFaceDescriptor"."user_id" ' \
+                'where "UserFaceDescriptor"."id" = any($1::bigint[])'
+        async with self._connection() as conn:
+            records = await conn.fetch(query, descriptor_ids, room_id)
+        return {record['descriptor_id']: UserAccess(user=User.parse_obj(record), have_access=record['have_access'])
+                for record in records}
 
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         query = 'select * from "User" where "id" = $1'
-        if record := await self._conn.fetchrow(query, user_id):
-            return User.parse_obj(record)
-        else:
-            return None
+        async with self._connection() as conn:
+            if record := await conn.fetchrow(query, user_id):
+                return User.parse_obj(record)
+            else:
+                return None
 
     async def check_access_permission_exist(self, user_id: int, room_id: int) -> bool:
         query = 'select from "UserRoomAccessPermission" where "room_id" = $1 and "user_id" = $2'
-        return await self._conn.fetchrow(query, room_id, user_id) is not None
+        async with self._connection() as conn:
+            return await conn.fetchrow(query, room_id, user_id) is not None
+
+    async def get_all_access_permissions(self) -> list[tuple[int, int]]:
+        """Return all (user_id, room_id) access permission pairs."""
+        query = 'select "user_id", "room_id" from "UserRoomAccessPermission"'
+        async with self._connection() as conn:
+            records = await conn.fetch(query)
+        return [(r['user_id'], r['room_id']) for r in records]
+
+    async def listen_access_permission_changes(self, callback: Callable[[str], None]) -> None:
+        """Call callback with JSON payload {"operation", "user_id", "room_id"} on every permission change."""
+        await self._listen('user_room_access_permission', callback)
 
     async def create_visit_report(self, room_id: int, user_id: int, datetime_: datetime) -> RoomVisitReport:
         query = 'insert into "RoomVisitReport" ("room_id", "user_id", "datetime") ' \
                 'values ($1, $2, $3) returning *'
-        record = await self._conn.fetchrow(query, room_id, user_id, datetime_)
+        async with self._connection() as conn:
+            record = await conn.fetchrow(query, room_id, user_id, datetime_)
         return RoomVisitReport.parse_obj(record)
 
+    async def allocate_visit_report_ids(self, quantity: int) -> list[int]:
+        """Reserve ids of "RoomVisitReport" sequence for reports written later."""
+        query = 'select nextval(pg_get_serial_sequence(\'"RoomVisitReport"\', \'id\')) as "id" ' \
+                'from generate_series(1, $1)'
+        async with self._connection() as conn:
+            records = await conn.fetch(query, quantity)
+        return [r['id'] for r in records]
+
+    async def copy_visit_reports(self, reports: list[VisitReportRecord]) -> None:
+        async with self._connection() as conn:
+            await conn.copy_records_to_table('RoomVisitReport', records=reports,
+                                             columns=['id', 'room_id', 'user_id', 'datetime'])
+
+    async def get_face_descriptor(self, descriptor_id: int) -> Optional[UserFaceDescriptor]:
+        query = 'select * from "UserFaceDescriptor" where "id" = $1'
+        async with self._connection() as conn:
+            if record := await conn.fetchrow(query, descriptor_id):
+                return UserFaceDescriptor.parse_obj(record)
+            else:
+                return None
+
+    async def create_face_descriptor(self, user_id: int, features: list[float]) -> UserFaceDescriptor:
+        query = 'insert into "UserFaceDescriptor" ("features", "user_id") values ($1, $2) returning *'
+        async with self._connection() as conn:
+            record = await conn.fetchrow(query, features, user_id)
+        return UserFaceDescriptor.parse_obj(record)
+
+    async def delete_face_descriptor(self, descriptor_id: int) -> bool:
+        """Delete descriptor, return False if there is no descriptor with such id."""
+        query = 'delete from "UserFaceDescriptor" where "id" = $1 returning "id"'
+        async with self._connection() as conn:
+            return await conn.fetchrow(query, descriptor_id) is not None
+
+    async def listen_face_descriptor_changes(self, callback: Callable[[str], None]) -> None:
+        """Call callback with JSON payload {"operation", "id"} on every descriptor change."""
+        await self._listen('user_face_descriptor', callback)
+
     async def get_all_face_descriptors(self) -> list[UserFaceDescriptor]:
         query = 'select * from "UserFaceDescriptor"'
         descriptors = []
-        async with self._conn.transaction():
-            async for record in self._conn.cursor(query):
+        async with self._connection() as conn, conn.transaction():
+            async for record in conn.cursor(query):
                 descriptors.append(UserFaceDescriptor.parse_obj(record))
         return descriptors
+
+    async def has_face_descriptor_versions(self) -> bool:
+        """Return whether "UserFaceDescriptor" has the version column (database_migration_descriptor_version.sql)."""
+        query = ('select exists(select from information_schema.columns '
+                 'where table_name = \'UserFaceDescriptor\' and column_name = \'version\')')
+        async with self._connection() as conn:
+            return await conn.fetchval(query)
+
+    async def get_face_descriptors_version(self) -> int:
+        """Return version of the latest descriptor change, deletions aside."""
+        query = 'select coalesce(max("version"), 0) from "UserFaceDescriptor"'
+        async with self._connection() as conn:
+            return await conn.fetchval(query)
+
+    async def get_face_descriptor_ids(self) -> NDArray[np.int64]:
+        query = 'select "id" from "UserFaceDescriptor"'
+        async with self._connection() as conn:
+            records = await conn.fetch(query)
+        return np.fromiter((r['id'] for r in records), dtype=np.int64, count=len(records))
+
+    async def get_face_descriptors_changed_since(self, version: int
+                                                 ) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """Return ids and descriptors matrix of descriptors inserted or updated after the version."""
+        query = 'select "id", "features" from "UserFaceDescriptor" where "version" > $1'
+        async with self._connection() as conn:
+            records = await conn.fetch(query, version)
+        ids = np.fromiter((r['id'] for r in records), dtype=np.int64, count=len(records))
+        descriptors = np.array([r['features'] for r in records], dtype=np.float64).reshape(len(records), DESCRIPTOR_SIZE)
+        return ids, descriptors
+
+    async def get_face_descriptors_by_ids(self, descriptor_ids: list[int]
+                                          ) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """Return ids and descriptors matrix of existing descriptors of the ids."""
+        query = 'select "id", "features" from "UserFaceDescriptor" where "id" = any($1::bigint[])'
+        async with self._connection() as conn:
+            records = await conn.fetch(query, descriptor_ids)
+        ids = np.fromiter((r['id'] for r in records), dtype=np.int64, count=len(records))
+        descriptors = np.array([r['features'] for r in records], dtype=np.float64)
+        return ids, descriptors.reshape(len(records), DESCRIPTOR_SIZE)
+
+    async def copy_all_face_descriptors(self) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """
+        Load all descriptors as ids array and (N, 128) matrix by binary COPY into a preallocated buffer.
+        Raise ValueError if some descriptor isn't an array of 128 floats.
+        """
+        query = 'select "id", "features" from "UserFaceDescriptor"'
+        async with self._connection() as conn, conn.transaction(isolation='repeatable_read', readonly=True):
+            # Count and COPY see the same table snapshot
+            quantity = await conn.fetchval('select count(*) from "UserFaceDescriptor"')
+            buffer = np.empty(copy_buffer_size(quantity), dtype=np.uint8)
+            written = 0
+
+            async def write(chunk: bytes) -> None:
+                nonlocal written
+                end = written + len(chunk)
+                if end > len(buffer):
+                    raise ValueError('Binary COPY output is bigger than expected.')
+                buffer[written:end] = np.frombuffer(chunk, dtype=np.uint8)
+                written = end
+
+            await conn.copy_from_query(query, output=write, format='binary')
+        return parse_descriptors_copy(buffer[:written])
@@ -1,98 +1,430 @@
-from asyncio import to_thread
-from datetime import datetime, date
+import asyncio
+import json
+import logging
+from datetime import datetime
+from time import perf_counter
 from typing import Optional
 
 import numpy as np
 from pydantic import BaseModel
 
 from face_recognition import NumpyImage, Descriptor
-from face_recognition.two_step import FaceRecognizer, FaceImageNormalizer
+from face_recognition.face_recognition_protocols import AsyncFaceRecognition, RecognitionResult
+from face_recognition.gallery import DESCRIPTOR_SIZE
+from face_recognition.execution import ExecutionPolicy
 
 from main_node.utils import Service, Ok, Error, Result
+from main_node.metrics import registry
 from .access_control_repository import AccessControlRepository
-from .access_control_entities import User
+from .access_control_entities import User, UserAccess
+from .recognition_batcher import RecognitionBatcher, BatchingStats
+from .permission_index import RoomPermissionIndex, PermissionIndexStats
+from .visit_buffer import VisitReportBuffer, VisitBufferStats
+from .gallery_store import GallerySnapshotStore
+from .stream_session import StreamSession, StreamSettings
+
+
+logger = logging.getLogger(__name__)
+
+_call_seconds = registry.histogram('access_control_call_seconds', 'Durations of access control service calls.',
+                                   ('method',))
+_stage_seconds = registry.histogram('access_control_stage_seconds',
+                                    'Durations of access check stages: recognition and user access lookup.',
+                                    ('stage',))
+
+# Queued among descriptor change notifications to reconcile descriptors with DB
+_RECONCILE = object()
 
 
 class AccessControlService(Service):
     SERVICE_NAME = 'access_control'
 
     def __init__(self, repository: AccessControlRepository,
-                 face_recognizer: FaceRecognizer,
-                 face_image_normalizer: FaceImageNormalizer):
+                 face_recognition: AsyncFaceRecognition,
+                 batch_window_sec: float = 0.,
+                 max_batch_size: int = 1,
+                 use_permission_index: bool = False,
+                 permission_resync_interval_sec: float = 300.,
+                 visit_buffer: Optional[VisitReportBuffer] = None,
+                 sync_descriptors: bool = False,
+                 descriptor_reconcile_interval_sec: float = 60.,
+                 gallery_store: Optional[GallerySnapshotStore] = None,
+                 stream_settings: Optional[StreamSettings] = None,
+                 execution_policy: Optional[ExecutionPolicy] = None):
         self._repository = repository
-        self._face_recognizer = face_recognizer
-        self._face_image_normalizer = face_image_normalizer
+        self._face_recognition = face_recognition
+        # Batching is disabled when a batch can contain only one image
+        self._batcher: Optional[RecognitionBatcher] = None
+        if max_batch_size > 1:
+            self._batcher = RecognitionBatcher(self._face_recognition.recognize_batch,
+                                               batch_window_sec, max_batch_size)
+        # Permissions are checked in memory if index is used, it's kept in sync by notifications and resyncs
+        self._permission_index: Optional[RoomPermissionIndex] = None
+        if use_permission_index:
+            self._permission_index = RoomPermissionIndex()
+        self._permission_resync_interval_sec = permission_resync_interval_sec
+        self._permission_resync_task: Optional[asyncio.Task] = None
+        # Visits are written behind if buffer is provided
+        self._visit_buffer = visit_buffer
+        # Descriptors changed in DB by other clients are applied to recognition by notifications
+        self._sync_descriptors = sync_descriptors
+        self._descriptor_changes: Optional[asyncio.Queue] = None
+        self._descriptor_sync_task: Optional[asyncio.Task] = None
+        # Notifications lost while listener connection was down are covered by periodic reconciling with DB
+        self._descriptor_reconcile_interval_sec = descriptor_reconcile_interval_sec
+        self._descriptor_reconcile_task: Optional[asyncio.Task] = None
+        # Gallery is loaded from the store and only descriptors changed since it was saved are read from DB
+        self._gallery_store = gallery_store
+        self._gallery_version = 0
+        self._saved_gallery_epoch: Optional[int] = None
+        self._recognition_stats = RecognitionStats()
+        self._stream_settings = stream_settings or StreamSettings()
+        # Executors of face_recognition stages, shut down with the service
+        self._execution_policy = execution_policy
 
+    @_call_seconds.timed('check_access_by_face')
     async def check_access_by_face(self, room_id: int, image: NumpyImage) -> 'Result[AccessCheck]':
         """Check user access to the room by his face."""
-        if not self._face_recognizer.check_image_normalized(image):
+        if not self._face_recognition.check_image_normalized(image):
             return Error(cause='Provided image is not normalized.')
         # Recognize face
-        result = await to_thread(self._face_recognizer.recognize, image)
+        with _stage_seconds.time('recognition'):
+            if self._batcher is not None:
+                result = await self._batcher.recognize(image)
+            else:
+                result = await self._face_recognition.recognize(image)
+        self._record_decision(result)
         if not result.is_known_face:
             return Ok(result=AccessCheck(is_known=False))
-        # Get user by descriptor id
-        user = await self._repository.get_user_by_descriptor_id(result.descriptor_id)
-        if user is None:
+        # Get user by descriptor id and check his access to the room
+        with _stage_seconds.time('user_access'):
+            user_access = await self._get_user_access(result.descriptor_id, room_id)
+        if user_access is None:
             cause = f'Calculated descriptor is known, but not bound to user. (descriptor_id = {result.descriptor_id})'
             return Error(cause=cause)
-        # Check user access to the room
-        have_access = await self._repository.check_access_permission_exist(user.id, room_id)
-        return Ok(result=AccessCheck(is_known=True, have_access=have_access, user=user))
+        return Ok(result=AccessCheck(is_known=True, have_access=user_access.have_access, user=user_access.user))
 
+    @_call_seconds.timed('check_access_by_descriptor')
     async def check_access_by_descriptor(self, room_id: int, descriptor: Descriptor) -> 'Result[AccessCheck]':
         """Check user access to the room by descriptor of his face."""
-        if not self._face_recognizer.check_descriptor_valid(descriptor):
+        if not self._face_recognition.check_descriptor_valid(descriptor):
             return Error(cause='Provided descriptor is invalid.')
         # Get descriptor id
-        result = self._face_recognizer.recognize_by_descriptor(descriptor)
+        with _stage_seconds.time('recognition'):
+            result = self._face_recognition.recognize_by_descriptor(descriptor)
+        self._record_decision(result)
         if not result.is_known_face:
             return Ok(result=AccessCheck(is_known=False))
-        # Get user by descriptor id
-        user = await self._repository.get_user_by_descriptor_id(result.descriptor_id)
-        if user is None:
+        # Get user by descriptor id and check his access to the room
+        with _stage_seconds.time('user_access'):
+            user_access = await self._get_user_access(result.descriptor_id, room_id)
+        if user_access is None:
             cause = f'Provided descriptor is known, but not bound to user. (descriptor_id = {result.descriptor_id})'
             return Error(cause=cause)
-        # Check user access to the room
-        have_access = await self._repository.check_access_permission_exist(user.id, room_id)
-        return Ok(result=AccessCheck(is_known=True, have_access=have_access, user=user))
+        return Ok(result=AccessCheck(is_known=True, have_access=user_access.have_access, user=user_access.user))
+
+    @_call_seconds.timed('check_access_by_descriptors')
+    async def check_access_by_descriptors(self, room_id: int,
+                                          descriptors: list[Descriptor]) -> 'Result[AccessCheckList]':
+        """
+        Check access to the room by several descriptors: they are matched by one vectorized query
+        and their users are fetched by one more. Results are in order of descriptors.
+        """
+        checks: list[Result] = [Error(cause='Provided descriptor is invalid.')] * len(descriptors)
+        valid = [number for number, descriptor in enumerate(descriptors)
+                 if self._face_recognition.check_descriptor_valid(descriptor)]
+        with _stage_seconds.time('recognition'):
+            # (M, N) distances product takes up to hundreds of ms on a large gallery, the loop must not wait for it
+            results = await asyncio.to_thread(self._face_recognition.recognize_by_descriptors,
+                                              [descriptors[number] for number in valid])
+        for result in results:
+            self._record_decision(result)
+        known_ids = list({result.descriptor_id for result in results if result.is_known_face})
+        with _stage_seconds.time('user_access'):
+            user_accesses = await self._get_user_accesses(known_ids, room_id) if known_ids else {}
+        for number, result in zip(valid, results):
+            if not result.is_known_face:
+                checks[number] = Ok(result=AccessCheck(is_known=False))
+            elif (user_access := user_accesses.get(result.descriptor_id)) is not None:
+                checks[number] = Ok(result=AccessCheck(is_known=True, have_access=user_access.have_access,
+                                                       user=user_access.user))
+            else:
+                cause = f'Provided descriptor is known, but not bound to user. (descriptor_id = {result.descriptor_id})'
+                checks[number] = Error(cause=cause)
+        return Ok(result=AccessCheckList(checks=checks))
+
+    def open_stream_session(self, room_id: int) -> StreamSession:
+        """Start access checks of the room video stream, faces are recognized once per track."""
+        return StreamSession(self._face_recognition,
+                             lambda image: self.check_access_by_face(room_id, image),
+                             self._stream_settings)
 
+    @_call_seconds.timed('record_visit')
     async def record_visit(self, room_id: int, user_id: int, datetime_: datetime) -> 'Result[VisitRecording]':
         """Record information about room visiting if access permission exist."""
         # Check permission to the room exist
-        if not await self._repository.check_access_permission_exist(user_id, room_id):
+        if not await self._check_access_permission(user_id, room_id):
             return Ok(result=VisitRecording(allowed=False))
         # Write no visit to database
+        if self._visit_buffer is not None:
+            visit_id = await self._visit_buffer.add(room_id, user_id, datetime_)
+            return Ok(result=VisitRecording(allowed=True, visit_id=visit_id))
         visit = await self._repository.create_visit_report(room_id, user_id, datetime_)
         return Ok(result=VisitRecording(allowed=True, visit_id=visit.id))
 
-    async def calculate_descriptor(self, image: NumpyImage) -> 'Result[AnonymousDescriptor]':
-        """Calculate face descriptor based on given image."""
-        if not self._face_image_normalizer.check_image_valid(image):
+    @_call_seconds.timed('calculate_descriptor')
+    async def calculate_descriptor(self, image: NumpyImage,
+                                   detection_image: Optional[NumpyImage] = None) -> 'Result[AnonymousDescriptor]':
+        """Calculate face descriptor based on given image, face can be searched on its downscaled copy."""
+        if not self._face_recognition.check_image_valid(image):
+            return Error(cause="Provided image is invalid.")
+        if detection_image is not None and not self._face_recognition.check_image_valid(detection_image):
             return Error(cause="Provided image is invalid.")
 
         # Normalize image
-        normalized_image = await to_thread(self._face_image_normalizer.normalize, image)
+        normalized_image = await self._face_recognition.normalize(image, detection_image)
         if normalized_image is None:
             return Error(cause="Can't normalize image. Maybe there is no face.")
 
         # Calculate descriptor
-        descriptor = await to_thread(self._face_recognizer.calculate_descriptor, normalized_image)
+        descriptor = await self._face_recognition.calculate_descriptor(normalized_image)
         anonymous_descriptor = AnonymousDescriptor(features=list(descriptor))
 
         return Ok(result=anonymous_descriptor)
 
+    @_call_seconds.timed('add_descriptor')
+    async def add_descriptor(self, user_id: int, descriptor: Descriptor) -> 'Result[AddedDescriptor]':
+        """Bind new face descriptor to the user and start recognizing it."""
+        if not self._face_recognition.check_descriptor_valid(descriptor):
+            return Error(cause='Provided descriptor is invalid.')
+        # Check user exist
+        if await self._repository.get_user_by_id(user_id) is None:
+            return Error(cause='Unknown user.')
+        user_descriptor = await self._repository.create_face_descriptor(user_id, descriptor.tolist())
+        self._face_recognition.update_descriptors({user_descriptor.id: descriptor})
+        return Ok(result=AddedDescriptor(descriptor_id=user_descriptor.id))
+
+    @_call_seconds.timed('delete_descriptor')
+    async def delete_descriptor(self, descriptor_id: int) -> 'Result[DeletedDescriptor]':
+        """Delete face descriptor and stop recognizing it."""
+        if not await self._repository.delete_face_descriptor(descriptor_id):
+            return Error(cause='No descriptor with provided id.')
+        self._face_recognition.remove_descriptors((descriptor_id,))
+        return Ok(result=DeletedDescriptor(descriptor_id=descriptor_id))
+
+    def get_stats(self) -> 'AccessControlStats':
+        batching = self._batcher.stats if self._batcher is not None else None
+        permissions = self._permission_index.stats if self._permission_index is not None else None
+        visit_buffer = self._visit_buffer.stats if self._visit_buffer is not None else None
+        recognition = self._recognition_stats.copy()
+        recognition.current_epoch = self._face_recognition.get_descriptors_epoch()
+        execution = None
+        if self._execution_policy is not None:
+            execution = ExecutionStats(**{stage: StageExecutionStats(**vars(utilization)) for stage, utilization
+                                          in self._execution_policy.get_utilization().items()})
+        return AccessControlStats(recognition=recognition, batching=batching,
+                                  permission_index=permissions, visit_buffer=visit_buffer, execution=execution)
+
+    def _record_decision(self, result: RecognitionResult) -> None:
+        """Count recognition decision by descriptors snapshot epoch it was made on."""
+        stats = self._recognition_stats
+        stats.decisions += 1
+        stats.last_decision_epoch = result.epoch
+        # Descriptors were changed while the decision was in flight
+        if result.epoch is not None and result.epoch < self._face_recognition.get_descriptors_epoch():
+            stats.stale_decisions += 1
+
+    async def _get_user_access(self, descriptor_id: int, room_id: int) -> Optional[UserAccess]:
+        """Get user bound to descriptor and his access to the room by one DB round trip."""
+        if self._permission_index is None:
+            return await self._repository.get_user_access_by_descriptor_id(descriptor_id, room_id)
+        user = await self._repository.get_user_by_descriptor_id(descriptor_id)
+        if user is None:
+            return None
+        return UserAccess(user=user, have_access=self._permission_index.has_access(user.id, room_id))
+
+    async def _get_user_accesses(self, descriptor_ids: list[int], room_id: int) -> dict[int, UserAccess]:
+        if self._permission_index is None:
+            return await self._repository.get_user_accesses_by_descriptor_ids(descriptor_ids, room_id)
+        users = await self._repository.get_users_by_descriptor_ids(descriptor_ids)
+        return {descriptor_id: UserAccess(user=user, have_access=self._permission_index.has_access(user.id, room_id))
+                for descriptor_id, user in users.items()}
+
+    async def _check_access_permission(self, user_id: int, room_id: int) -> bool:
+        if self._permission_index is not None:
+            return self._permission_index.has_access(user_id, room_id)
+        return await self._repository.check_access_permission_exist(user_id, room_id)
+
+    async def _load_permissions(self) -> None:
+        """Load all access permissions from DB to the ._permission_index."""
+        self._permission_index.begin_loading()
+        permissions = await self._repository.get_all_access_permissions()
+        self._permission_index.finish_loading(permissions)
+
+    async def _resync_permissions_periodically(self) -> None:
+        """Full permissions reload covering notifications lost while listener connection was down."""
+        while True:
+            await asyncio.sleep(self._permission_resync_interval_sec)
+            try:
+                await self._repository.ensure_listening()
+                await self._load_permissions()
+            except Exception:
+                logger.exception('Access permissions resync failed.')
+
     async def _load_descriptors(self) -> None:
-        """Load descriptors from DB to the ._face_recognizer()."""
-        descriptors = await self._repository.get_all_face_descriptors()
-        numpy_descriptors = ((d.id, np.array(d.features)) for d in descriptors)
-        self._face_recognizer.update_descriptors(numpy_descriptors)
+        """Load descriptors from the gallery store and DB to the ._face_recognition."""
+        start = perf_counter()
+        stored = await asyncio.to_thread(self._gallery_store.load) if self._gallery_store is not None else None
+        if stored is not None:
+            # Version is read before data, so changes made meanwhile are fetched again next time, not lost
+            version = await self._repository.get_face_descriptors_version()
+            changed_ids, changed_descriptors = \
+                await self._repository.get_face_descriptors_changed_since(stored.version)
+            db_ids = await self._repository.get_face_descriptor_ids()
+            deleted_ids = np.setdiff1d(stored.ids, db_ids)
+            # Rows committed with versions below the stored one after it was read (concurrent transactions)
+            missing_ids, missing_descriptors = await self._repository.get_face_descriptors_by_ids(
+                np.setdiff1d(db_ids, np.union1d(stored.ids, changed_ids)).tolist())
+            self._face_recognition.load_descriptors(stored.ids, stored.descriptors)
+            self._face_recognition.remove_descriptors(deleted_ids.tolist())
+            self._face_recognition.update_descriptors(zip(changed_ids.tolist(), changed_descriptors))
+            self._face_recognition.update_descriptors(zip(missing_ids.tolist(), missing_descriptors))
+            logger.info('%d face descriptors loaded from the gallery store in %.2f s '
+                        '(%d changed, %d missing, %d deleted since it was saved).', len(stored.ids),
+                        perf_counter() - start, len(changed_ids), len(missing_ids), len(deleted_ids))
+            if len(changed_ids) == 0 and len(missing_ids) == 0 and len(deleted_ids) == 0:
+                self._gallery_version = version
+                self._saved_gallery_epoch = self._face_recognition.get_descriptors_epoch()
+                return
+        else:
+            version = await self._repository.get_face_descriptors_version() if self._gallery_store is not None else 0
+            ids, descriptors = await self._fetch_all_descriptors()
+            loaded = perf_counter()
+            self._face_recognition.load_descriptors(ids, descriptors)
+            logger.info('%d face descriptors loaded in %.2f s, indexed in %.2f s.',
+                        len(ids), loaded - start, perf_counter() - loaded)
+        self._gallery_version = version
+        if self._gallery_store is not None:
+            await self._save_gallery()
+
+    async def _fetch_all_descriptors(self) -> tuple[np.ndarray, np.ndarray]:
+        try:
+            return await self._repository.copy_all_face_descriptors()
+        except ValueError:
+            logger.warning('Binary descriptors loading failed, loading them row by row.', exc_info=True)
+            records = await self._repository.get_all_face_descriptors()
+            ids = np.array([d.id for d in records], dtype=np.int64)
+            descriptors = np.array([d.features for d in records], dtype=np.float64)
+            return ids, descriptors.reshape(len(records), DESCRIPTOR_SIZE)
+
+    async def _save_gallery(self) -> None:
+        """Write current descriptors to the gallery store, failure only costs a longer next start."""
+        epoch = self._face_recognition.get_descriptors_epoch()
+        ids, descriptors = self._face_recognition.get_descriptors()
+        try:
+            await asyncio.to_thread(self._gallery_store.save, ids, descriptors, self._gallery_version)
+        except Exception:
+            logger.exception('Gallery saving failed.')
+        else:
+            self._saved_gallery_epoch = epoch
+
+    async def _apply_descriptor_changes(self) -> None:
+        """
+        Apply descriptor changes notifications one by one, so they can't overtake each other.
+        Reconciling is queued among them, so a notification received meanwhile is applied after it.
+        """
+        while True:
+            payload = await self._descriptor_changes.get()
+            if payload is _RECONCILE:
+                try:
+                    await self._reconcile_descriptors()
+                except Exception:
+                    logger.exception('Face descriptors reconciling failed.')
+                continue
+            try:
+                change = json.loads(payload)
+                descriptor_id = change['id']
+                if change['operation'] == 'DELETE':
+                    self._face_recognition.remove_descriptors((descriptor_id,))
+                elif (descriptor := await self._repository.get_face_descriptor(descriptor_id)) is not None:
+                    self._face_recognition.update_descriptors({descriptor_id: np.array(descriptor.features)})
+                else:
+                    # Deleted before the change was applied
+                    self._face_recognition.remove_descriptors((descriptor_id,))
+            except Exception:
+                logger.exception('Descriptor change %r applying failed.', payload)
+
+    async def _reconcile_descriptors_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._descriptor_reconcile_interval_sec)
+            self._descriptor_changes.put_nowait(_RECONCILE)
+
+    async def _reconcile_descriptors(self) -> None:
+        """
+        Apply descriptor changes missed by notifications: reopen lost listener connection,
+        load descriptors changed since the known version or missing in recognition and remove deleted ones.
+        """
+        await self._repository.ensure_listening()
+        # Version is read before data, so changes made meanwhile are fetched again next time, not lost
+        version = await self._repository.get_face_descriptors_version()
+        changed_ids, changed_descriptors = \
+            await self._repository.get_face_descriptors_changed_since(self._gallery_version)
+        known_ids, _ = self._face_recognition.get_descriptors()
+        db_ids = await self._repository.get_face_descriptor_ids()
+        deleted_ids = np.setdiff1d(known_ids, db_ids)
+        # Inserted by transactions committed after a later version was seen
+        missing_ids = np.setdiff1d(db_ids, np.union1d(known_ids, changed_ids))
+        missing_ids, missing_descriptors = await self._repository.get_face_descriptors_by_ids(missing_ids.tolist())
+        if len(deleted_ids) > 0:
+            self._face_recognition.remove_descriptors(deleted_ids.tolist())
+        if len(changed_ids) > 0 or len(missing_ids) > 0:
+            self._face_recognition.update_descriptors(zip(np.concatenate((changed_ids, missing_ids)).tolist(),
+                                                          np.concatenate((changed_descriptors, missing_descriptors))))
+        self._gallery_version = version
+        if len(deleted_ids) > 0 or len(missing_ids) > 0:
+            logger.warning('Reconciling face descriptors found %d missed deletions and %d missed additions.',
+                           len(deleted_ids), len(missing_ids))
 
     async def init_service(self, _) -> None:
+        has_versions = (self._gallery_store is None and not self._sync_descriptors) \
+            or await self._repository.has_face_descriptor_versions()
+        if not has_versions:
+            logger.error('"UserFaceDescriptor" has no version column, apply database_migration_descriptor_version.sql. '
+                         'Until then the gallery store and descriptors reconciling are disabled.')
+            self._gallery_store = None
+        if self._sync_descriptors:
+            # Changes made while descriptors are loading are queued and applied after loading
+            self._descriptor_changes = asyncio.Queue()
+            await self._repository.listen_face_descriptor_changes(self._descriptor_changes.put_nowait)
         await self._load_descriptors()
+        if self._sync_descriptors:
+            self._descriptor_sync_task = asyncio.create_task(self._apply_descriptor_changes())
+            if has_versions:
+                self._descriptor_reconcile_task = asyncio.create_task(self._reconcile_descriptors_periodically())
+        if self._permission_index is not None:
+            # Listen before loading, so no change is missed between them
+            await self._repository.listen_access_permission_changes(self._permission_index.apply_notification)
+            await self._load_permissions()
+            self._permission_resync_task = asyncio.create_task(self._resync_permissions_periodically())
+        if self._visit_buffer is not None:
+            self._visit_buffer.start()
 
     async def deinit_service(self, _) -> None:
-        pass
+        if self._permission_resync_task is not None:
+            self._permission_resync_task.cancel()
+        if self._descriptor_sync_task is not None:
+            self._descriptor_sync_task.cancel()
+        if self._descriptor_reconcile_task is not None:
+            self._descriptor_reconcile_task.cancel()
+        if self._gallery_store is not None \
+                and self._face_recognition.get_descriptors_epoch() != self._saved_gallery_epoch:
+            await self._save_gallery()
+        if self._batcher is not None:
+            await self._batcher.close()
+        if self._visit_buffer is not None:
+            await self._visit_buffer.close()
+        if self._execution_policy is not None:
+            self._execution_policy.shutdown()
 
 
 class AccessCheck(BaseModel):
@@ -101,6 +433,10 @@ class AccessCheck(BaseModel):
     user: Optional[User] = None
 
 
+class AccessCheckList(BaseModel):
+    checks: list[Result]  # Result[AccessCheck] per checked item
+
+
 class VisitRecording(BaseModel):
     allowed: bool
     visit_id: Optional[int] = None
@@ -108,3 +444,42 @@ class VisitRecording(BaseModel):
 
 class AnonymousDescriptor(BaseModel):
     features: list[float]
+
+
+class AddedDescriptor(BaseModel):
+    descriptor_id: int
+
+
+class DeletedDescriptor(BaseModel):
+    descriptor_id: int
+
+
+class RecognitionStats(BaseModel):
+    current_epoch: Optional[int] = None
+    last_decision_epoch: Optional[int] = None
+    decisions: int = 0
+    stale_decisions: int = 0
+
+
+class StageExecutionStats(BaseModel):
+    kind: str
+    workers: int
+    in_flight: int = 0
+    completed: int = 0
+    busy_sec: float = 0.
+    mean_wait_ms: float = 0.
+    utilization: float = 0.  # busy share of workers time
+
+
+class ExecutionStats(BaseModel):
+    detection: StageExecutionStats
+    alignment: StageExecutionStats
+    extraction: StageExecutionStats
+
+
+class AccessControlStats(BaseModel):
+    recognition: Optional[RecognitionStats] = None
+    batching: Optional[BatchingStats] = None
+    permission_index: Optional[PermissionIndexStats] = None
+    visit_buffer: Optional[VisitBufferStats] = None
+    execution: Optional[ExecutionStats] = None
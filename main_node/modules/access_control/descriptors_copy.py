@@ -0,0 +1,66 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from face_recognition.gallery import DESCRIPTOR_SIZE
+
+
+# Result of 'copy (select "id", "features" from "UserFaceDescriptor") to stdout (format binary)'.
+# All numbers are big-endian, every row has the same size while features are not null 1-D arrays of 128 floats.
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_HEADER_SIZE = len(COPY_SIGNATURE) + 4 + 4  # signature, flags, header extension length
+COPY_TRAILER_SIZE = 2  # -1 fields count
+
+_FLOAT8_OID = 701
+
+DESCRIPTOR_ROW_DTYPE = np.dtype([
+    ('fields_count', '>i2'),
+    ('id_length', '>i4'),
+    ('id', '>i4'),
+    ('features_length', '>i4'),
+    ('dimensions', '>i4'),
+    ('has_nulls', '>i4'),
+    ('element_oid', '>i4'),
+    ('dimension_size', '>i4'),
+    ('lower_bound', '>i4'),
+    ('elements', [('length', '>i4'), ('value', '>f8')], (DESCRIPTOR_SIZE,)),
+])
+_FEATURES_SIZE = DESCRIPTOR_ROW_DTYPE.itemsize - DESCRIPTOR_ROW_DTYPE.fields['dimensions'][1]
+
+
+def copy_buffer_size(rows_quantity: int) -> int:
+    """Size of binary COPY output of the given quantity of descriptor rows."""
+    return COPY_HEADER_SIZE + rows_quantity * DESCRIPTOR_ROW_DTYPE.itemsize + COPY_TRAILER_SIZE
+
+
+def parse_descriptors_copy(buffer: NDArray[np.uint8]) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+    """
+    Parse binary COPY output of ("id", "features") rows into ids array and (N, 128) descriptors matrix.
+    Raise ValueError if output doesn't have the fixed rows layout.
+    """
+    header = buffer[:COPY_HEADER_SIZE].tobytes()
+    if len(buffer) < COPY_HEADER_SIZE + COPY_TRAILER_SIZE or not header.startswith(COPY_SIGNATURE):
+        raise ValueError('Not a binary COPY output.')
+    if int.from_bytes(header[-4:], 'big') != 0:
+        raise ValueError('Binary COPY header extension is not supported.')
+    rows_size = len(buffer) - COPY_HEADER_SIZE - COPY_TRAILER_SIZE
+    if rows_size % DESCRIPTOR_ROW_DTYPE.itemsize != 0 or buffer[-COPY_TRAILER_SIZE:].tobytes() != b'\xff\xff':
+        raise ValueError('Binary COPY output has rows of unexpected size.')
+
+    rows = buffer[COPY_HEADER_SIZE:COPY_HEADER_SIZE + rows_size].view(DESCRIPTOR_ROW_DTYPE)
+    layout_is_valid = (
+        np.all(rows['fields_count'] == 2)
+        and np.all(rows['id_length'] == 4)
+        and np.all(rows['features_length'] == _FEATURES_SIZE)
+        and np.all(rows['dimensions'] == 1)
+        and np.all(rows['has_nulls'] == 0)
+        and np.all(rows['element_oid'] == _FLOAT8_OID)
+        and np.all(rows['dimension_size'] == DESCRIPTOR_SIZE)
+        and np.all(rows['elements']['length'] == 8)
+    )
+    if not layout_is_valid:
+        raise ValueError(f'Face descriptors are expected to be not null arrays of {DESCRIPTOR_SIZE} floats.')
+
+    ids = rows['id'].astype(np.int64)
+    descriptors = np.empty((len(rows), DESCRIPTOR_SIZE), dtype=np.float64)
+    descriptors[:] = rows['elements']['value']
+    return ids, descriptors
@@ -0,0 +1,89 @@
+import fcntl
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from time import time_ns
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from face_recognition.gallery import DESCRIPTOR_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoredGallery:
+    ids: NDArray[np.int64]
+    descriptors: NDArray[np.float64]
+    version: int  # descriptors version (high-water mark) the stored gallery is up to date with
+
+
+class GallerySnapshotStore:
+    """
+    On-disk copy of the descriptors gallery: ids and descriptors matrix .npy files
+    and a JSON meta file naming them together with the descriptors version they are up to date with.
+    The matrix is opened memory-mapped, so node processes of one host share its page cache.
+    Every save writes new files and publishes them by atomic replacement of the meta file,
+    files of the previous snapshot stay usable by processes that have them mapped.
+    Saves of node processes sharing the directory are serialized by a lock file,
+    so one doesn't remove files another has written but not published yet.
+    """
+    FORMAT_VERSION = 1
+    META_FILE_NAME = 'gallery.json'
+    LOCK_FILE_NAME = 'gallery.lock'
+
+    def __init__(self, directory: str):
+        self._directory = Path(directory)
+
+    def load(self) -> Optional[StoredGallery]:
+        """Open stored gallery, return None if there is no usable one."""
+        meta_path = self._directory / self.META_FILE_NAME
+        if not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+            if meta['format_version'] != self.FORMAT_VERSION:
+                logger.warning('Stored gallery format %r is not supported.', meta['format_version'])
+                return None
+            ids = np.load(self._directory / meta['ids_file'])
+            descriptors = np.load(self._directory / meta['descriptors_file'], mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            logger.warning('Stored gallery is unreadable.', exc_info=True)
+            return None
+        if ids.dtype != np.int64 or descriptors.dtype != np.float64 \
+                or descriptors.shape != (len(ids), DESCRIPTOR_SIZE):
+            logger.warning('Stored gallery has unexpected arrays layout.')
+            return None
+        return StoredGallery(ids=ids, descriptors=descriptors, version=meta['version'])
+
+    def save(self, ids: NDArray[np.int64], descriptors: NDArray[np.float64], version: int) -> None:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        with open(self._directory / self.LOCK_FILE_NAME, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released by closing the file
+            self._save(ids, descriptors, version)
+
+    def _save(self, ids: NDArray[np.int64], descriptors: NDArray[np.float64], version: int) -> None:
+        suffix = f'{version}-{time_ns()}'
+        meta = {
+            'format_version': self.FORMAT_VERSION,
+            'version': version,
+            'size': len(ids),
+            'ids_file': f'ids-{suffix}.npy',
+            'descriptors_file': f'descriptors-{suffix}.npy',
+        }
+        np.save(self._directory / meta['ids_file'], np.asarray(ids, dtype=np.int64))
+        np.save(self._directory / meta['descriptors_file'], np.asarray(descriptors, dtype=np.float64))
+        temporary_meta_path = self._directory / f'{self.META_FILE_NAME}.{suffix}'
+        temporary_meta_path.write_text(json.dumps(meta))
+        os.replace(temporary_meta_path, self._directory / self.META_FILE_NAME)
+        self._remove_unused_files(keep={meta['ids_file'], meta['descriptors_file']})
+
+    def _remove_unused_files(self, keep: set[str]) -> None:
+        for path in self._directory.glob('*.npy'):
+            if path.name not in keep and path.name.startswith(('ids-', 'descriptors-')):
+                path.unlink(missing_ok=True)
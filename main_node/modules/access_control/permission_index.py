@@ -0,0 +1,64 @@
+import json
+from typing import Iterable, Optional
+
+from pydantic import BaseModel
+
+
+class RoomPermissionIndex:
+    """
+    In-memory copy of "UserRoomAccessPermission": set of allowed user ids per room.
+    Changes arriving while the index is reloaded are replayed after the reload,
+    so a notification is never lost by being overwritten with an older table snapshot.
+    """
+    def __init__(self):
+        self._users_by_room: dict[int, set[int]] = {}
+        self._changes_while_loading: Optional[list[tuple[str, int, int]]] = None
+        self._stats = PermissionIndexStats()
+
+    def has_access(self, user_id: int, room_id: int) -> bool:
+        users = self._users_by_room.get(room_id)
+        return users is not None and user_id in users
+
+    def begin_loading(self) -> None:
+        self._changes_while_loading = []
+
+    def finish_loading(self, permissions: Iterable[tuple[int, int]]) -> None:
+        """Replace index content by (user_id, room_id) pairs and replay changes received during loading."""
+        users_by_room: dict[int, set[int]] = {}
+        for user_id, room_id in permissions:
+            users_by_room.setdefault(room_id, set()).add(user_id)
+        self._users_by_room = users_by_room
+
+        changes, self._changes_while_loading = self._changes_while_loading or [], None
+        for operation, user_id, room_id in changes:
+            self._apply(operation, user_id, room_id)
+        self._stats.loads += 1
+
+    def apply_notification(self, payload: str) -> None:
+        """Apply JSON payload of "user_room_access_permission" channel notification."""
+        change = json.loads(payload)
+        operation, user_id, room_id = change['operation'], change['user_id'], change['room_id']
+        if self._changes_while_loading is not None:
+            self._changes_while_loading.append((operation, user_id, room_id))
+        self._apply(operation, user_id, room_id)
+        self._stats.notifications += 1
+
+    @property
+    def stats(self) -> 'PermissionIndexStats':
+        stats = self._stats.copy()
+        stats.rooms = len(self._users_by_room)
+        stats.permissions = sum(map(len, self._users_by_room.values()))
+        return stats
+
+    def _apply(self, operation: str, user_id: int, room_id: int) -> None:
+        if operation == 'INSERT':
+            self._users_by_room.setdefault(room_id, set()).add(user_id)
+        elif operation == 'DELETE':
+            self._users_by_room.get(room_id, set()).discard(user_id)
+
+
+class PermissionIndexStats(BaseModel):
+    rooms: int = 0
+    permissions: int = 0
+    loads: int = 0
+    notifications: int = 0
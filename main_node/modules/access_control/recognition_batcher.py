@@ -0,0 +1,94 @@
+import asyncio
+from asyncio import Future, TimerHandle
+from time import monotonic
+from typing import Callable, Optional, Sequence, Awaitable
+
+from pydantic import BaseModel
+
+from face_recognition import NumpyImage
+from face_recognition.face_recognition_protocols import RecognitionResult
+
+
+BatchRecognition = Callable[[Sequence[NumpyImage]], Awaitable[list[RecognitionResult]]]
+
+
+class RecognitionBatcher:
+    """
+    Collects normalized images arriving within window_sec (or until max_batch_size is reached),
+    recognizes them by one batched call and fans results out to the waiting coroutines.
+    """
+    def __init__(self, recognize_batch: BatchRecognition, window_sec: float, max_batch_size: int):
+        self._recognize_batch = recognize_batch
+        self._window_sec = window_sec
+        self._max_batch_size = max_batch_size
+
+        self._pending: list[tuple[NumpyImage, Future, float]] = []
+        self._flush_timer: Optional[TimerHandle] = None
+        self._in_flight: set[asyncio.Task] = set()
+        self._stats = BatchingStats()
+
+    async def recognize(self, normalized_image: NumpyImage) -> RecognitionResult:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((normalized_image, future, monotonic()))
+
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self._window_sec, self._flush)
+
+        return await future
+
+    async def close(self) -> None:
+        """Flush pending images and wait for in-flight batches."""
+        self._flush()
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+
+    @property
+    def stats(self) -> 'BatchingStats':
+        return self._stats.copy()
+
+    def _flush(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._run_batch(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, batch: list[tuple[NumpyImage, Future, float]]) -> None:
+        self._stats.record_batch(len(batch), (monotonic() - enqueued for _, _, enqueued in batch))
+        images = [image for image, _, _ in batch]
+        try:
+            results = await self._recognize_batch(images)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class BatchingStats(BaseModel):
+    batches: int = 0
+    images: int = 0
+    max_batch_size: int = 0
+    mean_batch_size: float = 0.
+    max_queue_wait_ms: float = 0.
+    mean_queue_wait_ms: float = 0.
+
+    def record_batch(self, size: int, queue_waits_sec) -> None:
+        waits_ms = [wait * 1000 for wait in queue_waits_sec]
+        total_wait_ms = self.mean_queue_wait_ms * self.images + sum(waits_ms)
+        self.batches += 1
+        self.images += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.mean_batch_size = self.images / self.batches
+        self.max_queue_wait_ms = max(self.max_queue_wait_ms, *waits_ms)
+        self.mean_queue_wait_ms = total_wait_ms / self.images
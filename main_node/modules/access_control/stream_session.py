@@ -0,0 +1,80 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional, Callable, Awaitable
+
+from pydantic import BaseModel
+
+from face_recognition import NumpyImage
+from face_recognition.face_recognition_protocols import AsyncFaceRecognition
+from face_recognition.tracking import FaceTracks, Track, Tracker
+
+from main_node.utils import Result, Error
+
+
+@dataclass
+class StreamSettings:
+    detection_interval: int = 5  # faces are detected on every n-th processed frame
+    iou_threshold: float = 0.3  # minimal IoU of detected face and track rectangles to continue the track
+    min_tracking_confidence: float = 7.  # track is ended when its tracker confidence drops below
+    max_missed_detections: int = 1  # track is ended when the face isn't detected more times in a row
+    tracker_factory: Optional[Callable[[], Tracker]] = None  # None – tracks are only associated by detections
+
+
+class StreamSession:
+    """
+    Access checks of one room video stream: a face is recognized once when its track starts
+    and one decision is made per track. Frames arriving while the previous one is processed are dropped,
+    so the session follows the stream in real time instead of falling behind it.
+    """
+    def __init__(self, face_recognition: AsyncFaceRecognition,
+                 check_face: Callable[[NumpyImage], Awaitable[Result]],
+                 settings: StreamSettings):
+        self._face_recognition = face_recognition
+        self._check_face = check_face
+        self._detection_interval = settings.detection_interval
+        self._tracks = FaceTracks(tracker_factory=settings.tracker_factory,
+                                  iou_threshold=settings.iou_threshold,
+                                  min_confidence=settings.min_tracking_confidence,
+                                  max_missed_detections=settings.max_missed_detections)
+        self._processed_frames = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        """A frame is processed, so the next one will be dropped. Lets callers skip preparing the frame."""
+        return self._lock.locked()
+
+    async def process_frame(self, frame: NumpyImage) -> 'StreamFrame':
+        if self.busy:
+            return StreamFrame(dropped=True)
+        async with self._lock:
+            frame_number = self._processed_frames
+            self._processed_frames += 1
+            if frame_number % self._detection_interval == 0:
+                rectangles = await self._face_recognition.detect_faces(frame)
+                new_tracks = await asyncio.to_thread(self._tracks.update_by_detection, frame, rectangles)
+            else:
+                await asyncio.to_thread(self._tracks.update_by_tracking, frame)
+                new_tracks = []
+            decisions = await asyncio.gather(*(self._decide(frame, track) for track in new_tracks))
+            return StreamFrame(frame=frame_number, tracks=len(self._tracks.tracks), decisions=decisions)
+
+    async def _decide(self, frame: NumpyImage, track: Track) -> 'TrackDecision':
+        try:
+            normalized_image = await self._face_recognition.normalize_face(frame, track.rectangle)
+        except Exception:
+            # Track rectangle can be out of frame bounds or too small to align
+            return TrackDecision(track_id=track.id, check=Error(cause="Can't normalize face of the track."))
+        return TrackDecision(track_id=track.id, check=await self._check_face(normalized_image))
+
+
+class TrackDecision(BaseModel):
+    track_id: int
+    check: Result
+
+
+class StreamFrame(BaseModel):
+    frame: Optional[int] = None  # number of processed frame, None if frame is dropped
+    dropped: bool = False
+    tracks: int = 0
+    decisions: list[TrackDecision] = []
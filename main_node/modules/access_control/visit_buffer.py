@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from asyncpg import DataError, IntegrityConstraintViolationError
+from pydantic import BaseModel
+
+from .access_control_repository import AccessControlRepository, VisitReportRecord
+
+
+logger = logging.getLogger(__name__)
+
+
+class VisitReportBuffer:
+    """
+    Write-behind buffer of "RoomVisitReport" rows.
+    Ids are taken from blocks pre-allocated from the table sequence, so a visit id is known before the row is written.
+    Buffer is flushed by COPY when it reaches max_size, every flush_interval_sec and on close.
+    Rows rejected by DB as invalid (e.g. of a deleted user) are found by bisecting the failed batch and dropped.
+    Rows of a flush failed otherwise are kept for the next one, up to max_flush_attempts flushes
+    and max_buffered_size buffered rows (the oldest are dropped beyond it).
+    """
+    def __init__(self, repository: AccessControlRepository,
+                 max_size: int, flush_interval_sec: float, ids_block_size: int,
+                 max_buffered_size: int = 50_000, max_flush_attempts: int = 10):
+        self._repository = repository
+        self._max_size = max_size
+        self._flush_interval_sec = flush_interval_sec
+        self._ids_block_size = ids_block_size
+        self._max_buffered_size = max_buffered_size
+        self._max_flush_attempts = max_flush_attempts
+
+        self._reports: list[VisitReportRecord] = []
+        self._failed_attempts: dict[int, int] = {}  # visit id -> failed flushes of the report
+        self._free_ids: deque[int] = deque()
+        self._ids_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
+        self._size_triggered_flushes: set[asyncio.Task] = set()
+        self._stats = VisitBufferStats()
+
+    async def add(self, room_id: int, user_id: int, datetime_: datetime) -> int:
+        """Buffer visit report and return its id."""
+        visit_id = await self._allocate_id()
+        self._reports.append((visit_id, room_id, user_id, datetime_))
+        if len(self._reports) > self._max_buffered_size:
+            # Flushes are failing, they log it
+            self._drop_oldest()
+        if len(self._reports) >= self._max_size and not self._flush_lock.locked():
+            task = asyncio.create_task(self._flush_logged())
+            self._size_triggered_flushes.add(task)
+            task.add_done_callback(self._size_triggered_flushes.discard)
+        return visit_id
+
+    async def flush(self) -> None:
+        """Write buffered reports, raise the error if flush failed not by invalid rows."""
+        async with self._flush_lock:
+            if not self._reports:
+                return
+            reports, self._reports = self._reports, []
+            # Batches are written (or dropped) in order, so reports before this index are done
+            done = 0
+
+            async def write(batch: list[VisitReportRecord]) -> None:
+                nonlocal done
+                try:
+                    await self._repository.copy_visit_reports(batch)
+                except (DataError, IntegrityConstraintViolationError):
+                    if len(batch) > 1:
+                        middle = len(batch) // 2
+                        await write(batch[:middle])
+                        await write(batch[middle:])
+                        return
+                    logger.error('Visit report %r is rejected by DB and dropped.', batch[0], exc_info=True)
+                    self._stats.dropped_reports += 1
+                else:
+                    self._stats.flushed_reports += len(batch)
+                if self._failed_attempts:
+                    for report in batch:
+                        self._failed_attempts.pop(report[0], None)
+                done += len(batch)
+
+            try:
+                await write(reports)
+            except asyncio.CancelledError:
+                # Not a failure of the reports, they are returned to the buffer as they are
+                self._reports[:0] = reports[done:]
+                raise
+            except Exception:
+                self._stats.failed_flushes += 1
+                self._keep_for_retry(reports[done:])
+                raise
+            self._stats.flushes += 1
+
+    def start(self) -> None:
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """Stop periodic flushing and write all buffered reports."""
+        self._closing.set()
+        if self._flush_task is not None:
+            # A running flush is finished rather than cancelled
+            await self._flush_task
+        if self._size_triggered_flushes:
+            await asyncio.wait(self._size_triggered_flushes)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception('Final visit reports flush failed, %d reports are lost.', len(self._reports))
+
+    @property
+    def stats(self) -> 'VisitBufferStats':
+        stats = self._stats.copy()
+        stats.depth = len(self._reports)
+        stats.preallocated_ids = len(self._free_ids)
+        return stats
+
+    async def _allocate_id(self) -> int:
+        async with self._ids_lock:
+            if not self._free_ids:
+                self._free_ids.extend(await self._repository.allocate_visit_report_ids(self._ids_block_size))
+            return self._free_ids.popleft()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._closing.wait(), self._flush_interval_sec)
+                return
+            except asyncio.TimeoutError:
+                await self._flush_logged()
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception('Visit reports flush failed, reports are kept for the next flush.')
+
+    def _keep_for_retry(self, reports: list[VisitReportRecord]) -> None:
+        """Return reports of a failed flush to the buffer, except ones failed too many flushes."""
+        kept = []
+        for report in reports:
+            attempts = self._failed_attempts.get(report[0], 0) + 1
+            if attempts < self._max_flush_attempts:
+                self._failed_attempts[report[0]] = attempts
+                kept.append(report)
+            else:
+                self._failed_attempts.pop(report[0], None)
+        if dropped := len(reports) - len(kept):
+            self._stats.dropped_reports += dropped
+            logger.error('%d visit reports failed %d flushes and are dropped.', dropped, self._max_flush_attempts)
+        self._reports[:0] = kept
+        if len(self._reports) > self._max_buffered_size:
+            logger.error('Visit reports buffer is full, %d oldest reports are dropped.',
+                         self._drop_oldest())
+
+    def _drop_oldest(self) -> int:
+        """Drop reports beyond max_buffered_size from the buffer start, return their quantity."""
+        overflow = len(self._reports) - self._max_buffered_size
+        for report in self._reports[:overflow]:
+            self._failed_attempts.pop(report[0], None)
+        del self._reports[:overflow]
+        self._stats.dropped_reports += overflow
+        return overflow
+
+
+class VisitBufferStats(BaseModel):
+    depth: int = 0
+    preallocated_ids: int = 0
+    flushes: int = 0
+    failed_flushes: int = 0
+    flushed_reports: int = 0
+    dropped_reports: int = 0
@@ -5,6 +5,7 @@ from .authorization_service import (
     TokenCheck,
     TempTokenCheck,
     TempTokenInfo,
+    AuthorizationStats,
 )
 
 from .authorization_repository import AuthorizationRepository
@@ -5,6 +5,8 @@ from pydantic import BaseModel
 
 from main_node.utils import Service, Result, Ok, Error
 from .authorization_repository import AuthorizationRepository
+from .authorization_entities import RoomTempToken, AdminToken
+from .token_cache import TokenCache, TokenCacheStats
 
 from config import ROOM_TOKEN_LIFETIME_SEC
 
@@ -17,8 +19,17 @@ ROOM_TOKEN_LIFETIME = timedelta(seconds=ROOM_TOKEN_LIFETIME_SEC)
 class AuthorizationService(Service):
     SERVICE_NAME = 'authorization'
 
-    def __init__(self, repository: 'AuthorizationRepository'):
+    def __init__(self, repository: 'AuthorizationRepository',
+                 token_cache_size: int = 1024,
+                 token_cache_ttl_sec: float = 60.,
+                 token_cache_negative_ttl_sec: float = 5.):
         self._repository = repository
+        cache_options = (token_cache_size, token_cache_ttl_sec, token_cache_negative_ttl_sec)
+        self._room_temp_tokens: TokenCache[RoomTempToken] = TokenCache(*cache_options)
+        self._admin_tokens: TokenCache[AdminToken] = TokenCache(*cache_options)
+        self._cached_temp_token_by_room: dict[int, str] = {}
+        # Incremented on every temp token invalidation, lookups started before it aren't cached
+        self._temp_token_generation = 0
 
     async def authorize_room(self, temp_token_string: str) -> 'RoomAuthorization':
         """
@@ -29,14 +40,14 @@ class AuthorizationService(Service):
         If token is unknown or already invalid – check is not passed, so room_id is None.
         """
         # Get TempRoomToken entity
-        temp_token = await self._repository.get_room_temp_token(token=temp_token_string)
+        temp_token = await self._get_room_temp_token(temp_token_string)
         if temp_token is None:
             return RoomAuthorization(token_check=TempTokenCheck(known=False))
         # Check token is already invalid
         if temp_token.valid_before < datetime.now().astimezone():
             return RoomAuthorization(token_check=TempTokenCheck(known=True, valid=False))
         return RoomAuthorization(token_check=TempTokenCheck(known=True, valid=True),
-                                 room_id=temp_token.room_id)
+                                 room_id=temp_token.room_id, valid_before=temp_token.valid_before)
 
     async def authorize_admin(self, admin_token_string: str) -> 'AdminAuthorization':
         """
@@ -46,7 +57,7 @@ class AuthorizationService(Service):
         If token is unknown – check is not passed, so room_id is None.
         """
         # Get AdminToken entity
-        token = await self._repository.get_admin_token(token=admin_token_string)
+        token = await self._get_admin_token(admin_token_string)
         if token is None:
             return AdminAuthorization(token_check=TokenCheck(known=False))
         return AdminAuthorization(token_check=TokenCheck(known=True))
@@ -64,15 +75,45 @@ class AuthorizationService(Service):
             return Error(cause="Unknown room login token.")
         # Delete old temp token
         await self._repository.delete_room_temp_token(room_id=login_token.room_id)
+        self._temp_token_generation += 1
+        if (old_token_string := self._cached_temp_token_by_room.pop(login_token.room_id, None)) is not None:
+            self._room_temp_tokens.invalidate(old_token_string)
         # Create new temp token
         new_token = await self._repository.create_room_temp_token(
             room_id=login_token.room_id,
             valid_before=datetime.now() + ROOM_TOKEN_LIFETIME
         )
+        self._cache_room_temp_token(new_token.token, new_token)
         temp_token_info = TempTokenInfo(temp_token=new_token.token,
                                         valid_before=new_token.valid_before)
         return Ok(result=temp_token_info)
 
+    def get_stats(self) -> 'AuthorizationStats':
+        return AuthorizationStats(room_token_cache=self._room_temp_tokens.stats,
+                                  admin_token_cache=self._admin_tokens.stats)
+
+    async def _get_room_temp_token(self, token_string: str) -> Optional[RoomTempToken]:
+        is_cached, temp_token = self._room_temp_tokens.get(token_string)
+        if not is_cached:
+            generation = self._temp_token_generation
+            temp_token = await self._repository.get_room_temp_token(token=token_string)
+            # A token deleted by a login during the lookup mustn't be cached back
+            if generation == self._temp_token_generation:
+                self._cache_room_temp_token(token_string, temp_token)
+        return temp_token
+
+    def _cache_room_temp_token(self, token_string: str, temp_token: Optional[RoomTempToken]) -> None:
+        self._room_temp_tokens.put(token_string, temp_token)
+        if temp_token is not None:
+            self._cached_temp_token_by_room[temp_token.room_id] = token_string
+
+    async def _get_admin_token(self, token_string: str) -> Optional[AdminToken]:
+        is_cached, token = self._admin_tokens.get(token_string)
+        if not is_cached:
+            token = await self._repository.get_admin_token(token=token_string)
+            self._admin_tokens.put(token_string, token)
+        return token
+
     async def init_service(self, _) -> None:
         pass
 
@@ -94,8 +135,14 @@ class AdminAuthorization(BaseModel):
 class RoomAuthorization(BaseModel):
     token_check: TempTokenCheck
     room_id: Optional[int] = None
+    valid_before: Optional[datetime] = None
 
 
 class TempTokenInfo(BaseModel):
     temp_token: str
     valid_before: datetime
+
+
+class AuthorizationStats(BaseModel):
+    room_token_cache: TokenCacheStats
+    admin_token_cache: TokenCacheStats
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Generic, Optional, TypeVar
+
+from pydantic import BaseModel
+
+
+T = TypeVar('T')
+
+
+class TokenCache(Generic[T]):
+    """
+    Bounded LRU cache of token lookups with TTL.
+    Unknown tokens are cached too (as None) with a shorter negative TTL.
+    Token entities are cached, not authorization decisions, so expiration is checked on every hit.
+    """
+    def __init__(self, max_size: int, ttl_sec: float, negative_ttl_sec: float):
+        self._max_size = max_size
+        self._ttl_sec = ttl_sec
+        self._negative_ttl_sec = negative_ttl_sec
+        self._entries: OrderedDict[str, tuple[Optional[T], float]] = OrderedDict()
+        self._stats = TokenCacheStats()
+
+    def get(self, token: str) -> tuple[bool, Optional[T]]:
+        """Return (is_cached, entity), entity is None for a cached unknown token."""
+        entry = self._entries.get(token)
+        if entry is None or entry[1] <= monotonic():
+            if entry is not None:
+                del self._entries[token]
+            self._stats.misses += 1
+            return False, None
+        self._entries.move_to_end(token)
+        self._stats.hits += 1
+        return True, entry[0]
+
+    def put(self, token: str, entity: Optional[T]) -> None:
+        ttl_sec = self._ttl_sec if entity is not None else self._negative_ttl_sec
+        self._entries[token] = (entity, monotonic() + ttl_sec)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def invalidate(self, token: str) -> None:
+        self._entries.pop(token, None)
+
+    @property
+    def stats(self) -> 'TokenCacheStats':
+        stats = self._stats.copy()
+        stats.size = len(self._entries)
+        return stats
+
+
+class TokenCacheStats(BaseModel):
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
@@ -1,5 +1,8 @@
+import asyncio
+import json
+import logging
 from enum import Enum
-from typing import Any
+from typing import Any, Callable, Optional
 
 from pydantic import BaseModel
 
@@ -9,11 +12,21 @@ from .tasks_entities import Task, Status
 from .tasks_repository import TasksRepository
 
 
+logger = logging.getLogger(__name__)
+
+TaskCallback = Callable[[Task], None]
+
+
 class TasksService(Service):
     SERVICE_NAME = 'tasks'
 
-    def __init__(self, repository: 'TasksRepository'):
+    def __init__(self, repository: 'TasksRepository', push_tasks: bool = False):
         self._repository = repository
+        # Tasks changed in DB are pushed to subscribers of their rooms if push is enabled
+        self._push_tasks = push_tasks
+        self._subscribers: dict[int, set[TaskCallback]] = {}
+        self._task_changes: Optional[asyncio.Queue] = None
+        self._push_task: Optional[asyncio.Task] = None
 
     async def get_undone_tasks(self, room_id: int) -> Result['TaskList']:
         # TODO: Возвращать только содержимое body
@@ -44,11 +57,39 @@ class TasksService(Service):
         task = await self._repository.create_task(room_id, manager_id, task_body)
         return Ok(result=task)
 
+    def subscribe(self, room_id: int, callback: TaskCallback) -> None:
+        """Call callback with every inserted or updated task of the room."""
+        self._subscribers.setdefault(room_id, set()).add(callback)
+
+    def unsubscribe(self, room_id: int, callback: TaskCallback) -> None:
+        if (callbacks := self._subscribers.get(room_id)) is not None:
+            callbacks.discard(callback)
+            if not callbacks:
+                del self._subscribers[room_id]
+
+    async def _push_task_changes(self) -> None:
+        while True:
+            payload = await self._task_changes.get()
+            try:
+                change = json.loads(payload)
+                if not self._subscribers.get(change['room_id']):
+                    continue
+                if (task := await self._repository.get_task(change['id'])) is None:
+                    continue
+                for callback in tuple(self._subscribers.get(task.room_id, ())):
+                    callback(task)
+            except Exception:
+                logger.exception('Task change %r pushing failed.', payload)
+
     async def init_service(self, _):
-        pass
+        if self._push_tasks:
+            self._task_changes = asyncio.Queue()
+            await self._repository.listen_task_changes(self._task_changes.put_nowait)
+            self._push_task = asyncio.create_task(self._push_task_changes())
 
     async def deinit_service(self, _):
-        pass
+        if self._push_task is not None:
+            self._push_task.cancel()
 
 
 class TaskList(BaseModel):
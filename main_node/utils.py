@@ -1,10 +1,22 @@
+import asyncio
+import inspect
 from abc import ABC, abstractmethod
-from typing import TypedDict, Optional, TypeVar, Generic
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import TypedDict, Optional, TypeVar, Generic, AsyncIterator, Callable
 
 from aiohttp import web
-from asyncpg import connect, Connection
+from asyncpg import connect, create_pool, Connection, Pool
 from pydantic import BaseModel
 
+from .metrics import registry
+
+
+_pool_acquire_seconds = registry.histogram('db_pool_acquire_seconds', 'Time waited for a free pool connection.')
+_query_seconds = registry.histogram('repository_query_seconds',
+                                    'Duration of repository methods including connection acquiring.',
+                                    ('repository', 'method'))
+
 
 class DatabaseConfig(TypedDict):
     host: str
@@ -14,34 +26,128 @@ class DatabaseConfig(TypedDict):
     password: str
 
 
+class PoolConfig(TypedDict):
+    min_size: int
+    max_size: int
+    statement_cache_size: int
+    acquire_timeout: float
+
+
 class DatabaseManager:
-    def __init__(self, config: DatabaseConfig):
+    def __init__(self, config: DatabaseConfig, pool_config: PoolConfig):
         self._config = config
-        self._database_connection: Optional[Connection] = None
+        self._pool_config = pool_config
+        self._pool: Optional[Pool] = None
+        # LISTEN needs a connection that is never returned to the pool
+        self._listener_connection: Optional[Connection] = None
+        self._listeners: dict[str, Callable[[str], None]] = {}
+        self._subscribed_channels: set[str] = set()
+        self._stats = DatabasePoolStats(min_size=pool_config['min_size'], max_size=pool_config['max_size'])
 
     async def launch_connection(self, _):
-        self._database_connection = await connect(**self._config)
+        self._pool = await create_pool(**self._config,
+                                       min_size=self._pool_config['min_size'],
+                                       max_size=self._pool_config['max_size'],
+                                       statement_cache_size=self._pool_config['statement_cache_size'])
 
     async def close_connection(self, _):
-        if self._database_connection is not None:
-            await self._database_connection.close()
+        if self._listener_connection is not None:
+            await self._listener_connection.close()
+        if self._pool is not None:
+            await self._pool.close()
+
+    async def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Call callback with payload of every notification sent to the channel."""
+        self._listeners[channel] = callback
+        await self.ensure_listening()
+
+    async def ensure_listening(self) -> None:
+        """(Re)open listener connection if it is lost and subscribe it to all listened channels."""
+        if self._listener_connection is None or self._listener_connection.is_closed():
+            self._listener_connection = await connect(**self._config)
+            self._subscribed_channels = set()
+        for channel, callback in self._listeners.items():
+            if channel not in self._subscribed_channels:
+                await self._listener_connection.add_listener(channel, _notification_callback(callback))
+                self._subscribed_channels.add(channel)
+
+    @property
+    def pool(self) -> Pool:
+        assert self._pool is not None, \
+            'Connection pool must be launched by .launch_connection() method before getting.'
+        return self._pool
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Connection]:
+        """Acquire pool connection for a unit of work, raises asyncio.TimeoutError on acquire timeout."""
+        start = monotonic()
+        try:
+            connection = await self.pool.acquire(timeout=self._pool_config['acquire_timeout'])
+        except asyncio.TimeoutError:
+            self._stats.timeouts += 1
+            raise
+        self._stats.record_acquire(wait := monotonic() - start)
+        _pool_acquire_seconds.observe(wait)
+        try:
+            yield connection
+        finally:
+            await self.pool.release(connection)
 
     @property
-    def database_connection(self):
-        assert self._database_connection is not None, \
-            'Connection must be launched by .launch_connection() method before getting.'
-        return self._database_connection
+    def stats(self) -> 'DatabasePoolStats':
+        stats = self._stats.copy()
+        if self._pool is not None:
+            stats.size = self._pool.get_size()
+            stats.idle = self._pool.get_idle_size()
+        return stats
+
+
+def _notification_callback(callback: Callable[[str], None]):
+    def asyncpg_callback(connection, pid, channel, payload):
+        callback(payload)
+    return asyncpg_callback
+
+
+class DatabasePoolStats(BaseModel):
+    min_size: int
+    max_size: int
+    size: int = 0
+    idle: int = 0
+    acquisitions: int = 0
+    timeouts: int = 0
+    max_wait_ms: float = 0.
+    mean_wait_ms: float = 0.
+
+    def record_acquire(self, wait_sec: float) -> None:
+        wait_ms = wait_sec * 1000
+        self.mean_wait_ms = (self.mean_wait_ms * self.acquisitions + wait_ms) / (self.acquisitions + 1)
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.acquisitions += 1
 
 
 class Repository(ABC):
     def __init__(self, manager: DatabaseManager):
         self.__db_manager = manager
 
-    @property
-    def _conn(self):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Every public query method is timed
+        for name, attribute in list(vars(cls).items()):
+            if not name.startswith('_') and inspect.iscoroutinefunction(attribute):
+                setattr(cls, name, _query_seconds.timed(cls.__name__, name)(attribute))
+
+    def _connection(self):
+        """Async context manager acquiring a pool connection for one unit of work."""
         assert self.__db_manager is not None, \
             'Database manager is set for repository.'
-        return self.__db_manager.database_connection
+        return self.__db_manager.acquire()
+
+    async def _listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        await self.__db_manager.listen(channel, callback)
+
+    async def ensure_listening(self) -> None:
+        """Restore notifications listening if the listener connection is lost."""
+        await self.__db_manager.ensure_listening()
 
 
 class Service(ABC):
@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+
+from main_node.admission import AdmissionController, Overloaded, RouteLimit
+
+
+ROUTES = {
+    'descriptor': RouteLimit(priority=0),
+    'face': RouteLimit(priority=1),
+    'enrollment': RouteLimit(max_concurrency=1, priority=2),
+}
+
+
+def _controller(capacity: int = 1, max_queue_size: int = 2, max_wait_sec: float = 1.) -> AdmissionController:
+    return AdmissionController(capacity, max_queue_size, max_wait_sec, ROUTES)
+
+
+async def _queued(controller: AdmissionController, route: str) -> asyncio.Task:
+    """Start acquiring a slot and let the request reach the queue."""
+    task = asyncio.create_task(controller.acquire(route))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_waiting_requests_are_admitted_in_priority_order():
+    async def run():
+        controller = _controller()
+        slot = await controller.acquire('face')
+        face = await _queued(controller, 'face')
+        descriptor = await _queued(controller, 'descriptor')
+        assert controller.get_stats().queued == 2
+
+        slot.release()
+        descriptor_slot = await descriptor
+        assert not face.done()
+        descriptor_slot.release()
+        (await face).release()
+        stats = controller.get_stats()
+        assert (stats.running, stats.queued, stats.admitted) == (0, 0, 3)
+
+    asyncio.run(run())
+
+
+def test_route_limit_is_skipped_by_other_routes():
+    async def run():
+        controller = _controller(capacity=2)
+        enrollment = await controller.acquire('enrollment')
+        second_enrollment = await _queued(controller, 'enrollment')
+        face = await controller.acquire('face')
+        assert not second_enrollment.done()
+
+        face.release()
+        await asyncio.sleep(0)
+        assert not second_enrollment.done()
+        enrollment.release()
+        (await second_enrollment).release()
+
+    asyncio.run(run())
+
+
+def test_full_queue_evicts_less_prioritized_request():
+    async def run():
+        controller = _controller(max_queue_size=1)
+        slot = await controller.acquire('face')
+        enrollment = await _queued(controller, 'enrollment')
+        descriptor = await _queued(controller, 'descriptor')
+
+        with pytest.raises(Overloaded):
+            await enrollment
+        with pytest.raises(Overloaded):
+            # Equal or lower priority doesn't evict
+            await controller.acquire('descriptor')
+        slot.release()
+        (await descriptor).release()
+        assert controller.get_stats().rejected == 2
+
+    asyncio.run(run())
+
+
+def test_evicted_request_cancelled_before_it_resumes_holds_no_slot():
+    async def run():
+        controller = _controller(max_queue_size=1)
+        slot = await controller.acquire('face')
+        enrollment = await _queued(controller, 'enrollment')
+        descriptor = await _queued(controller, 'descriptor')
+        enrollment.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await enrollment
+        assert controller.get_stats().running == 1
+        slot.release()
+        (await descriptor).release()
+        assert controller.get_stats().running == 0
+
+    asyncio.run(run())
+
+
+def test_waiting_request_times_out():
+    async def run():
+        controller = _controller(max_wait_sec=0.01)
+        slot = await controller.acquire('face')
+        with pytest.raises(Overloaded):
+            await controller.acquire('face')
+        assert controller.get_stats().queued == 0
+        slot.release()
+        assert controller.get_stats().running == 0
+
+    asyncio.run(run())
+
+
+def test_slot_given_to_cancelled_request_is_passed_on():
+    async def run():
+        controller = _controller()
+        slot = await controller.acquire('face')
+        cancelled = await _queued(controller, 'face')
+        next_request = await _queued(controller, 'face')
+
+        # The slot is given to the first waiter, which is cancelled before it resumes
+        slot.release()
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        (await next_request).release()
+        assert controller.get_stats().running == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiting_request_leaves_queue():
+    async def run():
+        controller = _controller()
+        slot = await controller.acquire('face')
+        cancelled = await _queued(controller, 'face')
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert controller.get_stats().queued == 0
+        slot.release()
+        assert controller.get_stats().running == 0
+
+    asyncio.run(run())
+
+
+def test_retry_after_covers_queued_work():
+    async def run():
+        controller = _controller(capacity=2, max_queue_size=4)
+        controller._mean_hold_sec = 1.5
+        slots = [await controller.acquire('face') for _ in range(2)]
+        waiters = [await _queued(controller, 'face') for _ in range(4)]
+        with pytest.raises(Overloaded) as rejection:
+            await controller.acquire('face')
+        # 4 queued requests holding slots for 1.5 s on 2 slots
+        assert rejection.value.retry_after_sec == 3
+
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        for slot in slots:
+            slot.release()
+
+    asyncio.run(run())
+
+
+def test_retry_after_is_at_least_a_second():
+    async def run():
+        controller = _controller(max_queue_size=0)
+        slot = await controller.acquire('face')
+        with pytest.raises(Overloaded) as rejection:
+            await controller.acquire('face')
+        assert rejection.value.retry_after_sec == 1
+        slot.release()
+
+    asyncio.run(run())
+
+
+def test_try_acquire_doesnt_wait():
+    async def run():
+        controller = _controller()
+        slot = controller.try_acquire('face')
+        assert slot is not None
+        assert controller.try_acquire('face') is None
+        assert controller.get_stats().queued == 0
+        slot.release()
+        assert controller.try_acquire('face') is not None
+
+    asyncio.run(run())
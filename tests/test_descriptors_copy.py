@@ -0,0 +1,54 @@
+import struct
+
+import numpy as np
+import pytest
+
+from face_recognition.gallery import DESCRIPTOR_SIZE
+from main_node.modules.access_control.descriptors_copy import parse_descriptors_copy, copy_buffer_size
+
+
+FLOAT8_OID = 701
+
+
+def _row(id_: int, features: np.ndarray, element_oid: int = FLOAT8_OID, dimension_size: int = DESCRIPTOR_SIZE) -> bytes:
+    """Binary COPY row of ("id" integer, "features" float8[]) as PostgreSQL writes it."""
+    elements = b''.join(struct.pack('>id', 8, value) for value in features[:dimension_size])
+    array = struct.pack('>iiiii', 1, 0, element_oid, dimension_size, 1) + elements
+    return struct.pack('>hii', 2, 4, id_) + struct.pack('>i', len(array)) + array
+
+
+def _copy_output(rows: list[bytes], header_extension: bytes = b'') -> np.ndarray:
+    header = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, len(header_extension)) + header_extension
+    return np.frombuffer(header + b''.join(rows) + b'\xff\xff', dtype=np.uint8)
+
+
+def _descriptors(quantity: int) -> np.ndarray:
+    return np.random.default_rng(0).normal(size=(quantity, DESCRIPTOR_SIZE))
+
+
+def test_parse_rows():
+    descriptors = _descriptors(3)
+    buffer = _copy_output([_row(id_, descriptor) for id_, descriptor in zip([5, 1, 2 ** 31 - 1], descriptors)])
+    assert len(buffer) == copy_buffer_size(3)
+
+    ids, parsed = parse_descriptors_copy(buffer)
+    assert ids.dtype == np.int64 and ids.tolist() == [5, 1, 2 ** 31 - 1]
+    assert parsed.dtype == np.float64 and parsed.flags.c_contiguous
+    np.testing.assert_array_equal(parsed, descriptors)
+
+
+def test_parse_empty_output():
+    ids, descriptors = parse_descriptors_copy(_copy_output([]))
+    assert len(ids) == 0 and descriptors.shape == (0, DESCRIPTOR_SIZE)
+
+
+@pytest.mark.parametrize('buffer', [
+    np.frombuffer(b'not a copy output', dtype=np.uint8),
+    _copy_output([], header_extension=b'\x00' * 4),
+    _copy_output([_row(1, _descriptors(1)[0])])[:-3],
+    _copy_output([_row(1, _descriptors(1)[0], element_oid=700)]),
+    _copy_output([_row(1, _descriptors(1)[0], dimension_size=127) + b'\x00' * 12]),
+], ids=['signature', 'header_extension', 'truncated', 'float4_elements', 'short_array'])
+def test_unexpected_layout_is_rejected(buffer):
+    with pytest.raises(ValueError):
+        parse_descriptors_copy(buffer)
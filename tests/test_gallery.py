@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from face_recognition.gallery import DescriptorGallery, DESCRIPTOR_SIZE
+from face_recognition.ivf_index import IVFIndex
+
+
+def _descriptors(quantity: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(quantity, DESCRIPTOR_SIZE))
+
+
+def _contents(gallery) -> dict[int, np.ndarray]:
+    ids, descriptors = gallery.descriptors()
+    return dict(zip(ids.tolist(), descriptors))
+
+
+def _make_ivf() -> IVFIndex:
+    index = IVFIndex(n_lists=4, n_probe=4, min_train_size=40)
+    index.load(np.arange(100), _descriptors(100))
+    assert index.is_trained
+    return index
+
+
+@pytest.mark.parametrize('make_gallery', [DescriptorGallery, _make_ivf])
+def test_remove_repeated_ids(make_gallery):
+    gallery = make_gallery()
+    gallery.load(np.arange(100), _descriptors(100))
+    gallery.remove([3, 3, 50, 3, 1000])
+    contents = _contents(gallery)
+    assert len(gallery) == len(contents) == 98
+    assert 3 not in contents and 50 not in contents
+
+
+@pytest.mark.parametrize('make_gallery', [DescriptorGallery, _make_ivf])
+def test_update_repeated_ids_keeps_last(make_gallery):
+    gallery = make_gallery()
+    gallery.load(np.arange(100), _descriptors(100))
+    new = _descriptors(3, seed=1)
+    gallery.update([(500, new[0]), (500, new[1]), (7, new[2]), (7, new[0])])
+    contents = _contents(gallery)
+    assert len(gallery) == len(contents) == 101
+    np.testing.assert_array_equal(contents[500], new[1])
+    np.testing.assert_array_equal(contents[7], new[0])
+
+
+@pytest.mark.parametrize('make_gallery', [DescriptorGallery, _make_ivf])
+def test_nearest_batch_matches_nearest(make_gallery):
+    gallery = make_gallery()
+    gallery.load(np.arange(1000, 1500), _descriptors(500))
+    queries = np.concatenate([_descriptors(60, seed=2), gallery.descriptors()[1][:5] + 0.01])
+    snapshot = gallery.snapshot()
+
+    ids, distances = snapshot.nearest_batch(queries)
+    for query, id_, distance in zip(queries, ids, distances):
+        expected_id, expected_distance = snapshot.nearest(query)
+        assert id_ == expected_id
+        assert distance == pytest.approx(expected_distance)
+    assert np.all(distances[-5:] < 0.2)
+
+
+def test_nearest_batch_splits_queries_into_chunks(monkeypatch):
+    monkeypatch.setattr('face_recognition.gallery._BATCH_DISTANCES_SIZE', 1000)
+    gallery = DescriptorGallery()
+    gallery.load(np.arange(300), _descriptors(300))
+    queries = _descriptors(10, seed=3)
+    ids, distances = gallery.snapshot().nearest_batch(queries)
+    assert [gallery.nearest(query)[0] for query in queries] == ids.tolist()
+
+
+def test_nearest_of_empty_gallery():
+    snapshot = DescriptorGallery().snapshot()
+    assert snapshot.nearest(_descriptors(1)[0]) is None
+    ids, distances = snapshot.nearest_batch(_descriptors(3))
+    assert ids.tolist() == [-1, -1, -1] and np.all(np.isinf(distances))
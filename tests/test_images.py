@@ -0,0 +1,51 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from face_recognition.images import decode_image
+from face_recognition.backend_protocols import Rectangle
+
+
+def _encode(image: np.ndarray, image_format: str = 'PNG') -> bytes:
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def image_data() -> bytes:
+    rng = np.random.default_rng(0)
+    return _encode(rng.integers(0, 256, (300, 400, 3), dtype=np.uint8))
+
+
+def test_decoded_images_are_writable(image_data):
+    image, detection_image = decode_image(image_data, detection_size=100)
+    assert image.shape == (300, 400, 3) and image.dtype == np.uint8
+    assert detection_image.shape == (75, 100, 3)
+    assert image.flags.writeable and detection_image.flags.writeable
+
+
+def test_small_image_has_no_detection_copy(image_data):
+    _, detection_image = decode_image(image_data, detection_size=400)
+    assert detection_image is None
+
+
+def test_dlib_accepts_decoded_images(image_data):
+    dlib = pytest.importorskip('dlib')
+    from face_recognition.backends import dlib_
+
+    image, _ = decode_image(image_data)
+    dlib_.DlibDetector().find_faces(image)
+    rectangle = Rectangle(100, 50, 150, 150)
+    tracker = dlib_.DlibCorrelationTracker()
+    tracker.start(image, rectangle)
+    tracker.update(image)
+    landmarks = dlib.full_object_detection(dlib_._convert_to_dlib_rect(rectangle),
+                                           [dlib.point(150 + 10 * i, 120) for i in range(5)])
+    chip = dlib.get_face_chip(image, landmarks, 150, 0.25)
+    assert chip.shape == (150, 150, 3)
+    if not dlib_.FACE_RECOGNITION_MODEL_PATH.exists():
+        pytest.skip('dlib face recognition model is not downloaded.')
+    assert dlib_.DlibRecognizer().extract_features(chip).shape == dlib_.DESCRIPTOR_SHAPE
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone, timedelta
+from enum import Enum
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from main_node.controllers.serialization import dump_model
+from main_node.controllers.json_models import NodeStats
+from main_node.modules.access_control import AccessControlStats
+from main_node.modules.access_control.access_control_service import (AccessCheck, AccessCheckList, VisitRecording,
+                                                                     AnonymousDescriptor, RecognitionStats)
+from main_node.modules.access_control.access_control_entities import User
+from main_node.modules.access_control.stream_session import StreamFrame, TrackDecision
+from main_node.modules.authorization import AuthorizationStats, TempTokenInfo
+from main_node.modules.authorization.token_cache import TokenCacheStats
+from main_node.modules.tasks.tasks_service import TaskList
+from main_node.modules.tasks.tasks_entities import Task
+from main_node.admission import AdmissionStats
+from main_node.utils import Ok, Error
+
+
+class Color(str, Enum):
+    RED = 'red'
+
+
+class CustomEncoded(BaseModel):
+    moment: datetime
+
+    class Config:
+        json_encoders = {datetime: lambda value: value.timestamp()}
+
+
+class Mixed(BaseModel):
+    color: Color
+    moment: datetime
+    values: tuple[int, ...]
+    mapping: dict[str, Optional[User]]
+    custom: CustomEncoded
+    nothing: Optional[int] = None
+
+
+USER = User(id=1, name='Ann', surname='Lee', extra_info=None)
+MOMENT = datetime(2024, 5, 1, 12, 30, tzinfo=timezone(timedelta(hours=3)))
+
+MODELS = {
+    'access_check': Ok(result=AccessCheck(is_known=True, have_access=True, user=USER)),
+    'unknown_face': Ok(result=AccessCheck(is_known=False)),
+    'error': Error(cause='Cannot decode image file. It\'s invalid. «»'),
+    'check_list': Ok(result=AccessCheckList(checks=[Ok(result=AccessCheck(is_known=False)), Error(cause='x')])),
+    'visit': Ok(result=VisitRecording(allowed=True, visit_id=10)),
+    'descriptor': Ok(result=AnonymousDescriptor(features=[0.1, -2.5e-7, 1 / 3])),
+    'stream_frame': Ok(result=StreamFrame(frame=3, tracks=2, decisions=[
+        TrackDecision(track_id=1, check=Ok(result=AccessCheck(is_known=True, have_access=False, user=USER)))])),
+    'dropped_frame': Ok(result=StreamFrame(dropped=True)),
+    'tasks': Ok(result=TaskList(tasks=[Task(id=1, room_id=2, manager_id=3, body='Clean', status='UNDONE')])),
+    'token': Ok(result=TempTokenInfo(temp_token='abc', valid_before=MOMENT)),
+    'stats': Ok(result=NodeStats(
+        access_control=AccessControlStats(recognition=RecognitionStats(current_epoch=5, decisions=2)),
+        authorization=AuthorizationStats(room_token_cache=TokenCacheStats(hits=1), admin_token_cache=TokenCacheStats()),
+        admission=AdmissionStats(capacity=4, mean_wait_ms=0.25))),
+    'mixed': Ok(result=Mixed(color=Color.RED, moment=MOMENT, values=(1, 2), mapping={'a': USER, 'b': None},
+                             custom=CustomEncoded(moment=MOMENT))),
+}
+
+
+@pytest.mark.parametrize('model', MODELS.values(), ids=MODELS.keys())
+def test_dump_model_is_byte_identical_to_pydantic(model):
+    assert dump_model(model) == model.json(exclude_none=True)
+
+
+def test_custom_encoders_are_used():
+    model = CustomEncoded(moment=MOMENT)
+    assert dump_model(model) == model.json(exclude_none=True) == f'{{"moment": {MOMENT.timestamp()}}}'
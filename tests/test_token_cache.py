@@ -0,0 +1,162 @@
+import asyncio
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Optional
+
+import pytest
+
+from main_node.modules.authorization import AuthorizationService
+from main_node.modules.authorization.authorization_entities import RoomLoginToken, RoomTempToken, AdminToken
+from main_node.modules.authorization.token_cache import TokenCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr('main_node.modules.authorization.token_cache.monotonic', clock)
+    return clock
+
+
+def test_entries_expire_by_ttl(clock):
+    cache = TokenCache(max_size=10, ttl_sec=60, negative_ttl_sec=5)
+    cache.put('known', 'entity')
+    cache.put('unknown', None)
+    assert cache.get('known') == (True, 'entity')
+    assert cache.get('unknown') == (True, None)
+
+    clock.now += 5
+    assert cache.get('unknown') == (False, None)
+    assert cache.get('known') == (True, 'entity')
+    clock.now += 55
+    assert cache.get('known') == (False, None)
+    assert cache.stats.size == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TokenCache(max_size=2, ttl_sec=60, negative_ttl_sec=5)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1) and cache.get('c') == (True, 3)
+    assert cache.stats.evictions == 1
+
+
+def test_invalidate(clock):
+    cache = TokenCache(max_size=2, ttl_sec=60, negative_ttl_sec=5)
+    cache.put('a', 1)
+    cache.invalidate('a')
+    cache.invalidate('missing')
+    assert cache.get('a') == (False, None)
+
+
+class InMemoryAuthorizationRepository:
+    def __init__(self):
+        self.login_tokens = {'login': RoomLoginToken(token='login', room_id=7)}
+        self.temp_tokens: dict[str, RoomTempToken] = {}
+        self.admin_tokens = {'admin': AdminToken(token='admin', admin_id=1)}
+        self.lookups = 0
+        self._numbers = count()
+
+    async def create_room_temp_token(self, room_id: int, valid_before: datetime) -> RoomTempToken:
+        token = RoomTempToken(token=f'temp-{next(self._numbers)}', room_id=room_id,
+                              valid_before=valid_before.astimezone())
+        self.temp_tokens[token.token] = token
+        return token
+
+    async def delete_room_temp_token(self, room_id: int) -> None:
+        self.temp_tokens = {token: entity for token, entity in self.temp_tokens.items() if entity.room_id != room_id}
+
+    async def get_room_temp_token(self, token: str) -> Optional[RoomTempToken]:
+        self.lookups += 1
+        return self.temp_tokens.get(token)
+
+    async def get_room_login_token(self, token: str) -> Optional[RoomLoginToken]:
+        return self.login_tokens.get(token)
+
+    async def get_admin_token(self, token: str) -> Optional[AdminToken]:
+        self.lookups += 1
+        return self.admin_tokens.get(token)
+
+
+def test_new_login_invalidates_cached_temp_token():
+    async def run():
+        repository = InMemoryAuthorizationRepository()
+        service = AuthorizationService(repository)
+        old_token = (await service.log_in_room('login')).result.temp_token
+        assert (await service.authorize_room(old_token)).room_id == 7
+        assert repository.lookups == 0  # created token is cached
+
+        new_token = (await service.log_in_room('login')).result.temp_token
+        old_authorization = await service.authorize_room(old_token)
+        assert not old_authorization.token_check.known and old_authorization.room_id is None
+        assert (await service.authorize_room(new_token)).room_id == 7
+
+    asyncio.run(run())
+
+
+def test_expired_cached_temp_token_is_invalid():
+    async def run():
+        repository = InMemoryAuthorizationRepository()
+        service = AuthorizationService(repository)
+        token = (await service.log_in_room('login')).result.temp_token
+        repository.temp_tokens[token].valid_before = datetime.now().astimezone() - timedelta(seconds=1)
+        authorization = await service.authorize_room(token)
+        assert authorization.token_check.known and not authorization.token_check.valid
+
+    asyncio.run(run())
+
+
+def test_unknown_tokens_are_cached():
+    async def run():
+        repository = InMemoryAuthorizationRepository()
+        service = AuthorizationService(repository)
+        for _ in range(3):
+            assert not (await service.authorize_admin('guess')).token_check.known
+        assert (await service.authorize_admin('admin')).token_check.known
+        assert repository.lookups == 2
+
+    asyncio.run(run())
+
+
+class SlowLookupRepository(InMemoryAuthorizationRepository):
+    def __init__(self):
+        super().__init__()
+        self.lookup_started = asyncio.Event()
+        self.lookup_may_finish = asyncio.Event()
+
+    async def get_room_temp_token(self, token: str) -> Optional[RoomTempToken]:
+        result = await super().get_room_temp_token(token)
+        self.lookup_started.set()
+        await self.lookup_may_finish.wait()
+        return result
+
+
+def test_lookup_interleaved_with_login_doesnt_cache_deleted_token():
+    async def run():
+        repository = SlowLookupRepository()
+        service = AuthorizationService(repository)
+        old_token = (await service.log_in_room('login')).result.temp_token
+        service._room_temp_tokens.invalidate(old_token)  # lookup must go to the repository
+
+        lookup = asyncio.create_task(service.authorize_room(old_token))
+        await repository.lookup_started.wait()
+        new_token = (await service.log_in_room('login')).result.temp_token
+        repository.lookup_may_finish.set()
+        assert (await lookup).room_id == 7  # the token was valid when the lookup read it
+
+        assert not (await service.authorize_room(old_token)).token_check.known
+        # The new token is still tracked, so the next login evicts it
+        await service.log_in_room('login')
+        assert not (await service.authorize_room(new_token)).token_check.known
+
+    asyncio.run(run())
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from datetime import datetime
+
+import pytest
+from asyncpg import ForeignKeyViolationError
+
+from main_node.modules.access_control.visit_buffer import VisitReportBuffer
+
+
+DELETED_USER_ID = 13
+VISIT_TIME = datetime(2024, 5, 1, 12, 0)
+
+
+class InMemoryVisitRepository:
+    def __init__(self):
+        self.rows = []
+        self.available = True
+        self._last_id = 0
+
+    async def allocate_visit_report_ids(self, quantity: int) -> list[int]:
+        ids = list(range(self._last_id + 1, self._last_id + quantity + 1))
+        self._last_id += quantity
+        return ids
+
+    async def copy_visit_reports(self, reports) -> None:
+        if not self.available:
+            raise ConnectionError('Database is unavailable.')
+        if any(user_id == DELETED_USER_ID for _, _, user_id, _ in reports):
+            raise ForeignKeyViolationError('User is deleted.')
+        self.rows += reports
+
+
+def _buffer(repository, **options) -> VisitReportBuffer:
+    options = {'max_size': 100, 'flush_interval_sec': 60, 'ids_block_size': 8, **options}
+    return VisitReportBuffer(repository, **options)
+
+
+async def _add_visits(buffer: VisitReportBuffer, user_ids) -> list[int]:
+    return [await buffer.add(1, user_id, VISIT_TIME) for user_id in user_ids]
+
+
+def test_invalid_reports_are_dropped_and_the_rest_written():
+    async def run():
+        repository = InMemoryVisitRepository()
+        buffer = _buffer(repository)
+        visit_ids = await _add_visits(buffer, [1, DELETED_USER_ID, 2, 3, DELETED_USER_ID, 4])
+        await buffer.flush()
+        assert [row[0] for row in repository.rows] == [visit_ids[i] for i in (0, 2, 3, 5)]
+        stats = buffer.stats
+        assert (stats.depth, stats.flushed_reports, stats.dropped_reports) == (0, 4, 2)
+
+    asyncio.run(run())
+
+
+def test_failed_flush_keeps_reports_in_order():
+    async def run():
+        repository = InMemoryVisitRepository()
+        buffer = _buffer(repository)
+        visit_ids = await _add_visits(buffer, [1, 2])
+        repository.available = False
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        visit_ids += await _add_visits(buffer, [3])
+        repository.available = True
+        await buffer.flush()
+        assert [row[0] for row in repository.rows] == visit_ids
+        assert buffer.stats.failed_flushes == 1
+
+    asyncio.run(run())
+
+
+def test_reports_are_dropped_after_max_flush_attempts():
+    async def run():
+        repository = InMemoryVisitRepository()
+        buffer = _buffer(repository, max_flush_attempts=2)
+        await _add_visits(buffer, [1, 2])
+        repository.available = False
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        await _add_visits(buffer, [3])
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        stats = buffer.stats
+        assert (stats.depth, stats.dropped_reports) == (1, 2)
+
+    asyncio.run(run())
+
+
+def test_buffer_drops_oldest_reports_beyond_max_buffered_size():
+    async def run():
+        repository = InMemoryVisitRepository()
+        buffer = _buffer(repository, max_buffered_size=3)
+        repository.available = False
+        visit_ids = await _add_visits(buffer, [1, 2, 3, 4, 5])
+        repository.available = True
+        await buffer.flush()
+        assert [row[0] for row in repository.rows] == visit_ids[2:]
+        assert buffer.stats.dropped_reports == 2
+
+    asyncio.run(run())
+
+
+def test_size_triggered_flush_failure_is_logged(caplog):
+    async def run():
+        repository = InMemoryVisitRepository()
+        buffer = _buffer(repository, max_size=2)
+        repository.available = False
+        await _add_visits(buffer, [1, 2])
+        await asyncio.sleep(0)
+        assert buffer.stats.failed_flushes == 1 and buffer.stats.depth == 2
+
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(run())
+    assert 'flush failed' in caplog.text
+
+
+def test_close_doesnt_raise_if_final_flush_fails(caplog):
+    async def run():
+        repository = InMemoryVisitRepository()
+        buffer = _buffer(repository)
+        buffer.start()
+        await _add_visits(buffer, [1, 2])
+        repository.available = False
+        await buffer.close()
+        assert buffer.stats.depth == 2
+
+    with caplog.at_level(logging.ERROR):
+        asyncio.run(run())
+    assert '2 reports are lost' in caplog.text
+
+
+class SlowVisitRepository(InMemoryVisitRepository):
+    def __init__(self):
+        super().__init__()
+        self.copy_started = asyncio.Event()
+
+    async def copy_visit_reports(self, reports) -> None:
+        self.copy_started.set()
+        await asyncio.sleep(0.05)
+        await super().copy_visit_reports(reports)
+
+
+def test_close_during_periodic_flush_writes_all_reports():
+    async def run():
+        repository = SlowVisitRepository()
+        buffer = _buffer(repository, flush_interval_sec=0.01)
+        buffer.start()
+        visit_ids = await _add_visits(buffer, [1, 2, 3, 4, 5])
+        await repository.copy_started.wait()
+        await buffer.close()
+        assert [row[0] for row in repository.rows] == visit_ids
+        assert buffer.stats.depth == 0 and buffer.stats.dropped_reports == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_flush_returns_reports_to_buffer():
+    async def run():
+        repository = SlowVisitRepository()
+        buffer = _buffer(repository)
+        visit_ids = await _add_visits(buffer, [1, 2])
+        flush = asyncio.create_task(buffer.flush())
+        await repository.copy_started.wait()
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        assert buffer.stats.depth == 2
+        await buffer.close()
+        assert [row[0] for row in repository.rows] == visit_ids
+
+    asyncio.run(run())